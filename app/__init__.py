@@ -1,27 +1,38 @@
-from quart import Quart
+from quart import Quart, Response
 from quart_cors import cors
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import logging
 import httpx
 import asyncio
+from datetime import datetime
 
 from app.core.config import config
+from app.core import metrics, timing
 from app.core.client import BMUClient
+from app.core.executor import ParseExecutor
+from app.core.sessions import session_store
 
 from app.modules.auth.routes import auth_bp
+from app.modules.auth.viewmodel import auth_viewmodel
 from app.modules.public.routes import public_bp
+from app.modules.public.viewmodel import public_viewmodel
 from app.modules.departments.routes import departments_bp
+from app.modules.departments.viewmodel import departments_viewmodel
 from app.modules.student.profile.routes import student_profile_bp
 from app.modules.student.attendance.routes import student_attendance_bp
+from app.modules.student.attendance.viewmodel import student_attendance_viewmodel
 from app.modules.student.fees.routes import student_fees_bp
 from app.modules.student.timetable.routes import student_timetable_bp
 from app.modules.student.lms.routes import student_lms_bp
 from app.modules.student.dashboard.routes import student_dashboard_bp
+from app.modules.student.overview.routes import student_overview_bp
 
 def create_app():
     app = Quart(__name__)
     app = cors(app, allow_origin="*")
 
+    session_store.set_reauthenticator(auth_viewmodel.reauthenticate)
+
     app.register_blueprint(auth_bp)
     app.register_blueprint(public_bp)
     app.register_blueprint(departments_bp)
@@ -31,10 +42,15 @@ def create_app():
     app.register_blueprint(student_timetable_bp)
     app.register_blueprint(student_lms_bp)
     app.register_blueprint(student_dashboard_bp)
+    app.register_blueprint(student_overview_bp)
 
-    if config.APP_ENV == "production":
-        scheduler = AsyncIOScheduler()
+    scheduler = AsyncIOScheduler()
 
+    # Public website content is refreshed at a fixed rate so requests are served from memory.
+    scheduler.add_job(public_viewmodel.refresh_public_info, "interval", seconds=config.PUBLIC_REFRESH_INTERVAL, next_run_time=datetime.now())
+    scheduler.add_job(departments_viewmodel.refresh_institute_details, "interval", seconds=config.PUBLIC_REFRESH_INTERVAL, next_run_time=datetime.now())
+
+    if config.APP_ENV == "production":
         async def keep_alive():
             """Ping the server itself to prevent sleeping on free tiers."""
             try:
@@ -55,16 +71,33 @@ def create_app():
     async def health():
         return {"status": "healthy"}
 
+    timing.init_app(app)
+
+    if config.METRICS_ENABLED:
+        metrics.init_app(app)
+
+        @app.route("/metrics")
+        async def prometheus_metrics():
+            """Prometheus scrape endpoint; each worker process reports its own numbers."""
+            return Response(metrics.registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
     @app.before_serving
     async def startup():
         logging.info("🚀 Starting BMU API...")
+        await session_store.ensure_indexes()
+        await departments_viewmodel.ensure_indexes()
+        await student_attendance_viewmodel.ensure_indexes()
+        ParseExecutor.start()
+        scheduler.start()
+        logging.info("⏰ Scheduler started for cache refresh jobs.")
         if config.APP_ENV == "production":
-            scheduler.start()
-            logging.info("⏰ Scheduler started for keep-alive pings.")
+            logging.info("⏰ Keep-alive pings scheduled.")
 
     @app.after_serving
     async def shutdown():
         logging.info("🛑 Shutting down BMU API...")
+        scheduler.shutdown(wait=False)
         await BMUClient.close()
+        ParseExecutor.shutdown()
 
     return app
@@ -0,0 +1,105 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, List, Optional, Set
+
+from app.core import metrics
+from app.core.singleflight import SingleFlight
+
+logger = logging.getLogger("bmu.core.cache")
+
+
+class TTLCache:
+    """
+    Small in-process cache with per-entry expiry and LRU eviction.
+    get_or_load() is single-flight: concurrent misses for the same key share one loader call.
+    With stale_ttl > 0, an expired entry is still served for that long while it is
+    revalidated in the background (stale-while-revalidate).
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024, name: str = "cache", stale_ttl: float = 0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self.name = name
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._flight = SingleFlight(name=name)
+        self._background: Set[asyncio.Task] = set()
+
+    def _entry(self, key: Hashable) -> Optional[tuple]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if entry[2] <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the fresh value for key, or None (stale values are only served by get_or_load)."""
+        entry = self._entry(key)
+        if entry is None or entry[1] <= time.monotonic():
+            metrics.cache_requests.inc(cache=self.name, result="miss")
+            return None
+        metrics.cache_requests.inc(cache=self.name, result="hit")
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (value, expires_at, expires_at + self.stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one entry, or everything when no key is given."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def keys(self) -> List[Hashable]:
+        return list(self._entries)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        entry = self._entry(key)
+        if entry is not None:
+            value, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                metrics.cache_requests.inc(cache=self.name, result="stale")
+                self._revalidate(key, loader, ttl)
+            else:
+                metrics.cache_requests.inc(cache=self.name, result="hit")
+            return value
+
+        metrics.cache_requests.inc(cache=self.name, result="miss")
+        return await self.refresh(key, loader, ttl)
+
+    async def refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        """Load key now and store the result, joining a load already in flight for it."""
+        async def load():
+            value = await loader()
+            self.set(key, value, ttl)
+            return value
+
+        return await self._flight.do(key, load)
+
+    def _revalidate(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None):
+        if key in self._flight:
+            return
+
+        task = asyncio.create_task(self.refresh(key, loader, ttl))
+        self._background.add(task)
+        task.add_done_callback(lambda t: self._revalidated(key, t))
+
+    def _revalidated(self, key: Hashable, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"[{self.name}] Background refresh of {key!r} failed, serving stale: {task.exception()}")
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,36 +1,187 @@
 import httpx
+import hashlib
 import logging
+from typing import Optional, Union, Dict
+from urllib.parse import urlparse
 from app.core.config import config
+from app.core import metrics
+from app.core.timing import UpstreamTiming, ViewStateMeter
 
 logger = logging.getLogger("bmu.core.client")
 
+PORTAL_DOMAIN = urlparse(config.BMU_PORTAL_URL).hostname
+if "." not in PORTAL_DOMAIN:
+    # The cookie jar only matches dotless hosts (localhost) under their ".local" form.
+    PORTAL_DOMAIN += ".local"
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/142.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/*,*/*;q=0.8",
+    "Accept-Language": "en-GB,en-US;q=0.9,en;q=0.8",
+    "Referer": f"{config.BMU_PORTAL_URL}/Login.aspx",
+    "Origin": config.BMU_PORTAL_URL,
+}
+
+
+def build_cookie_jar(session_cookies: Optional[Union[Dict[str, str], httpx.Cookies]]) -> httpx.Cookies:
+    """Build a portal cookie jar from the cookie dict sent by the mobile client."""
+    if isinstance(session_cookies, httpx.Cookies):
+        return session_cookies
+
+    cookies_jar = httpx.Cookies()
+    for k, v in (session_cookies or {}).items():
+        cookies_jar.set(k, v, domain=PORTAL_DOMAIN)
+    return cookies_jar
+
+
+def cookie_fingerprint(session_cookies: Optional[Union[Dict[str, str], httpx.Cookies]]) -> str:
+    """Stable digest of a cookie set, used to key per-session state without storing the cookies."""
+    if isinstance(session_cookies, httpx.Cookies):
+        pairs = ((c.name, c.value) for c in session_cookies.jar)
+    else:
+        pairs = (session_cookies or {}).items()
+    raw = "&".join(f"{k}={v}" for k, v in sorted(pairs))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _chain_trace(trace, previous):
+    """Keep a caller's own `trace` extension working alongside ours."""
+    if previous is None:
+        return trace
+
+    async def both(event: str, info: dict):
+        await trace(event, info)
+        await previous(event, info)
+    return both
+
+
+class _MeteredStream(httpx.AsyncByteStream):
+    """Counts an upstream body (and its ViewState) as it is read and finishes the fetch's timing once the response is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, timing: UpstreamTiming, viewstate: Optional[ViewStateMeter]):
+        self._stream = stream
+        self._timing = timing
+        self._viewstate = viewstate
+        self._bytes = 0
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._bytes += len(chunk)
+            if self._viewstate is not None:
+                self._viewstate.feed(chunk)
+            yield chunk
+
+    def record(self):
+        if self._closed:
+            return
+        self._closed = True
+        metrics.upstream_requests_in_flight.dec()
+        self._timing.finish(self._bytes, self._viewstate.size if self._viewstate else None)
+
+    async def aclose(self) -> None:
+        self.record()
+        await self._stream.aclose()
+
+
+class _PooledTransport(httpx.AsyncBaseTransport):
+    """
+    Forwards requests to the shared connection pool, timing each one (see app.core.timing).
+    Closing a scoped client must not tear down the pool, so aclose() is a no-op.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        timing = UpstreamTiming(request)
+        request.extensions["trace"] = _chain_trace(timing.trace, request.extensions.get("trace"))
+        metrics.upstream_requests_in_flight.inc()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception as e:
+            metrics.upstream_requests_in_flight.dec()
+            metrics.upstream_errors.inc(page=timing.page, error=type(e).__name__)
+            raise
+        timing.response_started(response.status_code)
+
+        viewstate = None
+        if "html" in response.headers.get("content-type", ""):
+            viewstate = ViewStateMeter(response.headers.get("content-encoding", ""))
+        metered = _MeteredStream(response.stream, timing, viewstate)
+        if response.is_closed:
+            # Bodies built in memory (e.g. by httpx.MockTransport) arrive already read.
+            async for _ in metered:
+                pass
+            metered.record()
+        else:
+            response.stream = metered
+        return response
+
+    async def aclose(self) -> None:
+        pass
+
+
 class BMUClient:
-    _instance = None
+    """
+    Owner of the pooled upstream transport.
+    There is deliberately no shared client: cookies live in per-session scopes so that
+    concurrent students (and concurrent logins) can never see each other's ASP.NET session.
+    """
+    _transport = None
 
     @classmethod
-    def get_client(cls):
-        if cls._instance is None:
-            logger.info("Initializing shared HTTP client...")
-            cls._instance = httpx.AsyncClient(
-                timeout=config.REQUEST_TIMEOUT,
-                follow_redirects=True,
-                headers={
-                    "User-Agent": (
-                        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                        "AppleWebKit/537.36 (KHTML, like Gecko) "
-                        "Chrome/142.0.0.0 Safari/537.36"
-                    ),
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/*,*/*;q=0.8",
-                    "Accept-Language": "en-GB,en-US;q=0.9,en;q=0.8",
-                    "Referer": "https://bmu.gnums.co.in/Login.aspx",
-                    "Origin": "https://bmu.gnums.co.in",
-                },
+    def get_transport(cls) -> httpx.AsyncHTTPTransport:
+        """Return the long-lived, keep-alive transport shared by every portal request."""
+        if cls._transport is None:
+            http2 = config.HTTP2_ENABLED
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("'h2' package not installed, falling back to HTTP/1.1.")
+                    http2 = False
+
+            logger.info(f"Initializing pooled HTTP transport (http2={http2})...")
+            cls._transport = httpx.AsyncHTTPTransport(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=config.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+                ),
             )
-        return cls._instance
+        return cls._transport
+
+    @classmethod
+    def session(
+        cls,
+        session_cookies: Optional[Union[Dict[str, str], httpx.Cookies]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        follow_redirects: bool = True,
+        timeout: Optional[float] = None,
+    ) -> httpx.AsyncClient:
+        """
+        Return a lightweight client with its own cookie jar on top of the pooled transport.
+        Use as `async with BMUClient.session(session_cookies) as client:`; exiting only
+        drops the cookie scope, the underlying connections stay warm.
+        Redirect policy can be overridden per request, e.g. `client.post(..., follow_redirects=False)`.
+        """
+        return httpx.AsyncClient(
+            transport=_PooledTransport(cls.get_transport()),
+            cookies=build_cookie_jar(session_cookies),
+            headers=headers,
+            follow_redirects=follow_redirects,
+            timeout=timeout or config.REQUEST_TIMEOUT,
+        )
 
     @classmethod
-    async def close_client(cls):
-        if cls._instance:
-            await cls._instance.aclose()
-            cls._instance = None
-            logger.info("Shared HTTP client closed.")
+    async def close(cls):
+        if cls._transport:
+            await cls._transport.aclose()
+            cls._transport = None
+            logger.info("Pooled HTTP transport closed.")
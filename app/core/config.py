@@ -1,5 +1,6 @@
 import os
 import secrets
+import tempfile
 import logging
 import urllib.parse as parser
 from dotenv import load_dotenv
@@ -28,8 +29,57 @@ class Config:
     DB_CLUSTER = os.environ.get('DB_CLUSTER')
     MONGO_URI = f"mongodb+srv://{DB_USER}:{DB_PASSWORD}@{DB_CLUSTER}.mongodb.net/?retryWrites=true&w=majority&appName=Cluster0&tlsAllowInvalidCertificates=true"
 
+    # Upstream origins; point both at a stand-in (python -m benchmarks.portal) to run offline.
+    BMU_PORTAL_URL = os.environ.get("BMU_PORTAL_URL", "https://bmu.gnums.co.in").rstrip("/")
+    BMU_WEBSITE_URL = os.environ.get("BMU_WEBSITE_URL", "https://bmusurat.ac.in").rstrip("/")
+
     REQUEST_TIMEOUT = int(os.environ.get("REQUEST_TIMEOUT", 20))
 
+    HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "true").lower() == "true"
+    HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 100))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+    HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", 60))
+
+    LOGIN_STATE_TTL = int(os.environ.get("LOGIN_STATE_TTL", 600))
+
+    SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "memory").lower()
+    SESSION_TTL = int(os.environ.get("SESSION_TTL", 86400))
+    SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", 10000))
+
+    RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 300))
+    RESPONSE_CACHE_TTLS = os.environ.get(
+        "RESPONSE_CACHE_TTLS",
+        "profile=3600,fees=900,fee_posting=3600,attendance_by_date=3600,attendance_by_dates=3600,timetable=1800,timetable_range=1800,lms_subject=900",
+    )
+    RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 5000))
+
+    FORM_STATE_TTL = int(os.environ.get("FORM_STATE_TTL", 900))
+    FORM_STATE_CACHE_SIZE = int(os.environ.get("FORM_STATE_CACHE_SIZE", 5000))
+
+    ATTENDANCE_BULK_MAX_DATES = int(os.environ.get("ATTENDANCE_BULK_MAX_DATES", 100))
+    ATTENDANCE_BULK_CONCURRENCY = int(os.environ.get("ATTENDANCE_BULK_CONCURRENCY", 4))
+
+    TIMETABLE_RANGE_MAX_DAYS = int(os.environ.get("TIMETABLE_RANGE_MAX_DAYS", 92))
+    TIMETABLE_RANGE_CONCURRENCY = int(os.environ.get("TIMETABLE_RANGE_CONCURRENCY", 4))
+
+    OVERVIEW_SECTION_TIMEOUT = float(os.environ.get("OVERVIEW_SECTION_TIMEOUT", 10))
+
+    PUBLIC_CACHE_TTL = int(os.environ.get("PUBLIC_CACHE_TTL", 3600))
+    PUBLIC_CACHE_STALE_TTL = int(os.environ.get("PUBLIC_CACHE_STALE_TTL", 86400))
+    PUBLIC_REFRESH_INTERVAL = int(os.environ.get("PUBLIC_REFRESH_INTERVAL", 1800))
+
+    FILE_CACHE_DIR = os.environ.get("FILE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "bmu-file-cache"))
+    FILE_CACHE_MAX_BYTES = int(os.environ.get("FILE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+    FILE_CACHE_TTL = int(os.environ.get("FILE_CACHE_TTL", 86400))
+
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+    SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "false").lower() == "true"
+    UPSTREAM_SLOW_MS = int(os.environ.get("UPSTREAM_SLOW_MS", 3000))
+
+    PARSER_BACKEND = os.environ.get("PARSER_BACKEND", "auto").lower()
+    PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", os.cpu_count() or 1))
+    PARSE_INLINE_MAX_BYTES = int(os.environ.get("PARSE_INLINE_MAX_BYTES", 32768))
+
     PROJECT_NAME = "BMU API"
     DEVELOPER = "Piyush Makwana"
 
@@ -40,6 +90,7 @@ class Config:
     def __init__(self):
         logger.debug("Base Config initialized.")
         logger.debug(f"REQUEST_TIMEOUT = {self.REQUEST_TIMEOUT}s")
+        logger.debug(f"HTTP pool: max={self.HTTP_MAX_CONNECTIONS}, keepalive={self.HTTP_MAX_KEEPALIVE_CONNECTIONS}, http2={self.HTTP2_ENABLED}")
 
 
 class DevelopmentConfig(Config):
@@ -20,3 +20,5 @@ def get_db():
 db = get_db()
 departments_collection = db["Departments"]
 users_collection = db["Users"]
+sessions_collection = db["Sessions"]
+attendance_collection = db["Attendance"]
@@ -0,0 +1,139 @@
+import time
+import asyncio
+import inspect
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from app.core.config import config
+from app.core import metrics
+from app.core.parser import parse_html, parse_hidden_fields
+
+logger = logging.getLogger("bmu.core.executor")
+
+
+def _parse_in_worker(parse_fn: Callable[..., Any], markup: str, args: tuple, form_state: bool = False) -> Any:
+    """Runs inside a pool worker: build the tree there so only text goes in and plain dicts come out."""
+    spec = getattr(parse_fn, "extract_spec", None)
+    if spec and form_state:
+        spec = spec.with_hidden_inputs()
+    soup = parse_html(markup, parse_only=spec.strainer() if spec else None)
+    if form_state:
+        hidden = parse_hidden_fields(soup)
+        return parse_fn(soup, *args), hidden
+    return parse_fn(soup, *args)
+
+
+class _ParserRef:
+    """
+    Picklable stand-in for a viewmodel's bound `_parse_*` method. Only the class and the method name
+    cross the process boundary: the worker calls the method on a bare instance (no __init__), so a
+    parser can use class attributes but never instance state such as caches or in-flight futures.
+    """
+
+    def __init__(self, cls: type, name: str):
+        self.cls = cls
+        self.name = name
+
+    @property
+    def extract_spec(self):
+        return getattr(getattr(self.cls, self.name), "extract_spec", None)
+
+    def __call__(self, soup, *args):
+        return getattr(self.cls.__new__(self.cls), self.name)(soup, *args)
+
+
+def _portable(parse_fn: Callable[..., Any]) -> Callable[..., Any]:
+    """What to send to a pool worker for `parse_fn`; raises TypeError for callables that cannot be sent."""
+    if inspect.ismethod(parse_fn) and not isinstance(parse_fn.__self__, type):
+        return _ParserRef(type(parse_fn.__self__), parse_fn.__name__)
+    if "<locals>" in getattr(parse_fn, "__qualname__", "") or getattr(parse_fn, "__name__", "") == "<lambda>":
+        raise TypeError(f"{parse_fn!r} cannot be sent to a parse worker; use a method or a module-level function.")
+    return parse_fn
+
+
+class ParseExecutor:
+    """
+    Owner of the process pool that HTML parsing runs on, so large pages never block the event loop.
+    `parse_fn` must be a viewmodel's `_parse_*` method or a module-level function. A bound method is
+    sent as its class and name (see _ParserRef), never with the instance.
+    Pages smaller than PARSE_INLINE_MAX_BYTES (and every page when PARSE_WORKERS=0) are parsed inline.
+    Where child processes cannot be started (Hypercorn runs the app in daemonic worker processes),
+    the pool is a thread pool instead: parses still leave the event loop, but share the GIL.
+    """
+    _pool = None
+
+    @classmethod
+    def get_pool(cls) -> Executor:
+        if cls._pool is None:
+            if multiprocessing.current_process().daemon:
+                cls._use_threads("this is a daemonic process, which cannot have child processes")
+            else:
+                logger.info(f"Starting parse pool with {config.PARSE_WORKERS} worker(s)...")
+                # spawn, not fork: forking a process that already runs an event loop and driver threads is unsafe.
+                cls._pool = ProcessPoolExecutor(
+                    max_workers=config.PARSE_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return cls._pool
+
+    @classmethod
+    def _use_threads(cls, reason: str):
+        logger.warning(f"Parse pool cannot use processes ({reason}); parsing on {config.PARSE_WORKERS} thread(s) instead.")
+        if cls._pool is not None:
+            cls._pool.shutdown(wait=False, cancel_futures=True)
+        cls._pool = ThreadPoolExecutor(max_workers=config.PARSE_WORKERS, thread_name_prefix="parse")
+
+    @classmethod
+    async def run(cls, parse_fn: Callable[..., Any], markup: str, *args, form_state: bool = False) -> Any:
+        """
+        Parse `markup` and return `parse_fn(soup, *args)`.
+        With form_state=True the page's hidden inputs are collected from the same tree and
+        `(result, hidden_fields)` is returned.
+        """
+        portable = _portable(parse_fn)
+        mode = "inline" if config.PARSE_WORKERS <= 0 or len(markup) < config.PARSE_INLINE_MAX_BYTES else "pool"
+        started = time.perf_counter()
+        metrics.parses_in_flight.inc()
+        try:
+            if mode == "inline":
+                return _parse_in_worker(parse_fn, markup, args, form_state)
+
+            pool = cls.get_pool()
+            if isinstance(pool, ThreadPoolExecutor):
+                mode = "thread"
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(pool, _parse_in_worker, portable, markup, args, form_state)
+            except BrokenProcessPool:
+                logger.error("Parse pool is broken, restarting it and parsing inline.")
+                cls.shutdown()
+                return _parse_in_worker(parse_fn, markup, args, form_state)
+        finally:
+            metrics.parses_in_flight.dec()
+            metrics.parse_duration.observe(
+                time.perf_counter() - started,
+                parser=getattr(parse_fn, "__qualname__", repr(parse_fn)), mode=mode,
+            )
+
+    @classmethod
+    def start(cls):
+        """Spin the workers up ahead of the first request (they import the app on boot)."""
+        if config.PARSE_WORKERS <= 0:
+            return
+        try:
+            pool = cls.get_pool()
+            for _ in range(config.PARSE_WORKERS):
+                pool.submit(int)
+        except (OSError, AssertionError, BrokenProcessPool) as e:
+            # Startup must not fail over this: parsing on threads is slower, not broken.
+            cls._use_threads(str(e))
+
+    @classmethod
+    def shutdown(cls):
+        if cls._pool:
+            cls._pool.shutdown(wait=False, cancel_futures=True)
+            cls._pool = None
+            logger.info("Parse pool shut down.")
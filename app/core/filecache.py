@@ -0,0 +1,362 @@
+import os
+import json
+import asyncio
+import time
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import config
+from app.core import metrics
+from app.core.singleflight import SingleFlight
+
+logger = logging.getLogger("bmu.core.filecache")
+
+CHUNK_SIZE = 64 * 1024
+
+
+class CachedFile:
+    """
+    A blob in the file cache. Ones returned by FileCache.get() hold the blob open, so they stay readable
+    even if the entry is evicted or expires meanwhile; close() (or reading the chunks to the end) releases it.
+    """
+
+    __slots__ = ("path", "size", "sha256", "filename", "content_type", "_file")
+
+    def __init__(self, path: str, size: int, sha256: str, filename: Optional[str], content_type: Optional[str], file: Optional[BinaryIO] = None):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.filename = filename
+        self.content_type = content_type
+        self._file = file
+
+    def read(self) -> bytes:
+        """The whole blob (blocking: call it on a worker thread)."""
+        if self._file is not None:
+            return os.pread(self._file.fileno(), self.size, 0)
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    async def iter_chunks(self, first: int = 0, last: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield bytes first..last (inclusive) in CHUNK_SIZE pieces, each read on a worker thread."""
+        last = self.size - 1 if last is None else min(last, self.size - 1)
+        file = self._file or await asyncio.to_thread(open, self.path, "rb")
+        try:
+            for offset in range(first, last + 1, CHUNK_SIZE):
+                yield await asyncio.to_thread(os.pread, file.fileno(), min(CHUNK_SIZE, last + 1 - offset), offset)
+        finally:
+            file.close()
+            self._file = None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class FileCacheWriter:
+    """
+    Incrementally writes a body into the cache while it is being relayed elsewhere.
+    Nothing becomes visible until commit(); abort() (or exceeding the cache size) discards it.
+    Writes run on a worker thread, so a slow disk holds up the relayed body but not the event loop.
+    """
+
+    def __init__(self, cache: "FileCache", key: str, filename: Optional[str], content_type: Optional[str], ttl: Optional[float]):
+        self.cache = cache
+        self.key = key
+        self.filename = filename
+        self.content_type = content_type
+        self.ttl = ttl
+        self._hash = hashlib.sha256()
+        self._size = 0
+        fd, self._tmp_path = tempfile.mkstemp(dir=cache.tmp_dir)
+        self._file = os.fdopen(fd, "wb")
+
+    async def write(self, chunk: bytes):
+        if self._file is None:
+            return
+        self._size += len(chunk)
+        if self._size > self.cache.max_bytes:
+            self.abort()
+            return
+        self._hash.update(chunk)
+        try:
+            await asyncio.to_thread(self._file.write, chunk)
+        except OSError as e:
+            logger.warning(f"[{self.cache.name}] Could not store {self.key!r}: {e}")
+            self.abort()
+
+    async def commit(self) -> Optional[CachedFile]:
+        if self._file is None:
+            return None
+        file, self._file = self._file, None
+        try:
+            await asyncio.to_thread(file.close)
+            return await self.cache._adopt(self.key, self._tmp_path, self._hash.hexdigest(), self._size, self.filename, self.content_type, self.ttl)
+        except OSError as e:
+            logger.warning(f"[{self.cache.name}] Could not store {self.key!r}: {e}")
+            self._discard()
+            return None
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._discard()
+
+    def _discard(self):
+        try:
+            os.unlink(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class FileCache:
+    """
+    Content-addressed disk cache for downloaded files (LMS PDFs, fee receipts).
+    Blobs are stored once per SHA-256 of their content under blobs/; an index maps
+    request keys to blobs, so the same file reached through different keys is kept once.
+    Keys expire after `ttl` and the least recently used ones are evicted once the blobs
+    exceed `max_bytes`. The index is persisted next to the blobs so the cache survives restarts.
+    The index lives in memory and is only touched on the event loop; disk work runs on worker threads.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl: float, name: str = "files"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.name = name
+        self.blob_dir = os.path.join(directory, "blobs")
+        self.tmp_dir = os.path.join(directory, "tmp")
+        self.index_path = os.path.join(directory, "index.json")
+        self._index: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Keys per blob, and the size of the distinct blobs the index points at.
+        self._refs: Dict[str, int] = {}
+        self._bytes = 0
+        self._loaded = False
+        self._save_lock = asyncio.Lock()
+        self._flight = SingleFlight(name=name)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def _digest(key: str) -> str:
+        # Keys can contain usernames; only their digest is written to disk.
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    async def _ensure_loaded(self):
+        if not self._loaded:
+            await self._flight.do(("load",), lambda: asyncio.to_thread(self._load))
+
+    def _load(self):
+        """Read the index and drop orphaned blobs (on a worker thread, before anything else uses the index)."""
+        try:
+            self._load_index()
+        finally:
+            self._loaded = True
+
+    def _load_index(self):
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        for leftover in os.listdir(self.tmp_dir):
+            try:
+                os.unlink(os.path.join(self.tmp_dir, leftover))
+            except OSError:
+                pass
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            entries = {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"[{self.name}] Ignoring unreadable index: {e}")
+            entries = {}
+
+        now = time.time()
+        for digest, entry in entries.items():
+            if entry.get("expires_at", 0) > now and os.path.exists(self._blob_path(entry["sha256"])):
+                self._add(digest, entry)
+        self._remove_blobs(self._evict())
+
+        # Blobs whose index entry was lost (crash between writes, expired keys) are orphans.
+        for root, _, files in os.walk(self.blob_dir):
+            for blob in files:
+                if blob not in self._refs:
+                    os.unlink(os.path.join(root, blob))
+
+        logger.info(f"[{self.name}] {len(self._index)} cached file(s), {self._bytes} bytes in {self.directory}")
+
+    async def _save_index(self):
+        # Serialised under the lock so an older snapshot can never replace a newer one.
+        async with self._save_lock:
+            await asyncio.to_thread(self._write_index, json.dumps(self._index))
+
+    def _write_index(self, data: str):
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.index_path)
+
+    def _add(self, digest: str, entry: Dict[str, Any]):
+        self._index[digest] = entry
+        sha256 = entry["sha256"]
+        if sha256 not in self._refs:
+            self._bytes += entry["size"]
+        self._refs[sha256] = self._refs.get(sha256, 0) + 1
+
+    def _remove(self, digest: str) -> List[str]:
+        """Drop a key; returns [sha256] when no key points at its blob any more, so it can be deleted."""
+        entry = self._index.pop(digest)
+        sha256 = entry["sha256"]
+        self._refs[sha256] -= 1
+        if self._refs[sha256]:
+            return []
+        del self._refs[sha256]
+        self._bytes -= entry["size"]
+        return [sha256]
+
+    def _evict(self) -> List[str]:
+        """Drop least recently used keys until the blobs fit; returns the blobs no key points at any more."""
+        released = []
+        while self._index and self._bytes > self.max_bytes:
+            released.extend(self._remove(next(iter(self._index))))
+        return released
+
+    def _remove_blobs(self, sha256s: List[str]):
+        for sha256 in sha256s:
+            try:
+                os.unlink(self._blob_path(sha256))
+            except FileNotFoundError:
+                pass
+
+    async def get(self, key: str) -> Optional[CachedFile]:
+        if not self.enabled:
+            return None
+        try:
+            await self._ensure_loaded()
+        except OSError as e:
+            logger.warning(f"[{self.name}] Cache directory unavailable: {e}")
+            return None
+
+        digest = self._digest(key)
+        entry = self._index.get(digest)
+        if entry is None:
+            metrics.cache_requests.inc(cache=self.name, result="miss")
+            return None
+
+        path = self._blob_path(entry["sha256"])
+        # Opened here, before anyone sends headers for it: an eviction after this point cannot pull it away.
+        file = await asyncio.to_thread(self._open_blob, path) if entry["expires_at"] > time.time() else None
+        if self._index.get(digest) is not entry:
+            # Replaced or evicted while the blob was being opened.
+            if file is not None:
+                file.close()
+                file = None
+        elif file is None:
+            await asyncio.to_thread(self._remove_blobs, self._remove(digest))
+        if file is None:
+            metrics.cache_requests.inc(cache=self.name, result="miss")
+            return None
+
+        self._index.move_to_end(digest)
+        metrics.cache_requests.inc(cache=self.name, result="hit")
+        return CachedFile(path, entry["size"], entry["sha256"], entry.get("filename"), entry.get("content_type"), file)
+
+    @staticmethod
+    def _open_blob(path: str) -> Optional[BinaryIO]:
+        try:
+            return open(path, "rb")
+        except FileNotFoundError:
+            return None
+
+    async def writer(self, key: str, filename: Optional[str] = None, content_type: Optional[str] = None, ttl: Optional[float] = None) -> Optional[FileCacheWriter]:
+        """A FileCacheWriter for `key`, or None when the cache is disabled or its directory is unusable."""
+        if not self.enabled:
+            return None
+        try:
+            await self._ensure_loaded()
+            return await asyncio.to_thread(FileCacheWriter, self, key, filename, content_type, ttl)
+        except OSError as e:
+            logger.warning(f"[{self.name}] Cache directory unavailable: {e}")
+            return None
+
+    async def put(self, key: str, content: bytes, filename: Optional[str] = None, content_type: Optional[str] = None, ttl: Optional[float] = None) -> Optional[CachedFile]:
+        writer = await self.writer(key, filename, content_type, ttl)
+        if writer is None:
+            return None
+        await writer.write(content)
+        return await writer.commit()
+
+    def _store_blob(self, tmp_path: str, path: str):
+        if os.path.exists(path):
+            os.unlink(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+
+    async def _adopt(self, key: str, tmp_path: str, sha256: str, size: int, filename: Optional[str], content_type: Optional[str], ttl: Optional[float]) -> Optional[CachedFile]:
+        if size == 0:
+            await asyncio.to_thread(os.unlink, tmp_path)
+            return None
+
+        path = self._blob_path(sha256)
+        await asyncio.to_thread(self._store_blob, tmp_path, path)
+
+        digest = self._digest(key)
+        released = self._remove(digest) if digest in self._index else []
+        self._add(digest, {
+            "sha256": sha256,
+            "size": size,
+            "filename": filename,
+            "content_type": content_type,
+            "expires_at": time.time() + (self.ttl if ttl is None else ttl),
+        })
+        released.extend(self._evict())
+        # A key stored again with the same content released its blob and took it back.
+        await asyncio.to_thread(self._remove_blobs, [b for b in released if b not in self._refs])
+        await self._save_index()
+
+        if digest not in self._index:
+            return None
+        return CachedFile(path, size, sha256, filename, content_type)
+
+    async def fetch(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Tuple[bytes, Optional[str]]]],
+        content_type: Optional[str] = None,
+        ttl: Optional[float] = None,
+    ) -> Tuple[bytes, Optional[str]]:
+        """
+        Return (content, filename) for `key` from disk, or from `loader()` (stored for next time).
+        Concurrent misses for the same key share one loader call.
+        """
+        cached = await self.get(key)
+        if cached is not None:
+            try:
+                return await asyncio.to_thread(cached.read), cached.filename
+            finally:
+                cached.close()
+
+        async def load():
+            content, filename = await loader()
+            await self.put(key, content, filename, content_type, ttl)
+            return content, filename
+
+        return await self._flight.do(key, load)
+
+
+file_cache = FileCache(
+    directory=config.FILE_CACHE_DIR,
+    max_bytes=config.FILE_CACHE_MAX_BYTES,
+    ttl=config.FILE_CACHE_TTL,
+)
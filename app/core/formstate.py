@@ -0,0 +1,80 @@
+import re
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.cache import TTLCache
+from app.core.client import cookie_fingerprint
+from app.core.config import config
+
+logger = logging.getLogger("bmu.core.formstate")
+
+# A naming container numbered by position: the row of a GridView/Repeater ("...$gvContent$ctl03$lnkDownload").
+_ROW_SEGMENT = re.compile(r"\$ctl\d+\$")
+
+
+def is_row_postback(event_target: str) -> bool:
+    """
+    Whether an __EVENTTARGET addresses a grid row by its position. Such targets point at another
+    document once rows are added or reordered, so they cannot identify what they download on their own.
+    """
+    return bool(_ROW_SEGMENT.search(event_target))
+
+
+class FormStateCache:
+    """
+    Remembers the last ASP.NET form state (the page's hidden inputs: __VIEWSTATE and friends)
+    seen per session and page URL. Every page we already fetch and parse updates it, so a later
+    postback to that page can go straight to the POST instead of first GETting the page again.
+    """
+
+    def __init__(self, ttl: int, maxsize: int):
+        self._cache = TTLCache(ttl=ttl, maxsize=maxsize, name="form_state")
+
+    @staticmethod
+    def _key(session_cookies, url: str) -> tuple:
+        return cookie_fingerprint(session_cookies), url
+
+    def get(self, session_cookies, url: str) -> Optional[Dict[str, str]]:
+        fields = self._cache.get(self._key(session_cookies, url))
+        return dict(fields) if fields is not None else None
+
+    def remember(self, session_cookies, url: str, fields: Dict[str, str]):
+        # Partial (UpdatePanel) responses and error pages carry no usable state.
+        if fields.get("__VIEWSTATE"):
+            self._cache.set(self._key(session_cookies, url), dict(fields))
+
+    def forget(self, session_cookies, url: str):
+        self._cache.invalidate(self._key(session_cookies, url))
+
+    async def postback(
+        self,
+        session_cookies,
+        url: str,
+        load: Callable[[], Awaitable[Dict[str, str]]],
+        send: Callable[[Dict[str, str]], Awaitable[Any]],
+        accept: Callable[[Any], bool],
+        discard: Optional[Callable[[Any], Awaitable[None]]] = None,
+    ) -> Any:
+        """
+        Run a postback to `url`. `send(fields)` fills in a copy of the form state and POSTs it.
+        The remembered state is tried first; when there is none, or `accept` rejects the response
+        (stale view state, expired session...), fresh state is taken from `load()` (a GET of the page)
+        and the postback is sent again. The response to that second attempt is returned as-is.
+        A rejected response is closed with `discard(response)` (default: `response.aclose()`).
+        """
+        fields = self.get(session_cookies, url)
+        if fields is not None:
+            response = await send(fields)
+            if accept(response):
+                return response
+
+            logger.debug(f"Remembered form state for {url} was rejected, reloading the page.")
+            self.forget(session_cookies, url)
+            await (discard(response) if discard else response.aclose())
+
+        fields = await load()
+        self.remember(session_cookies, url, fields)
+        return await send(dict(fields))
+
+
+form_state = FormStateCache(ttl=config.FORM_STATE_TTL, maxsize=config.FORM_STATE_CACHE_SIZE)
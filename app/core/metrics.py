@@ -0,0 +1,228 @@
+import time
+import bisect
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger("bmu.core.metrics")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+PARSE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Metric:
+    """A named family of series, one per combination of label values."""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._series: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def _samples(self) -> Iterable[str]:
+        for key, value in sorted(self._series.items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str):
+        self._series[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            # Per-bucket counts (the last one is +Inf), sum.
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def _samples(self) -> Iterable[str]:
+        bounds = [_format_value(b) for b in self.buckets] + ["+Inf"]
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """Process-local metrics, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "bmu_http_request_duration_seconds", "Time until the response headers are sent, per route.",
+    ("route", "method", "status"),
+))
+http_requests_in_flight = registry.register(Gauge(
+    "bmu_http_requests_in_flight", "API requests currently being handled.",
+))
+upstream_request_duration = registry.register(Histogram(
+    "bmu_upstream_request_duration_seconds", "Upstream fetch time including the body, per page.",
+    ("page", "method", "status"),
+))
+upstream_response_bytes = registry.register(Histogram(
+    "bmu_upstream_response_bytes", "Upstream response body size, per page.",
+    ("page", "method"), SIZE_BUCKETS,
+))
+upstream_phase_duration = registry.register(Histogram(
+    "bmu_upstream_phase_seconds",
+    "Upstream time per phase and page: queue, connect and tls (new connections only), ttfb, transfer.",
+    ("page", "phase"),
+))
+upstream_viewstate_bytes = registry.register(Histogram(
+    "bmu_upstream_viewstate_bytes", "Size of the __VIEWSTATE value in upstream pages, per page.",
+    ("page",), SIZE_BUCKETS,
+))
+upstream_errors = registry.register(Counter(
+    "bmu_upstream_errors_total", "Upstream requests that failed without a response, per page.",
+    ("page", "error"),
+))
+upstream_requests_in_flight = registry.register(Gauge(
+    "bmu_upstream_requests_in_flight", "Upstream requests sent and not yet fully read.",
+))
+parse_duration = registry.register(Histogram(
+    "bmu_parse_duration_seconds", "HTML parse time per parser, including the wait for a pool worker.",
+    ("parser", "mode"), PARSE_BUCKETS,
+))
+parses_in_flight = registry.register(Gauge(
+    "bmu_parses_in_flight", "Parses running or queued for a pool worker.",
+))
+cache_requests = registry.register(Counter(
+    "bmu_cache_requests_total", "Cache lookups per cache and result (hit, stale, miss).",
+    ("cache", "result"),
+))
+singleflight_joined = registry.register(Counter(
+    "bmu_singleflight_joined_total", "Calls that joined an identical call already in flight.",
+    ("name",),
+))
+
+
+# Upstream pages the viewmodels fetch. Some paths come from API clients (LMS subject pages and postback
+# targets), so anything else is reported as "other" rather than becoming a series of its own.
+KNOWN_PAGES = (
+    "/",
+    "/Login.aspx",
+    "/Default.aspx",
+    "/StudentPanel/StudentDashboard.aspx",
+    "/StudentPanel/STU_Student/STU_Student_ProfileView.aspx",
+    "/StudentPanel/TTM_Attendance/TTM_Attendance_StudentAttendance.aspx",
+    "/StudentPanel/TTM_Attendance/TTM_Attendance_StudentAbsentDays.aspx",
+    "/AdminPanel/TimeTable/TTM_Attendance/TTM_AttendanceViewStudentAttendanceDetailByDate.aspx",
+    "/StudentPanel/TTM_TimeTable/TTM_TimeTable_StudentTimeTable.aspx",
+    "/StudentPanel/Fee/StudentFeeHistory.aspx",
+    "/StudentPanel/Fee/StudentFeeHistoryView.aspx",
+    "/StudentPanel/Fee/FEE_FeeDashboard.aspx",
+    "/StudentPanel/LMS/LMS_ContentStudentDashboard.aspx",
+    "/StudentPanel/LMS/LMS_ContentStudentSubjectDetails.aspx",
+    "/bmu_website/home/welcome",
+    "/bmu_website/institute/get_detail",
+)
+# ASP.NET paths are case-insensitive; the label keeps one spelling per page.
+_KNOWN_PAGES = {page.lower(): page for page in KNOWN_PAGES}
+
+
+def page_label(url) -> str:
+    """
+    The path of an upstream URL if it is one of KNOWN_PAGES, else "other". The query string (IDs,
+    dates) is dropped, since it would make every request its own series.
+    """
+    path = urlparse(str(url)).path or "/"
+    while "//" in path:
+        path = path.replace("//", "/")
+    return _KNOWN_PAGES.get(path.lower(), "other")
+
+
+def init_app(app):
+    """Record latency and in-flight counts for every request the app handles."""
+    from quart import g, request
+
+    @app.before_request
+    async def start_timer():
+        g.metrics_started = time.perf_counter()
+        http_requests_in_flight.inc()
+
+    @app.after_request
+    async def record_request(response):
+        started: Optional[float] = getattr(g, "metrics_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                route=route, method=request.method, status=str(response.status_code),
+            )
+        return response
+
+    @app.teardown_request
+    async def end_request(exc):
+        if getattr(g, "metrics_started", None) is not None:
+            http_requests_in_flight.dec()
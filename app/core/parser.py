@@ -0,0 +1,129 @@
+import re
+import logging
+from typing import Callable, Dict, Iterable, Optional
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from app.core.config import config
+
+logger = logging.getLogger("bmu.core.parser")
+
+# Tree builders in order of preference for PARSER_BACKEND=auto.
+_PREFERRED_BACKENDS = ("lxml", "html.parser")
+
+_backend: Optional[str] = None
+
+
+def _is_available(backend: str) -> bool:
+    if backend == "html.parser":
+        return True
+    if backend == "lxml":
+        try:
+            import lxml  # noqa: F401
+        except ImportError:
+            return False
+        return True
+    return False
+
+
+def get_backend() -> str:
+    """Resolve the configured PARSER_BACKEND once, falling back to the stdlib parser."""
+    global _backend
+    if _backend is None:
+        wanted = config.PARSER_BACKEND
+        if wanted == "auto":
+            _backend = next(b for b in _PREFERRED_BACKENDS if _is_available(b))
+        elif _is_available(wanted):
+            _backend = wanted
+        else:
+            logger.warning(f"Parser backend '{wanted}' not available, falling back to html.parser.")
+            _backend = "html.parser"
+        logger.info(f"HTML parser backend: {_backend}")
+    return _backend
+
+
+class ExtractSpec:
+    """
+    Declares the regions of a page a parser actually reads. Elements whose id is listed
+    (or starts with a listed prefix), that carry a listed class, or that are hidden inputs
+    are tree-built together with everything inside them; the rest of the page is skipped.
+    """
+
+    def __init__(
+        self,
+        ids: Iterable[str] = (),
+        id_prefixes: Iterable[str] = (),
+        classes: Iterable[str] = (),
+        hidden_inputs: bool = False,
+    ):
+        self.ids = frozenset(ids)
+        self.id_prefixes = tuple(id_prefixes)
+        self.classes = frozenset(classes)
+        self.hidden_inputs = hidden_inputs
+
+    def matches(self, name: str, attrs) -> bool:
+        _id = attrs.get("id")
+        if _id and (_id in self.ids or _id.startswith(self.id_prefixes)):
+            return True
+        if self.classes:
+            classes = attrs.get("class") or ()
+            if isinstance(classes, str):
+                classes = classes.split()
+            if not self.classes.isdisjoint(classes):
+                return True
+        return self.hidden_inputs and name == "input" and str(attrs.get("type", "")).lower() == "hidden"
+
+    def with_hidden_inputs(self) -> "ExtractSpec":
+        return ExtractSpec(self.ids, self.id_prefixes, self.classes, hidden_inputs=True)
+
+    def strainer(self) -> SoupStrainer:
+        return _SpecStrainer(self)
+
+
+class _SpecStrainer(SoupStrainer):
+    """SoupStrainer driven by an ExtractSpec; an element's subtree is kept once the element itself matches."""
+
+    def __init__(self, spec: ExtractSpec):
+        super().__init__()
+        self.spec = spec
+
+    def allow_tag_creation(self, nsprefix, name, attrs) -> bool:
+        return self.spec.matches(name, attrs or {})
+
+    def allow_string_creation(self, string) -> bool:
+        return False
+
+
+def extracts(spec: ExtractSpec) -> Callable:
+    """Attach an ExtractSpec to a `_parse_*` method; ParseExecutor then builds only those regions."""
+    def decorator(parse_fn):
+        parse_fn.extract_spec = spec
+        return parse_fn
+    return decorator
+
+
+def parse_html(markup, parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+    """
+    Build a soup for a portal page with the fastest available tree builder.
+    The result is a regular BeautifulSoup object, so every `_parse_*` method
+    keeps working unchanged regardless of the backend.
+    """
+    return BeautifulSoup(markup, get_backend(), parse_only=parse_only)
+
+
+_LOGIN_FORM_RE = re.compile(r"""id=["']?txtUsername\b""")
+
+
+def is_login_page(markup: str) -> bool:
+    """Cheap check for the portal's login form, so expired sessions are caught without building a tree."""
+    return _LOGIN_FORM_RE.search(markup) is not None
+
+
+@extracts(ExtractSpec(hidden_inputs=True))
+def parse_hidden_fields(soup: BeautifulSoup) -> Dict[str, str]:
+    """Collect an ASP.NET page's hidden inputs (__VIEWSTATE and friends) for a postback."""
+    return {
+        tag.get("name"): tag.get("value", "")
+        for tag in soup.select("input[type=hidden]")
+        if tag.get("name")
+    }
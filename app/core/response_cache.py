@@ -0,0 +1,117 @@
+import json
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from quart import request
+from werkzeug.http import quote_etag
+
+from app.core.cache import TTLCache
+from app.core.config import config
+from app.core.sessions import PortalSession, session_store
+
+logger = logging.getLogger("bmu.core.response_cache")
+
+
+def _parse_ttls(raw: str) -> Dict[str, int]:
+    """Parse RESPONSE_CACHE_TTLS, e.g. "profile=3600,fees=600"."""
+    ttls = {}
+    for part in raw.split(","):
+        name, _, seconds = part.partition("=")
+        if name.strip() and seconds.strip():
+            try:
+                ttls[name.strip()] = int(seconds)
+            except ValueError:
+                logger.warning(f"Ignoring invalid RESPONSE_CACHE_TTLS entry: {part!r}")
+    return ttls
+
+
+def compute_etag(value: Any) -> str:
+    """Content hash of a viewmodel result, stable across workers and restarts."""
+    payload = value.dict() if hasattr(value, "dict") else value
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Per-session cache of viewmodel results, keyed by session + endpoint + arguments.
+    Each entry carries the ETag of its content, computed once when it is loaded.
+    """
+
+    def __init__(self, default_ttl: int, ttls: Dict[str, int], maxsize: int):
+        self.default_ttl = default_ttl
+        self.ttls = ttls
+        self._cache = TTLCache(ttl=default_ttl, maxsize=maxsize, name="responses")
+
+    def ttl_for(self, endpoint: str) -> int:
+        return self.ttls.get(endpoint, self.default_ttl)
+
+    async def fetch(
+        self,
+        session: PortalSession,
+        endpoint: str,
+        fn: Callable[..., Awaitable[Any]],
+        *args,
+        refresh: bool = False,
+    ) -> Tuple[Any, str]:
+        """
+        Return (result, etag) for `fn(session_cookies, *args)` via the session store,
+        from cache unless `refresh` is set or the endpoint's TTL is 0.
+        """
+        ttl = self.ttl_for(endpoint)
+        if ttl <= 0:
+            value = await session_store.call(session, fn, *args)
+            return value, compute_etag(value)
+
+        key = (session.key, endpoint, args)
+
+        async def load():
+            value = await session_store.call(session, fn, *args)
+            return value, compute_etag(value)
+
+        if refresh:
+            value, etag = await self._cache.refresh(key, load, ttl)
+        else:
+            value, etag = await self._cache.get_or_load(key, load, ttl)
+
+        # Partial results (e.g. an overview with failed sections) are not worth keeping.
+        if getattr(value, "errors", None):
+            self._cache.invalidate(key)
+
+        return value, etag
+
+    def invalidate_session(self, session: PortalSession):
+        """Drop every cached result of a session, e.g. after it changed something upstream."""
+        session_key = session.key
+        for key in self._cache.keys():
+            if key[0] == session_key:
+                self._cache.invalidate(key)
+
+
+def wants_refresh(data: Optional[Dict[str, Any]]) -> bool:
+    """Explicit bypass: `"refresh": true` in the body or `Cache-Control: no-cache`."""
+    if data and data.get("refresh") is True:
+        return True
+    return "no-cache" in request.headers.get("Cache-Control", "").lower()
+
+
+def is_not_modified(etag: str) -> bool:
+    # If-None-Match uses weak comparison (RFC 9110 13.1.2): proxies and CDNs may hand back W/"...".
+    return request.if_none_match.contains_weak(etag)
+
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    # private: per-student data; no-cache: clients must revalidate (cheaply, via If-None-Match).
+    return {"ETag": quote_etag(etag), "Cache-Control": "private, no-cache"}
+
+
+def not_modified(etag: str):
+    return "", 304, etag_headers(etag)
+
+
+response_cache = ResponseCache(
+    default_ttl=config.RESPONSE_CACHE_TTL,
+    ttls=_parse_ttls(config.RESPONSE_CACHE_TTLS),
+    maxsize=config.RESPONSE_CACHE_SIZE,
+)
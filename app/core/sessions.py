@@ -0,0 +1,263 @@
+import time
+import asyncio
+import secrets
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from app.core.client import build_cookie_jar, cookie_fingerprint
+from app.core.config import config
+
+logger = logging.getLogger("bmu.core.sessions")
+
+
+class PortalSessionExpiredError(Exception):
+    """
+    Marker base for module errors raised when the portal bounces a request to Login.aspx.
+    Each module subclasses it alongside its own error base so routes keep their 401 mapping.
+    """
+    pass
+
+
+class PortalSession:
+    """A student's portal cookie jar, addressed by an opaque token handed to the mobile client."""
+
+    __slots__ = ("token", "cookies", "username", "google_id", "created_at", "expires_at")
+
+    def __init__(
+        self,
+        token: Optional[str],
+        cookies: httpx.Cookies,
+        username: Optional[str] = None,
+        google_id: Optional[str] = None,
+        created_at: Optional[float] = None,
+        expires_at: Optional[float] = None,
+    ):
+        self.token = token
+        self.cookies = cookies
+        self.username = username
+        self.google_id = google_id
+        self.created_at = created_at or time.time()
+        self.expires_at = expires_at or (self.created_at + config.SESSION_TTL)
+
+    @property
+    def key(self) -> str:
+        """
+        Stable identifier for per-session state. Raw-cookie sessions (no token)
+        are keyed by a digest of their cookies so repeated requests still match.
+        """
+        if self.token:
+            return self.token
+        return "c:" + cookie_fingerprint(self.cookies)
+
+    @property
+    def file_owner(self) -> Optional[str]:
+        """
+        Who files cached for this session belong to. None for a session without cookies: anyone can
+        send an empty cookie set, so it must never be served a cached document.
+        """
+        if not len(self.cookies.jar):
+            return None
+        return self.username or self.key
+
+    @property
+    def is_expired(self) -> bool:
+        return self.expires_at <= time.time()
+
+    def cookie_dict(self) -> Dict[str, str]:
+        return {c.name: c.value for c in self.cookies.jar}
+
+    def to_document(self) -> Dict[str, Any]:
+        return {
+            "_id": self.token,
+            "cookies": self.cookie_dict(),
+            "username": self.username,
+            "google_id": self.google_id,
+            "created_at": self.created_at,
+            "expires_at": self.expires_at,
+            # Native date copy for MongoDB's TTL index.
+            "expires_on": datetime.fromtimestamp(self.expires_at, tz=timezone.utc),
+        }
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "PortalSession":
+        return cls(
+            token=doc["_id"],
+            cookies=build_cookie_jar(doc.get("cookies") or {}),
+            username=doc.get("username"),
+            google_id=doc.get("google_id"),
+            created_at=doc.get("created_at"),
+            expires_at=doc.get("expires_at"),
+        )
+
+
+class SessionStore:
+    """
+    In-memory LRU of PortalSessions keyed by token, optionally written through
+    to MongoDB (SESSION_BACKEND=mongo) so tokens survive restarts and are shared
+    between workers.
+    """
+
+    def __init__(self, maxsize: int, backend: str = "memory"):
+        self.maxsize = maxsize
+        self.backend = backend
+        self._sessions: "OrderedDict[str, PortalSession]" = OrderedDict()
+        self._reauthenticate: Optional[Callable[[PortalSession], Awaitable[Optional[Dict[str, str]]]]] = None
+        self._refreshing: Dict[str, asyncio.Future] = {}
+
+    @property
+    def _collection(self):
+        if self.backend != "mongo":
+            return None
+        from app.core.database import sessions_collection
+        return sessions_collection
+
+    def _remember(self, session: PortalSession):
+        self._sessions[session.token] = session
+        self._sessions.move_to_end(session.token)
+        while len(self._sessions) > self.maxsize:
+            self._sessions.popitem(last=False)
+
+    async def create(self, session_cookies: Dict[str, str], username: Optional[str] = None, google_id: Optional[str] = None) -> PortalSession:
+        session = PortalSession(
+            token=secrets.token_urlsafe(18),
+            cookies=build_cookie_jar(session_cookies),
+            username=username,
+            google_id=google_id,
+        )
+        self._remember(session)
+
+        collection = self._collection
+        if collection is not None:
+            try:
+                await collection.insert_one(session.to_document())
+            except Exception as e:
+                logger.error(f"Failed to persist session: {e}", exc_info=True)
+
+        return session
+
+    async def get(self, token: str) -> Optional[PortalSession]:
+        session = self._sessions.get(token)
+
+        if session is None:
+            collection = self._collection
+            if collection is not None:
+                try:
+                    doc = await collection.find_one({"_id": token})
+                except Exception as e:
+                    logger.error(f"Failed to load session: {e}", exc_info=True)
+                    doc = None
+                if doc:
+                    session = PortalSession.from_document(doc)
+                    self._remember(session)
+
+        if session is None:
+            return None
+
+        if session.is_expired:
+            await self.delete(token)
+            return None
+
+        self._sessions.move_to_end(token)
+        return session
+
+    async def delete(self, token: str):
+        self._sessions.pop(token, None)
+
+        collection = self._collection
+        if collection is not None:
+            try:
+                await collection.delete_one({"_id": token})
+            except Exception as e:
+                logger.error(f"Failed to delete session: {e}", exc_info=True)
+
+    async def resolve(self, data: Dict[str, Any]) -> Optional[PortalSession]:
+        """
+        Resolve the session for a request body carrying either a 'session_token'
+        or (legacy) raw 'session_cookies'. Returns None for unknown or expired tokens.
+        """
+        token = data.get("session_token")
+        if token:
+            return await self.get(token)
+
+        session_cookies = data.get("session_cookies")
+        if isinstance(session_cookies, dict):
+            return PortalSession(token=None, cookies=build_cookie_jar(session_cookies))
+
+        return None
+
+    def set_reauthenticator(self, reauthenticate: Callable[[PortalSession], Awaitable[Optional[Dict[str, str]]]]):
+        """
+        Register the coroutine used to log a session's user back in. It returns fresh
+        portal cookies, or None when no stored credentials exist for that user.
+        """
+        self._reauthenticate = reauthenticate
+
+    async def refresh(self, session: PortalSession) -> bool:
+        """
+        Re-login the session's user and swap in the new cookie jar.
+        Single-flight per user: concurrent expiries for the same student share one upstream login.
+        """
+        if not session.token or self._reauthenticate is None:
+            return False
+
+        flight_key = session.username or session.google_id or session.token
+        future = self._refreshing.get(flight_key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._refreshing[flight_key] = future
+            try:
+                new_cookies = await self._reauthenticate(session)
+                future.set_result(new_cookies)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                logger.warning(f"Session refresh failed for {flight_key}: {e}")
+                future.set_result(None)
+            finally:
+                self._refreshing.pop(flight_key, None)
+
+        new_cookies = await asyncio.shield(future)
+        if not new_cookies:
+            return False
+
+        session.cookies = build_cookie_jar(new_cookies)
+        collection = self._collection
+        if collection is not None:
+            try:
+                await collection.update_one({"_id": session.token}, {"$set": {"cookies": new_cookies}})
+            except Exception as e:
+                logger.error(f"Failed to persist refreshed session: {e}", exc_info=True)
+
+        logger.info(f"Portal session transparently refreshed for {flight_key}.")
+        return True
+
+    async def call(self, session: PortalSession, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Run a viewmodel call with the session's cookies. If the portal session has expired
+        and the user has stored credentials, log in again once and replay the call.
+        """
+        cookies = session.cookies
+        try:
+            return await fn(cookies, *args, **kwargs)
+        except PortalSessionExpiredError:
+            # Another request may already have swapped in a fresh jar while this one was in flight.
+            if session.cookies is cookies and not await self.refresh(session):
+                raise
+            return await fn(session.cookies, *args, **kwargs)
+
+    async def ensure_indexes(self):
+        collection = self._collection
+        if collection is None:
+            return
+        try:
+            await collection.create_index("expires_on", expireAfterSeconds=0)
+        except Exception as e:
+            logger.warning(f"Could not create session TTL index: {e}")
+
+
+session_store = SessionStore(maxsize=config.SESSION_CACHE_SIZE, backend=config.SESSION_BACKEND)
@@ -0,0 +1,61 @@
+import asyncio
+import functools
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from app.core import metrics
+from app.core.client import cookie_fingerprint
+
+logger = logging.getLogger("bmu.core.singleflight")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for a key is in flight, later
+    callers with the same key await its result instead of starting their own.
+    The call runs as its own task, so a caller that is cancelled (client disconnect, timeout)
+    only stops waiting; the others still get the result.
+    Nothing is kept once the call finishes, so freshness is unchanged.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            logger.debug(f"[{self.name}] Joined in-flight call for {key!r}")
+            metrics.singleflight_joined.inc(name=self.name)
+        else:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark retrieved so an exception nobody awaited (every caller gave up) is not logged as unhandled.
+        if not task.cancelled():
+            task.exception()
+
+
+portal_flight = SingleFlight(name="portal")
+
+
+def coalesce(method: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """
+    Decorate a viewmodel fetch `method(self, session_cookies, *args)` so concurrent identical
+    calls share one upstream request and one parse. The key is the session's cookies plus the
+    method and its arguments, which together determine the portal URL and form payload.
+    Only use it on read-only fetches.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, session_cookies, *args, **kwargs):
+        key = (cookie_fingerprint(session_cookies), method.__qualname__, args, tuple(sorted(kwargs.items())))
+        return await portal_flight.do(key, lambda: method(self, session_cookies, *args, **kwargs))
+    return wrapper
@@ -0,0 +1,223 @@
+import re
+import logging
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+from quart import Response
+
+from app.core.filecache import CachedFile, FileCacheWriter
+
+logger = logging.getLogger("bmu.core.streaming")
+
+_RANGE_RE = re.compile(r"^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$", re.IGNORECASE)
+
+
+def parse_range(header: Optional[str]) -> Optional[Tuple[Optional[int], Optional[int]]]:
+    """
+    Parse a single-range `Range: bytes=start-end` header into (start, end); either side may be None
+    (`bytes=500-`, `bytes=-500`). Multi-range and malformed headers return None, i.e. serve everything.
+    """
+    match = _RANGE_RE.match(header or "")
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = (int(g) if g else None for g in match.groups())
+    if start is not None and end is not None and end < start:
+        return None
+    return start, end
+
+
+def resolve_range(requested: Tuple[Optional[int], Optional[int]], total: Optional[int]) -> Optional[Tuple[int, int]]:
+    """
+    Turn a parsed range into inclusive (first, last) byte positions.
+    Returns None when it cannot be served as a partial response without knowing the total size.
+    Raises ValueError when the range lies entirely outside a body of known size.
+    """
+    start, end = requested
+    if start is None:
+        if total is None:
+            return None
+        start, end = max(total - end, 0), total - 1
+    elif end is None or (total is not None and end >= total):
+        if total is None:
+            return None
+        end = total - 1
+
+    if total is not None and (start >= total or total == 0):
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+class UpstreamStream:
+    """
+    An upstream portal response whose body has not been read yet.
+    It owns the client scope it was opened with; aclose() releases the response and the scope.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, response: httpx.Response):
+        self.client = client
+        self.response = response
+
+    @classmethod
+    async def open(cls, client: httpx.AsyncClient, method: str, url: str, **kwargs) -> "UpstreamStream":
+        request = client.build_request(method, url, **kwargs)
+        response = await client.send(request, stream=True)
+        return cls(client, response)
+
+    @property
+    def status_code(self) -> int:
+        return self.response.status_code
+
+    @property
+    def content_type(self) -> str:
+        return self.response.headers.get("content-type", "").lower()
+
+    @property
+    def content_length(self) -> Optional[int]:
+        # Content-Length describes the encoded body; only trust it when httpx passes bytes through as-is.
+        if self.response.headers.get("content-encoding", "identity").lower() != "identity":
+            return None
+        length = self.response.headers.get("content-length")
+        return int(length) if length and length.isdigit() else None
+
+    @property
+    def filename(self) -> Optional[str]:
+        cd = self.response.headers.get("content-disposition")
+        if cd and "filename=" in cd:
+            return cd.split("filename=")[1].split(";")[0].strip().strip('"')
+        return None
+
+    async def iter_bytes(self, first: int = 0, last: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield the body chunk by chunk, trimmed to bytes first..last (inclusive)."""
+        position = 0
+        async for chunk in self.response.aiter_bytes():
+            chunk_start, position = position, position + len(chunk)
+            if position <= first:
+                continue
+            if last is not None and chunk_start > last:
+                break
+            yield chunk[max(first - chunk_start, 0):None if last is None else last + 1 - chunk_start]
+            if last is not None and position > last:
+                break
+
+    async def aclose(self):
+        await self.response.aclose()
+        await self.client.aclose()
+
+
+def _file_headers(filename: Optional[str], disposition: str) -> Dict[str, str]:
+    headers = {
+        "Accept-Ranges": "bytes",
+        # Per-student documents: never store them in shared caches.
+        "Cache-Control": "private, no-store",
+    }
+    if filename:
+        headers["Content-Disposition"] = f'{disposition}; filename="{filename}"'
+    return headers
+
+
+def _streaming_response(body: AsyncIterator[bytes], status: int, headers: Dict[str, str], mimetype: str) -> Response:
+    response = Response(body, status=status, headers=headers, mimetype=mimetype)
+    # Large files over slow links legitimately outlive RESPONSE_TIMEOUT.
+    response.timeout = None
+    return response
+
+
+async def stream_file_response(
+    stream: UpstreamStream,
+    mimetype: str,
+    filename: Optional[str] = None,
+    range_header: Optional[str] = None,
+    tee: Optional[FileCacheWriter] = None,
+    disposition: str = "inline",
+) -> Response:
+    """
+    Relay an UpstreamStream to the client without buffering it.
+    Honours a single `Range` request: passed through when the portal answered 206 itself,
+    otherwise served by trimming the upstream body. The length is forwarded when the portal
+    sends one; without it the body goes out with chunked transfer encoding.
+    A `tee` writer receives a copy of the body and is committed once it was relayed in full.
+    """
+    total = stream.content_length
+    headers = _file_headers(filename, disposition)
+
+    status, first, last = 200, 0, None
+    if stream.status_code == 206:
+        status = 206
+        if stream.response.headers.get("content-range"):
+            headers["Content-Range"] = stream.response.headers["content-range"]
+    else:
+        requested = parse_range(range_header)
+        try:
+            span = resolve_range(requested, total) if requested else None
+        except ValueError:
+            await stream.aclose()
+            headers["Content-Range"] = f"bytes */{total}"
+            return Response("", status=416, headers=headers)
+        if span:
+            status, (first, last) = 206, span
+            if total is None:
+                headers["Content-Range"] = f"bytes {first}-{last}/*"
+            else:
+                headers["Content-Range"] = f"bytes {first}-{last}/{total}"
+                total = last - first + 1
+
+    if total is not None:
+        headers["Content-Length"] = str(total)
+
+    if tee is not None and status != 200:
+        # Only a complete body is worth keeping.
+        tee.abort()
+        tee = None
+
+    async def body():
+        completed = False
+        try:
+            async for chunk in stream.iter_bytes(first, last):
+                if tee is not None:
+                    await tee.write(chunk)
+                yield chunk
+            completed = True
+        finally:
+            await stream.aclose()
+            if tee is not None:
+                if completed:
+                    await tee.commit()
+                else:
+                    tee.abort()
+
+    return _streaming_response(body(), status, headers, mimetype)
+
+
+async def cached_file_response(
+    cached: CachedFile,
+    mimetype: str,
+    filename: Optional[str] = None,
+    range_header: Optional[str] = None,
+    disposition: str = "inline",
+) -> Response:
+    """
+    Serve a file-cache blob (as returned by FileCache.get, i.e. held open) with the same Range handling
+    as live streams. Chunks are read on worker threads; the blob is released once the body is done.
+    """
+    total = cached.size
+    headers = _file_headers(filename, disposition)
+
+    status, first, last = 200, 0, total - 1
+    requested = parse_range(range_header)
+    if requested:
+        try:
+            first, last = resolve_range(requested, total)
+        except ValueError:
+            cached.close()
+            headers["Content-Range"] = f"bytes */{total}"
+            return Response("", status=416, headers=headers)
+        status = 206
+        headers["Content-Range"] = f"bytes {first}-{last}/{total}"
+
+    headers["Content-Length"] = str(last - first + 1)
+
+    async def body():
+        async for chunk in cached.iter_chunks(first, last):
+            yield chunk
+
+    return _streaming_response(body(), status, headers, mimetype)
@@ -0,0 +1,185 @@
+import time
+import zlib
+import logging
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.core import metrics
+from app.core.config import config
+
+logger = logging.getLogger("bmu.core.timing")
+
+# queue: waiting for a pooled connection; connect: TCP (and DNS) for a new one; tls: its handshake;
+# ttfb: request sent -> response headers (the portal's think time plus one round trip); transfer: the body.
+PHASES = ("queue", "connect", "tls", "ttfb", "transfer")
+
+# Upstream fetches made on behalf of the API request being handled (None outside a request).
+_fetches: ContextVar[Optional[List["UpstreamTiming"]]] = ContextVar("upstream_fetches", default=None)
+
+
+class ViewStateMeter:
+    """
+    Measures the __VIEWSTATE value of a page as its body streams past, without keeping the body.
+    Handles full pages and UpdatePanel deltas, identity/gzip/deflate bodies; anything else stays unmeasured.
+    """
+    MARKERS = ((b'id="__VIEWSTATE" value="', b'"'), (b"|__VIEWSTATE|", b"|"))
+
+    def __init__(self, content_encoding: str):
+        encoding = content_encoding.strip().lower()
+        self._decoder = None
+        self.done = False
+        if encoding == "gzip":
+            self._decoder = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        elif encoding == "deflate":
+            self._decoder = zlib.decompressobj()
+        elif encoding not in ("", "identity"):
+            self.done = True
+        self._tail = b""
+        self._terminator: Optional[bytes] = None
+        self.size: Optional[int] = None
+
+    def feed(self, chunk: bytes):
+        if self.done:
+            return
+        if self._decoder is not None:
+            try:
+                chunk = self._decoder.decompress(chunk)
+            except zlib.error:
+                self.done, self.size = True, None
+                return
+
+        if self._terminator is None:
+            data = self._tail + chunk
+            for marker, terminator in self.MARKERS:
+                index = data.find(marker)
+                if index >= 0:
+                    self._terminator, self.size = terminator, 0
+                    chunk = data[index + len(marker):]
+                    break
+            else:
+                self._tail = data[-32:]
+                return
+
+        end = chunk.find(self._terminator)
+        if end >= 0:
+            self.size += end
+            self.done, self._decoder = True, None
+        else:
+            self.size += len(chunk)
+
+
+class UpstreamTiming:
+    """Phase timings of one upstream request, filled in from httpcore's `trace` events."""
+
+    def __init__(self, request: httpx.Request):
+        self.method = request.method
+        self.page = metrics.page_label(request.url)
+        self.started = time.perf_counter()
+        self.responded: Optional[float] = None
+        self.status: Optional[int] = None
+        self.bytes = 0
+        self.viewstate_bytes: Optional[int] = None
+        self.total: Optional[float] = None
+        self.phases: Dict[str, float] = {}
+        self._marks: Dict[str, float] = {}
+        self._headers: Optional[float] = None
+
+        fetches = _fetches.get()
+        if fetches is not None:
+            fetches.append(self)
+
+    async def trace(self, event: str, info: dict):
+        # "connection.connect_tcp.started", "http11.send_request_headers.started", "http2.receive_response_headers.complete", ...
+        self._marks.setdefault(event.partition(".")[2], time.perf_counter())
+
+    def response_started(self, status_code: int):
+        """Called when the response headers arrived: everything up to the body is known from here on."""
+        self.responded = time.perf_counter()
+        self.status = status_code
+
+        marks = self._marks
+        sent = marks.get("send_request_headers.started")
+        opened = marks.get("connect_tcp.started", sent)
+        if opened is not None:
+            self.phases["queue"] = opened - self.started
+        if "connect_tcp.complete" in marks and "connect_tcp.started" in marks:
+            self.phases["connect"] = marks["connect_tcp.complete"] - marks["connect_tcp.started"]
+        if "start_tls.complete" in marks and "start_tls.started" in marks:
+            self.phases["tls"] = marks["start_tls.complete"] - marks["start_tls.started"]
+        self._headers = marks.get("receive_response_headers.complete", self.responded)
+        self.phases["ttfb"] = self._headers - (sent or self.started)
+
+    def finish(self, size: int, viewstate_bytes: Optional[int] = None):
+        """Called once the body has been read (or abandoned)."""
+        end = time.perf_counter()
+        self.phases["transfer"] = end - self._headers
+        self.total = end - self.started
+        self.bytes = size
+        self.viewstate_bytes = viewstate_bytes
+        self._report()
+
+    @property
+    def elapsed(self) -> float:
+        """Time spent so far; a streamed body may still be downloading."""
+        return self.total if self.total is not None else time.perf_counter() - self.started
+
+    def _report(self):
+        status = str(self.status)
+        metrics.upstream_request_duration.observe(self.total, page=self.page, method=self.method, status=status)
+        metrics.upstream_response_bytes.observe(self.bytes, page=self.page, method=self.method)
+        for phase, seconds in self.phases.items():
+            metrics.upstream_phase_duration.observe(seconds, page=self.page, phase=phase)
+        if self.viewstate_bytes is not None:
+            metrics.upstream_viewstate_bytes.observe(self.viewstate_bytes, page=self.page)
+
+        if self.total * 1000 >= config.UPSTREAM_SLOW_MS:
+            logger.warning(f"Slow upstream fetch: {self}")
+        else:
+            logger.debug(f"Upstream fetch: {self}")
+
+    def __str__(self):
+        phases = " ".join(f"{p}={self.phases[p] * 1000:.0f}ms" for p in PHASES if p in self.phases)
+        viewstate = f" viewstate={self.viewstate_bytes}B" if self.viewstate_bytes is not None else ""
+        return (
+            f"{self.method} {self.page} {self.status} total={(self.total or 0) * 1000:.0f}ms "
+            f"{phases} bytes={self.bytes}{viewstate}"
+        )
+
+
+def current_fetches() -> List[UpstreamTiming]:
+    """Upstream fetches made so far for the API request being handled."""
+    return list(_fetches.get() or ())
+
+
+def server_timing(fetches: List[UpstreamTiming]) -> str:
+    """
+    A `Server-Timing` value summing the phases of the fetches that got a response. Streamed bodies may
+    still be downloading, and concurrent fetches overlap, so the sums need not add up to the wall time.
+    """
+    answered = [f for f in fetches if f.responded is not None]
+    entries = [
+        f'upstream;dur={sum(f.elapsed for f in answered) * 1000:.1f};desc="{len(answered)} fetches, {sum(f.bytes for f in answered)} bytes"'
+    ]
+    for phase in PHASES:
+        spent = [f.phases[phase] for f in answered if phase in f.phases]
+        if spent:
+            entries.append(f"upstream-{phase};dur={sum(spent) * 1000:.1f}")
+    viewstate = sum(f.viewstate_bytes for f in answered if f.viewstate_bytes)
+    if viewstate:
+        entries.append(f'viewstate;desc="{viewstate} bytes"')
+    return ", ".join(entries)
+
+
+def init_app(app):
+    """Collect the upstream fetches of every request, and report them in `Server-Timing` when enabled."""
+    @app.before_request
+    async def start_collecting():
+        _fetches.set([])
+
+    if config.SERVER_TIMING_ENABLED:
+        @app.after_request
+        async def add_server_timing(response):
+            response.headers["Server-Timing"] = server_timing(current_fetches())
+            return response
@@ -1,5 +1,7 @@
 from quart import Blueprint, request, jsonify
 from app.modules.auth.viewmodel import auth_viewmodel, AuthError, AuthenticationError, ExternalServiceError
+from app.core.sessions import session_store
+from app.core.response_cache import response_cache
 import logging
 
 logger = logging.getLogger("bmu.modules.auth")
@@ -31,7 +33,10 @@ async def login():
         logger.info(f"[BMU] /login called for user: {username}")
 
         result = await auth_viewmodel.login_with_credentials(username, password)
-        
+
+        session = await session_store.create(result["session_cookies"], username=username)
+        result["session_token"] = session.token
+
         return jsonify({
             "success": True,
             "message": "Login successful.",
@@ -93,6 +98,9 @@ async def google_auth():
 
         result = await auth_viewmodel.google_login(google_id, username, password)
 
+        session = await session_store.create(result["session_cookies"], username=result.get("username"), google_id=google_id)
+        result["session_token"] = session.token
+
         return jsonify({
             "success": True,
             "message": "Google login successful.",
@@ -134,14 +142,14 @@ async def validate_session():
                 "message": "Request body must be valid JSON."
             }), 400
 
-        if "session_cookies" not in data:
+        if "session_token" not in data and "session_cookies" not in data:
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
-        valid = await auth_viewmodel.check_student_session(session_cookies)
+        session = await session_store.resolve(data)
+        valid = await auth_viewmodel.check_student_session(session.cookies) if session else False
 
         return jsonify({
             "success": True,
@@ -166,14 +174,23 @@ async def logout():
     """
     try:
         data = await request.get_json()
-        if not data or "session_cookies" not in data:
+        if not data or ("session_token" not in data and "session_cookies" not in data):
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
-        await auth_viewmodel.logout(session_cookies)
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
+        await auth_viewmodel.logout(session.cookies)
+        response_cache.invalidate_session(session)
+        if session.token:
+            await session_store.delete(session.token)
 
         return jsonify({
             "success": True,
@@ -1,7 +1,10 @@
 import logging
 import asyncio
 import httpx
-from app.core.client import BMUClient
+from typing import Optional
+from app.core.cache import TTLCache
+from app.core.client import BMUClient, DEFAULT_HEADERS
+from app.core.parser import is_login_page, parse_html
 from app.core.config import config
 from app.modules.auth.models import AuthModel
 
@@ -23,16 +26,64 @@ class ExternalServiceError(AuthError):
     pass
 
 class AuthViewModel:
-    BASE_URL = "https://bmu.gnums.co.in/Login.aspx"
+    BASE_URL = f"{config.BMU_PORTAL_URL}/Login.aspx"
+    LOGIN_STATE_KEY = "login_form_state"
+    LOGIN_SUCCESS_PATHS = ["Default.aspx", "StudentPanel/StudentDashboard.aspx"]
+
+    def __init__(self):
+        # Login.aspx hidden fields are page-global, so most logins can skip the GET and go straight to the POST.
+        self._login_state_cache = TTLCache(ttl=config.LOGIN_STATE_TTL, maxsize=1, name="login_state")
+
+    async def _load_login_state(self):
+        async with BMUClient.session(headers=DEFAULT_HEADERS) as client:
+            return await self._get_initial_login_page(client)
+
+    async def _get_cached_login_state(self):
+        return await self._login_state_cache.get_or_load(self.LOGIN_STATE_KEY, self._load_login_state)
+
+    async def _refresh_login_state(self, rejected: dict):
+        """
+        Replace a login state the portal rejected (e.g. after an app-pool recycle). Concurrent logins
+        share one Login.aspx fetch, and a state another login already replaced is reused as-is.
+        """
+        current = self._login_state_cache.get(self.LOGIN_STATE_KEY)
+        if current is not None and current is not rejected:
+            return current
+        return await self._login_state_cache.refresh(self.LOGIN_STATE_KEY, self._load_login_state)
+
+    def _build_login_payload(self, login_state: dict, username: str, password: str) -> dict:
+        return {
+            "__EVENTTARGET": "",
+            "__EVENTARGUMENT": "",
+            "__LASTFOCUS": "",
+            "__VIEWSTATE": login_state.get("__VIEWSTATE", ""),
+            "__VIEWSTATEGENERATOR": login_state.get("__VIEWSTATEGENERATOR", ""),
+            "__EVENTVALIDATION": login_state.get("__EVENTVALIDATION", ""),
+            "__VIEWSTATEENCRYPTED": login_state.get("__VIEWSTATEENCRYPTED", ""),
+            "hfWidth": login_state.get("hfWidth", ""),
+            "hfHeight": login_state.get("hfHeight", ""),
+            "hfLoginMethod": login_state.get("hfLoginMethod", ""),
+            "rblRole": "Student",
+            "txtUsername": username,
+            "txtPassword": password,
+            "btnLogin": "Login",
+        }
+
+    def _is_rejected_login_state(self, response: httpx.Response) -> bool:
+        """ViewState/EventValidation failures surface as a 5xx or a redirect to the error page."""
+        if response.status_code >= 500:
+            return True
+        if response.status_code == 302:
+            location = response.headers.get("Location", "")
+            return not any(x in location for x in self.LOGIN_SUCCESS_PATHS)
+        return False
 
-    async def _get_initial_login_page(self):
-        client = BMUClient.get_client()
+    async def _get_initial_login_page(self, client: httpx.AsyncClient):
         try:
             response = await client.get(self.BASE_URL)
             response.raise_for_status()
 
-            from bs4 import BeautifulSoup
-            soup = BeautifulSoup(response.text, "html.parser")
+            soup = parse_html(response.text)
 
             def val(_id):
                 el = soup.find("input", {"id": _id})
@@ -61,57 +112,10 @@ class AuthViewModel:
 
     async def login_with_credentials(self, username: str, password: str, retries: int = 3, backoff: float = 2.0):
         logger.info(f"Attempting login for user: {username}")
-        client = BMUClient.get_client()
 
         try:
-            login_state = await self._get_initial_login_page()
-            
-            payload = {
-                "__EVENTTARGET": "",
-                "__EVENTARGUMENT": "",
-                "__LASTFOCUS": "",
-                "__VIEWSTATE": login_state.get("__VIEWSTATE", ""),
-                "__VIEWSTATEGENERATOR": login_state.get("__VIEWSTATEGENERATOR", ""),
-                "__EVENTVALIDATION": login_state.get("__EVENTVALIDATION", ""),
-                "__VIEWSTATEENCRYPTED": login_state.get("__VIEWSTATEENCRYPTED", ""),
-                "hfWidth": login_state.get("hfWidth", ""),
-                "hfHeight": login_state.get("hfHeight", ""),
-                "hfLoginMethod": login_state.get("hfLoginMethod", ""),
-                "rblRole": "Student",
-                "txtUsername": username,
-                "txtPassword": password,
-                "btnLogin": "Login",
-            }
-
-            for attempt in range(1, retries + 1):
-                try:
-                    client.follow_redirects = False
-                    response = await client.post(self.BASE_URL, data=payload, timeout=config.REQUEST_TIMEOUT)
-                    client.follow_redirects = True
-
-                    if response.status_code == 302:
-                        location = response.headers.get("Location", "")
-                        if any(x in location for x in ["Default.aspx", "StudentPanel/StudentDashboard.aspx"]):
-                            return {
-                                "session_cookies": dict(client.cookies),
-                            }
-                        raise AuthenticationError(f"Unexpected redirect: {location}")
-
-                    if response.status_code == 200:
-                        raise AuthenticationError("Invalid username or password.")
-
-                    response.raise_for_status()
-
-                except (httpx.ConnectError, httpx.NetworkError) as e:
-                    if attempt < retries:
-                        await asyncio.sleep(backoff * attempt)
-                        continue
-                    raise ExternalServiceError(f"Network error after {retries} attempts: {e}")
-                except httpx.TimeoutException as e:
-                    if attempt < retries:
-                        await asyncio.sleep(backoff * attempt)
-                        continue
-                    raise ExternalServiceError(f"Timeout after {retries} attempts: {e}")
+            async with BMUClient.session(headers=DEFAULT_HEADERS) as client:
+                return await self._submit_login(client, username, password, retries, backoff)
 
         except AuthError:
             raise
@@ -119,22 +123,62 @@ class AuthViewModel:
             logger.error(f"Unexpected error during login: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
+    async def _submit_login(self, client: httpx.AsyncClient, username: str, password: str, retries: int, backoff: float):
+        """Run the Login.aspx postback inside a login-scoped client so cookies never leak between users."""
+        use_cached_state = config.LOGIN_STATE_TTL > 0
+        if use_cached_state:
+            login_state = await self._get_cached_login_state()
+        else:
+            login_state = await self._get_initial_login_page(client)
+
+        payload = self._build_login_payload(login_state, username, password)
+
+        for attempt in range(1, retries + 1):
+            try:
+                response = await client.post(self.BASE_URL, data=payload, follow_redirects=False)
+
+                if use_cached_state and self._is_rejected_login_state(response):
+                    logger.info("Cached login form state rejected by portal, refreshing.")
+                    use_cached_state = False
+
+                    login_state = await self._refresh_login_state(login_state)
+                    payload = self._build_login_payload(login_state, username, password)
+                    response = await client.post(self.BASE_URL, data=payload, follow_redirects=False)
+
+                if response.status_code == 302:
+                    location = response.headers.get("Location", "")
+                    if any(x in location for x in self.LOGIN_SUCCESS_PATHS):
+                        return {
+                            "session_cookies": dict(client.cookies),
+                        }
+                    raise AuthenticationError(f"Unexpected redirect: {location}")
+
+                if response.status_code == 200:
+                    raise AuthenticationError("Invalid username or password.")
+
+                response.raise_for_status()
+
+            except (httpx.ConnectError, httpx.NetworkError) as e:
+                if attempt < retries:
+                    await asyncio.sleep(backoff * attempt)
+                    continue
+                raise ExternalServiceError(f"Network error after {retries} attempts: {e}")
+            except httpx.TimeoutException as e:
+                if attempt < retries:
+                    await asyncio.sleep(backoff * attempt)
+                    continue
+                raise ExternalServiceError(f"Timeout after {retries} attempts: {e}")
+
     async def check_student_session(self, session_cookies: dict) -> bool:
         try:
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
-            async with httpx.AsyncClient(cookies=cookies_jar, follow_redirects=True) as client:
-                DASHBOARD_URL = "https://bmu.gnums.co.in/StudentPanel/StudentDashboard.aspx"
+            async with BMUClient.session(session_cookies) as client:
+                DASHBOARD_URL = f"{config.BMU_PORTAL_URL}/StudentPanel/StudentDashboard.aspx"
                 resp = await client.get(DASHBOARD_URL)
                 
                 if resp.status_code != 200:
                     return False
 
-                from bs4 import BeautifulSoup
-                soup = BeautifulSoup(resp.text, "html.parser")
-                if soup.find("input", {"id": "txtUsername"}):
+                if is_login_page(resp.text):
                     return False
 
             return True
@@ -154,7 +198,9 @@ class AuthViewModel:
                 
                 await AuthModel.update_user_credentials(google_id, username, password)
                 
-                return await self.login_with_credentials(username, password)
+                result = await self.login_with_credentials(username, password)
+                result["username"] = username
+                return result
 
             user = await AuthModel.find_user_by_google_id(google_id)
             
@@ -172,7 +218,9 @@ class AuthViewModel:
             if not stored_username or not stored_password:
                 raise AuthError("Account exists but is not linked to BMU credentials.", code="ACCOUNT_NEEDS_LINKING")
 
-            return await self.login_with_credentials(stored_username, stored_password)
+            result = await self.login_with_credentials(stored_username, stored_password)
+            result["username"] = stored_username
+            return result
 
         except AuthError:
             raise
@@ -180,21 +228,35 @@ class AuthViewModel:
             logger.error(f"Google login error: {e}", exc_info=True)
             raise ExternalServiceError(f"Google login failed: {e}")
 
+    async def reauthenticate(self, session) -> Optional[dict]:
+        """
+        Log a token session's user back in using the credentials stored for linked accounts.
+        Returns the fresh portal cookies, or None when the user has no stored credentials.
+        """
+        if session.google_id:
+            user = await AuthModel.find_user_by_google_id(session.google_id)
+        elif session.username:
+            user = await AuthModel.find_user_by_username(session.username)
+        else:
+            return None
+
+        if not user or not user.get("username") or not user.get("password"):
+            return None
+
+        logger.info(f"Re-authenticating expired portal session for user: {user['username']}")
+        result = await self.login_with_credentials(user["username"], user["password"])
+        return result["session_cookies"]
+
     async def logout(self, session_cookies: dict):
         try:
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
-            async with httpx.AsyncClient(cookies=cookies_jar, follow_redirects=True) as client:
-                DASHBOARD_URL = "https://bmu.gnums.co.in/StudentPanel/StudentDashboard.aspx"
+            async with BMUClient.session(session_cookies) as client:
+                DASHBOARD_URL = f"{config.BMU_PORTAL_URL}/StudentPanel/StudentDashboard.aspx"
                 response = await client.get(DASHBOARD_URL)
                 
                 if "Login.aspx" in str(response.url):
                      raise AuthenticationError("Session invalid or expired.")
 
-                from bs4 import BeautifulSoup
-                soup = BeautifulSoup(response.text, "html.parser")
+                soup = parse_html(response.text)
 
                 def val(_id):
                     el = soup.find("input", {"id": _id})
@@ -54,7 +54,7 @@ async def get_department_details():
                 "message": "Department not found."
             }), 404
 
-        # 2. Fetch from external source
+        # 2. Institute details (memory -> materialized view -> live scrape)
         target_id = department_doc.get("bmu_id")
         if not target_id:
              return jsonify({
@@ -71,7 +71,7 @@ async def get_department_details():
 
         return jsonify({
             "success": True,
-            "message": "Department details fetched successfully (live).",
+            "message": "Department details fetched successfully.",
             "data": department_doc
         }), 200
 
@@ -1,8 +1,12 @@
+import asyncio
 import logging
-import httpx
+from datetime import datetime, timezone
 from urllib.parse import urljoin
 from bs4 import BeautifulSoup
+from app.core.cache import TTLCache
+from app.core.client import BMUClient
 from app.core.config import config
+from app.core.executor import ParseExecutor
 from app.core.database import departments_collection
 from app.modules.departments.models import InstituteDetails
 from typing import Optional, Union, Dict, Any, List
@@ -18,7 +22,18 @@ class ExternalServiceError(DepartmentsError):
     pass
 
 class DepartmentsViewModel:
-    BASE_URL = "https://bmusurat.ac.in/"
+    BASE_URL = f"{config.BMU_WEBSITE_URL}/"
+    # Bump when InstituteDetails changes shape so old materialized views are rebuilt.
+    INSTITUTE_DETAILS_VERSION = 1
+
+    def __init__(self):
+        self._cache = TTLCache(
+            ttl=config.PUBLIC_CACHE_TTL,
+            stale_ttl=config.PUBLIC_CACHE_STALE_TTL,
+            maxsize=256,
+            name="institute_details",
+        )
+        self._materializing: Dict[int, asyncio.Task] = {}
 
     async def get_all_departments(self) -> List[Dict[str, Any]]:
         """
@@ -45,30 +60,128 @@ class DepartmentsViewModel:
             except ValueError:
                 pass
 
-            doc = await departments_collection.find_one({"bmu_id": bmu_id})
+            doc = await departments_collection.find_one({"bmu_id": bmu_id, "type": {"$ne": "institute_details"}})
             return doc
         except Exception as e:
             logger.error(f"Database error in get_department_details: {e}", exc_info=True)
             return None
 
     async def fetch_institute_details(self, bmu_id: int) -> InstituteDetails:
+        """
+        Institute details for a given institute_id. Served from memory, backed by the
+        materialized copy in MongoDB; the website is only scraped when neither has it.
+        """
+        return await self._cache.get_or_load(bmu_id, lambda: self._load_institute_details(bmu_id))
+
+    async def refresh_institute_details(self):
+        """
+        Scheduled job: re-materialize every department's institute details at a fixed rate
+        regardless of traffic. Views another worker refreshed recently are skipped.
+        """
+        try:
+            departments = await self.get_all_departments()
+        except DepartmentsError as e:
+            logger.warning(f"Institute details refresh skipped: {e}")
+            return
+
+        for dep in departments:
+            bmu_id = dep.get("bmu_id")
+            if bmu_id is None:
+                continue
+            try:
+                view = await self._get_materialized(bmu_id)
+                if view and self._age(view) < config.PUBLIC_REFRESH_INTERVAL / 2:
+                    details = InstituteDetails(**view["data"])
+                else:
+                    details = await self._materialize(bmu_id)
+                self._cache.set(bmu_id, details)
+            except Exception as e:
+                logger.warning(f"Institute details refresh failed for {bmu_id}: {e}")
+
+    async def ensure_indexes(self):
+        try:
+            await departments_collection.create_index(
+                [("type", 1), ("bmu_id", 1)],
+                unique=True,
+                partialFilterExpression={"type": "institute_details"},
+            )
+        except Exception as e:
+            logger.warning(f"Could not create institute details index: {e}")
+
+    async def _load_institute_details(self, bmu_id: int) -> InstituteDetails:
+        view = await self._get_materialized(bmu_id)
+        if view is None:
+            return await self._materialize(bmu_id)
+
+        if self._age(view) >= config.PUBLIC_CACHE_TTL:
+            self._materialize_in_background(bmu_id)
+        return InstituteDetails(**view["data"])
+
+    async def _get_materialized(self, bmu_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            view = await departments_collection.find_one({"type": "institute_details", "bmu_id": bmu_id})
+        except Exception as e:
+            logger.error(f"Database error reading institute details {bmu_id}: {e}", exc_info=True)
+            return None
+
+        if view and view.get("version") == self.INSTITUTE_DETAILS_VERSION:
+            return view
+        return None
+
+    async def _materialize(self, bmu_id: int) -> InstituteDetails:
+        """Scrape the institute page and upsert the parsed result into departments_collection."""
+        details = await self._scrape_institute_details(bmu_id)
+        try:
+            await departments_collection.update_one(
+                {"type": "institute_details", "bmu_id": bmu_id},
+                {"$set": {
+                    "data": details.dict(),
+                    "version": self.INSTITUTE_DETAILS_VERSION,
+                    "fetched_at": datetime.now(timezone.utc),
+                }},
+                upsert=True,
+            )
+        except Exception as e:
+            logger.error(f"Failed to materialize institute details {bmu_id}: {e}", exc_info=True)
+        return details
+
+    def _materialize_in_background(self, bmu_id: int):
+        if bmu_id in self._materializing:
+            return
+
+        async def run():
+            try:
+                self._cache.set(bmu_id, await self._materialize(bmu_id))
+            except Exception as e:
+                logger.warning(f"Background refresh of institute details {bmu_id} failed: {e}")
+            finally:
+                self._materializing.pop(bmu_id, None)
+
+        self._materializing[bmu_id] = asyncio.create_task(run())
+
+    @staticmethod
+    def _age(view: Dict[str, Any]) -> float:
+        fetched_at = view.get("fetched_at")
+        if not isinstance(fetched_at, datetime):
+            return float("inf")
+        if fetched_at.tzinfo is None:
+            fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+        return (datetime.now(timezone.utc) - fetched_at).total_seconds()
+
+    async def _scrape_institute_details(self, bmu_id: int) -> InstituteDetails:
         """
         Fetch and parse institute detail page from bmusurat.ac.in for a given institute_id.
         """
-        url = f"https://bmusurat.ac.in/bmu_website/institute/get_detail?institute_id={bmu_id}"
+        url = f"{config.BMU_WEBSITE_URL}/bmu_website/institute/get_detail?institute_id={bmu_id}"
 
         try:
-            async with httpx.AsyncClient(
-                timeout=config.REQUEST_TIMEOUT,
-                follow_redirects=True
-            ) as client:
+            async with BMUClient.session() as client:
                 resp = await client.get(url)
                 
                 if resp.status_code != 200:
                     raise ExternalServiceError(f"Failed to fetch institute details. Status: {resp.status_code}")
 
-            soup = BeautifulSoup(resp.text, "html.parser")
-            data = self._parse_institute_details(soup)
+            data = await ParseExecutor.run(self._parse_institute_details, resp.text)
             return InstituteDetails(**data)
 
         except ExternalServiceError:
@@ -79,7 +192,8 @@ class DepartmentsViewModel:
 
 
 
-    def _parse_institute_details(self, soup: BeautifulSoup) -> dict:
+    @staticmethod
+    def _parse_institute_details(soup: BeautifulSoup) -> dict:
         def get_joined_text(element, separator=" "):
              if not element: return None
              return separator.join([t.strip() for t in element.find_all(text=True) if t.strip()])
@@ -89,7 +203,7 @@ class DepartmentsViewModel:
             director_div = soup.select_one("div#intellectualmember div#director")
             if director_div:
                 img_tag = director_div.select_one("div.col-md-4 img")
-                photo = urljoin(self.BASE_URL, img_tag["src"]) if img_tag and img_tag.get("src") else None
+                photo = urljoin(DepartmentsViewModel.BASE_URL, img_tag["src"]) if img_tag and img_tag.get("src") else None
 
                 name_tag = director_div.select_one("div.col-md-8 font b")
                 name = name_tag.get_text(strip=True) if name_tag else None
@@ -142,7 +256,7 @@ class DepartmentsViewModel:
                 faculty_cards = principal_div.select("div.col-md-6.mb-4")
                 for card in faculty_cards:
                     img = card.select_one("img")
-                    photo = urljoin(self.BASE_URL, img["src"]) if img and img.get("src") else None
+                    photo = urljoin(DepartmentsViewModel.BASE_URL, img["src"]) if img and img.get("src") else None
 
                     name_tag = card.select_one("font b")
                     name = name_tag.get_text(strip=True) if name_tag else None
@@ -210,7 +324,7 @@ class DepartmentsViewModel:
                         if "row" in (nxt.get("class") or []):
                             for img in nxt.find_all("img"):
                                 src = img.get("src")
-                                if src: images.append(urljoin(self.BASE_URL, src))
+                                if src: images.append(urljoin(DepartmentsViewModel.BASE_URL, src))
                         nxt = nxt.find_next_sibling()
 
                     infrastructure.append({"title": title, "images": images})
@@ -235,7 +349,7 @@ class DepartmentsViewModel:
                         if "row" in (nxt.get("class") or []):
                             for img in nxt.find_all("img"):
                                 src = img.get("src")
-                                if src: images.append(urljoin(self.BASE_URL, src))
+                                if src: images.append(urljoin(DepartmentsViewModel.BASE_URL, src))
                         nxt = nxt.find_next_sibling()
 
                     gallery.append({"title": title, "images": images})
@@ -250,7 +364,7 @@ class DepartmentsViewModel:
                 for m in members:
                     try:
                         img = m.find("img")
-                        photo = urljoin(self.BASE_URL, img["src"]) if img else None
+                        photo = urljoin(DepartmentsViewModel.BASE_URL, img["src"]) if img else None
                         name_tag = m.find("font")
                         name = name_tag.get_text(strip=True) if name_tag else None
 
@@ -1,8 +1,10 @@
 import logging
-import httpx
 from urllib.parse import urljoin
 from bs4 import BeautifulSoup
+from app.core.cache import TTLCache
+from app.core.client import BMUClient
 from app.core.config import config
+from app.core.executor import ParseExecutor
 from app.modules.public.models import PublicInfoData
 from typing import Optional
 
@@ -17,10 +19,31 @@ class ExternalServiceError(PublicInfoError):
     pass
 
 class PublicViewModel:
-    NEWS_URL = "https://bmusurat.ac.in/bmu_website/home/welcome"
-    BASE_URL = "https://bmusurat.ac.in/"
+    NEWS_URL = f"{config.BMU_WEBSITE_URL}/bmu_website/home/welcome"
+    BASE_URL = f"{config.BMU_WEBSITE_URL}/"
+
+    CACHE_KEY = "public_info"
+
+    def __init__(self):
+        self._cache = TTLCache(
+            ttl=config.PUBLIC_CACHE_TTL,
+            stale_ttl=config.PUBLIC_CACHE_STALE_TTL,
+            maxsize=1,
+            name="public_info",
+        )
 
     async def fetch_public_info(self) -> PublicInfoData:
+        """Serve public info from memory; the website is only scraped on a cold cache or by the refresh job."""
+        return await self._cache.get_or_load(self.CACHE_KEY, self._scrape_public_info)
+
+    async def refresh_public_info(self):
+        """Scheduled job: re-scrape at a fixed rate regardless of traffic."""
+        try:
+            await self._cache.refresh(self.CACHE_KEY, self._scrape_public_info)
+        except Exception as e:
+            logger.warning(f"Public info refresh failed: {e}")
+
+    async def _scrape_public_info(self) -> PublicInfoData:
         """Fetch Upcoming Events, Latest News, and Student Testimonials."""
         logger.info("Fetching public info from BMU website...")
 
@@ -31,20 +54,16 @@ class PublicViewModel:
                 "Chrome/142.0.0.0 Safari/537.36"
             ),
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/*,*/*;q=0.8",
-            "Referer": "https://bmusurat.ac.in/",
+            "Referer": f"{config.BMU_WEBSITE_URL}/",
         }
 
         try:
-            async with httpx.AsyncClient(
-                timeout=config.REQUEST_TIMEOUT,
-                follow_redirects=True,
-            ) as client:
+            async with BMUClient.session() as client:
                 res = await client.get(self.NEWS_URL, headers=HEADERS)
                 if res.status_code != 200:
                     raise ExternalServiceError(f"Failed to fetch public info. Status: {res.status_code}")
 
-            soup = BeautifulSoup(res.text, "html.parser")
-            data = self._parse_public_info(soup)
+            data = await ParseExecutor.run(self._parse_public_info, res.text)
             return PublicInfoData(**data)
 
         except ExternalServiceError:
@@ -53,15 +72,16 @@ class PublicViewModel:
             logger.error(f"Error fetching public info: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
-    def _parse_public_info(self, soup: BeautifulSoup) -> dict:
+    @staticmethod
+    def _parse_public_info(soup: BeautifulSoup) -> dict:
         results = {
             "upcoming_events": [], 
             "latest_news": [], 
             "student_testimonials": [],
             "university_banner": [
-                "https://bmu.gnums.co.in/images/BMU/1.jpg",
-                "https://bmu.gnums.co.in/images/BMU/2.jpg",
-                "https://bmu.gnums.co.in/images/BMU/3.jpg"
+                f"{config.BMU_PORTAL_URL}/images/BMU/1.jpg",
+                f"{config.BMU_PORTAL_URL}/images/BMU/2.jpg",
+                f"{config.BMU_PORTAL_URL}/images/BMU/3.jpg"
             ]
         }
         title_map = {"Upcoming Events": "upcoming_events", "Latest News": "latest_news"}
@@ -81,7 +101,7 @@ class PublicViewModel:
                 link_tag = desc_col.find("a")
                 desc = link_tag.get_text(strip=True) if link_tag else desc_col.get_text(strip=True)
                 href = link_tag.get("href") if link_tag else None
-                link = urljoin(self.NEWS_URL, href) if href else None
+                link = urljoin(PublicViewModel.NEWS_URL, href) if href else None
 
                 results[section_key].append({
                     "date": date,
@@ -99,7 +119,7 @@ class PublicViewModel:
                 "name": name.get_text(strip=True) if name else None,
                 "designation": small.get_text(strip=True) if small else None,
                 "testimonial": para.get_text(strip=True) if para else None,
-                "photo": urljoin(self.NEWS_URL, img.get("src")) if img else None,
+                "photo": urljoin(PublicViewModel.NEWS_URL, img.get("src")) if img else None,
             })
 
         return results
@@ -66,3 +66,28 @@ class DateAttendanceData(BaseModel):
     date: str
     records: List[AttendanceRecord]
     total: DateAttendanceTotal
+
+class BulkDateAttendanceData(BaseModel):
+    dates: List[DateAttendanceData]
+    total: DateAttendanceTotal
+    errors: Dict[str, str] = {}
+
+class StoredDateAttendance(BaseModel):
+    attendance_date: str
+    date: Optional[str]
+    semester: str
+    summary: DateAttendanceTotal
+    records: List[AttendanceRecord]
+    total: DateAttendanceTotal
+
+class AttendanceSyncResult(BaseModel):
+    semester: str
+    fetched: List[str]
+    unchanged: int
+    removed: List[str]
+    errors: Dict[str, str] = {}
+    synced_at: str
+
+class AttendanceHistoryData(BaseModel):
+    days: List[StoredDateAttendance]
+    last_synced_at: Optional[str]
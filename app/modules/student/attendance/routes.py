@@ -1,5 +1,8 @@
 from quart import Blueprint, request, jsonify
 from app.modules.student.attendance.viewmodel import student_attendance_viewmodel, AttendanceError, ExternalServiceError
+from app.core.sessions import session_store
+from app.core.response_cache import response_cache, wants_refresh, is_not_modified, not_modified, etag_headers
+from app.core.config import config
 import logging
 
 logger = logging.getLogger("bmu.modules.student.attendance")
@@ -19,21 +22,28 @@ async def get_attendance():
                 "message": "Request body must be valid JSON."
             }), 400
 
-        if "session_cookies" not in data:
+        if "session_token" not in data and "session_cookies" not in data:
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
-        
-        attendance_data = await student_attendance_viewmodel.fetch_student_attendance(session_cookies)
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
+        attendance_data, etag = await response_cache.fetch(session, "attendance", student_attendance_viewmodel.fetch_student_attendance, refresh=wants_refresh(data))
+        if is_not_modified(etag):
+            return not_modified(etag)
 
         return jsonify({
             "success": True,
             "message": "Attendance fetched successfully.",
             "data": attendance_data.dict()
-        }), 200
+        }), 200, etag_headers(etag)
 
     except AttendanceError as e:
         return jsonify({
@@ -70,22 +80,30 @@ async def get_absent_days():
                 "message": "Request body must be valid JSON."
             }), 400
 
-        if "session_cookies" not in data:
+        if "session_token" not in data and "session_cookies" not in data:
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
         selected_semester = data.get("selected_semester", "")
         
-        absent_data = await student_attendance_viewmodel.fetch_absent_days(session_cookies, selected_semester)
+        absent_data, etag = await response_cache.fetch(session, "absent_days", student_attendance_viewmodel.fetch_absent_days, selected_semester, refresh=wants_refresh(data))
+        if is_not_modified(etag):
+            return not_modified(etag)
 
         return jsonify({
             "success": True,
             "message": "Absent days fetched successfully.",
             "data": absent_data.dict()
-        }), 200
+        }), 200, etag_headers(etag)
 
     except AttendanceError as e:
         return jsonify({
@@ -122,13 +140,19 @@ async def get_attendance_by_date():
                 "message": "Request body must be valid JSON."
             }), 400
 
-        if "session_cookies" not in data:
+        if "session_token" not in data and "session_cookies" not in data:
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
         attendance_date = data.get("attendance_date")
 
         if not attendance_date:
@@ -137,13 +161,15 @@ async def get_attendance_by_date():
                 "message": "Missing 'attendance_date' in request body."
             }), 400
         
-        date_data = await student_attendance_viewmodel.fetch_attendance_by_date(session_cookies, attendance_date)
+        date_data, etag = await response_cache.fetch(session, "attendance_by_date", student_attendance_viewmodel.fetch_attendance_by_date, attendance_date, refresh=wants_refresh(data))
+        if is_not_modified(etag):
+            return not_modified(etag)
 
         return jsonify({
             "success": True,
             "message": "Attendance details fetched successfully.",
             "data": date_data.dict()
-        }), 200
+        }), 200, etag_headers(etag)
 
     except AttendanceError as e:
         return jsonify({
@@ -166,3 +192,219 @@ async def get_attendance_by_date():
             "message": "Internal server error.",
             "details": str(e)
         }), 500
+
+@student_attendance_bp.route("/attendance/dates", methods=["POST"])
+async def get_attendance_by_dates():
+    """
+    Fetch detailed attendance records for many dates at once: an explicit
+    'attendance_dates' list, or every absent date of 'selected_semester'.
+    """
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({
+                "success": False,
+                "message": "Request body must be valid JSON."
+            }), 400
+
+        if "session_token" not in data and "session_cookies" not in data:
+            return jsonify({
+                "success": False,
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
+            }), 400
+
+        attendance_dates = data.get("attendance_dates")
+        selected_semester = data.get("selected_semester")
+
+        if not attendance_dates and not selected_semester:
+            return jsonify({
+                "success": False,
+                "message": "Missing 'attendance_dates' or 'selected_semester' in request body."
+            }), 400
+
+        if attendance_dates and (not isinstance(attendance_dates, list) or not all(isinstance(d, str) for d in attendance_dates)):
+            return jsonify({
+                "success": False,
+                "message": "'attendance_dates' must be a list of date strings."
+            }), 400
+
+        if attendance_dates and len(attendance_dates) > config.ATTENDANCE_BULK_MAX_DATES:
+            return jsonify({
+                "success": False,
+                "message": f"At most {config.ATTENDANCE_BULK_MAX_DATES} dates can be requested at once."
+            }), 400
+
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
+        if attendance_dates:
+            dates_data, etag = await response_cache.fetch(session, "attendance_by_dates", student_attendance_viewmodel.fetch_attendance_by_dates, tuple(attendance_dates), refresh=wants_refresh(data))
+        else:
+            dates_data, etag = await response_cache.fetch(session, "absent_days_attendance", student_attendance_viewmodel.fetch_absent_days_attendance, selected_semester, refresh=wants_refresh(data))
+
+        if is_not_modified(etag):
+            return not_modified(etag)
+
+        return jsonify({
+            "success": True,
+            "message": "Attendance details fetched successfully.",
+            "data": dates_data.dict()
+        }), 200, etag_headers(etag)
+
+    except ExternalServiceError as e:
+        logger.error(f"External service error: {e}")
+        return jsonify({
+            "success": False,
+            "message": "External service unavailable.",
+            "details": str(e)
+        }), 502
+
+    except AttendanceError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        }), 401
+
+    except Exception as e:
+        logger.error(f"Unexpected error in /attendance/dates: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "message": "Internal server error.",
+            "details": str(e)
+        }), 500
+
+@student_attendance_bp.route("/attendance/sync", methods=["POST"])
+async def sync_attendance():
+    """
+    Incrementally sync a semester's per-date attendance into the attendance store.
+    Only new or changed absent dates are fetched from the portal.
+    """
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({
+                "success": False,
+                "message": "Request body must be valid JSON."
+            }), 400
+
+        if "session_token" not in data:
+            return jsonify({
+                "success": False,
+                "message": "Missing 'session_token' in request body."
+            }), 400
+
+        selected_semester = data.get("selected_semester")
+        if not selected_semester:
+            return jsonify({
+                "success": False,
+                "message": "Missing 'selected_semester' in request body."
+            }), 400
+
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
+        if not session.username:
+            return jsonify({
+                "success": False,
+                "message": "Attendance sync needs a session token from a BMU credential login."
+            }), 400
+
+        result = await session_store.call(session, student_attendance_viewmodel.sync_attendance, session.username, selected_semester)
+
+        return jsonify({
+            "success": True,
+            "message": "Attendance synced successfully.",
+            "data": result.dict()
+        }), 200
+
+    except ExternalServiceError as e:
+        logger.error(f"External service error: {e}")
+        return jsonify({
+            "success": False,
+            "message": "External service unavailable.",
+            "details": str(e)
+        }), 502
+
+    except AttendanceError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        }), 401
+
+    except Exception as e:
+        logger.error(f"Unexpected error in /attendance/sync: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "message": "Internal server error.",
+            "details": str(e)
+        }), 500
+
+@student_attendance_bp.route("/attendance/history", methods=["POST"])
+async def get_attendance_history():
+    """
+    Fetch stored per-date attendance (see /attendance/sync) without contacting the portal.
+    Optional filters: 'selected_semester', 'from_date' and 'to_date' (YYYY-MM-DD).
+    """
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({
+                "success": False,
+                "message": "Request body must be valid JSON."
+            }), 400
+
+        if "session_token" not in data:
+            return jsonify({
+                "success": False,
+                "message": "Missing 'session_token' in request body."
+            }), 400
+
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
+        if not session.username:
+            return jsonify({
+                "success": False,
+                "message": "Attendance history needs a session token from a BMU credential login."
+            }), 400
+
+        history = await student_attendance_viewmodel.fetch_attendance_history(
+            session.username,
+            data.get("selected_semester"),
+            data.get("from_date"),
+            data.get("to_date"),
+        )
+
+        return jsonify({
+            "success": True,
+            "message": "Attendance history fetched successfully.",
+            "data": history.dict()
+        }), 200
+
+    except ExternalServiceError as e:
+        logger.error(f"External service error: {e}")
+        return jsonify({
+            "success": False,
+            "message": "External service unavailable.",
+            "details": str(e)
+        }), 502
+
+    except Exception as e:
+        logger.error(f"Unexpected error in /attendance/history: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "message": "Internal server error.",
+            "details": str(e)
+        }), 500
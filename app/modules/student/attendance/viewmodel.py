@@ -1,9 +1,21 @@
+import asyncio
 import logging
-import httpx
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
 from bs4 import BeautifulSoup
+from pymongo import UpdateOne
+from app.core.client import BMUClient
 from app.core.config import config
-from app.modules.student.attendance.models import AttendanceSummary, AbsentDaysData, DateAttendanceData
-from typing import Optional
+from app.core.database import attendance_collection
+from app.core.executor import ParseExecutor
+from app.core.parser import ExtractSpec, extracts, is_login_page
+from app.core.sessions import PortalSessionExpiredError
+from app.core.singleflight import coalesce
+from app.modules.student.attendance.models import (
+    AttendanceSummary, AbsentDay, AbsentDaysData, DateAttendanceData, DateAttendanceTotal, BulkDateAttendanceData,
+    StoredDateAttendance, AttendanceSyncResult, AttendanceHistoryData,
+)
+from typing import Optional, Tuple
 
 logger = logging.getLogger("bmu.modules.student.attendance.viewmodel")
 
@@ -15,31 +27,26 @@ class ExternalServiceError(AttendanceError):
     """Raised when external BMU portal fails."""
     pass
 
+class SessionExpiredError(AttendanceError, PortalSessionExpiredError):
+    """Raised when the portal bounces the request to its login page."""
+    pass
+
 class StudentAttendanceViewModel:
-    ATTENDANCE_URL = "https://bmu.gnums.co.in/StudentPanel/TTM_Attendance/TTM_Attendance_StudentAttendance.aspx"
+    ATTENDANCE_URL = f"{config.BMU_PORTAL_URL}/StudentPanel/TTM_Attendance/TTM_Attendance_StudentAttendance.aspx"
 
+    @coalesce
     async def fetch_student_attendance(self, session_cookies: dict) -> AttendanceSummary:
         try:
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
-            async with httpx.AsyncClient(
-                cookies=cookies_jar,
-                follow_redirects=True,
-                timeout=config.REQUEST_TIMEOUT
-            ) as client:
+            async with BMUClient.session(session_cookies) as client:
                 resp = await client.get(self.ATTENDANCE_URL)
                 
                 if resp.status_code != 200:
                     raise ExternalServiceError(f"Failed to fetch attendance. Status: {resp.status_code}")
 
-                soup = BeautifulSoup(resp.text, "html.parser")
-                
-                if soup.find("input", {"id": "txtUsername"}):
-                     raise AttendanceError("Invalid session or expired cookies.")
+                if is_login_page(resp.text):
+                     raise SessionExpiredError("Invalid session or expired cookies.")
 
-                data = self._parse_attendance(soup)
+                data = await ParseExecutor.run(self._parse_attendance, resp.text)
                 return AttendanceSummary(**data)
 
         except AttendanceError:
@@ -48,29 +55,20 @@ class StudentAttendanceViewModel:
             logger.error(f"Error fetching attendance: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
+    @coalesce
     async def fetch_absent_days(self, session_cookies: dict, selected_semester: str) -> AbsentDaysData:
         try:
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
-            async with httpx.AsyncClient(
-                cookies=cookies_jar,
-                follow_redirects=True,
-                timeout=config.REQUEST_TIMEOUT
-            ) as client:
-                url = f"https://bmu.gnums.co.in/StudentPanel/TTM_Attendance/TTM_Attendance_StudentAbsentDays.aspx?SelectedSemester={selected_semester}"
+            async with BMUClient.session(session_cookies) as client:
+                url = f"{config.BMU_PORTAL_URL}/StudentPanel/TTM_Attendance/TTM_Attendance_StudentAbsentDays.aspx?SelectedSemester={selected_semester}"
                 resp = await client.get(url)
                 
                 if resp.status_code != 200:
                     raise ExternalServiceError(f"Failed to fetch absent days. Status: {resp.status_code}")
 
-                soup = BeautifulSoup(resp.text, "html.parser")
-                
-                if soup.find("input", {"id": "txtUsername"}):
-                     raise AttendanceError("Invalid session or expired cookies.")
+                if is_login_page(resp.text):
+                     raise SessionExpiredError("Invalid session or expired cookies.")
 
-                data = self._parse_absent_days(soup)
+                data = await ParseExecutor.run(self._parse_absent_days, resp.text)
                 return AbsentDaysData(**data)
 
         except AttendanceError:
@@ -79,43 +77,234 @@ class StudentAttendanceViewModel:
             logger.error(f"Error fetching absent days: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
+    async def _fetch_attendance_by_date(self, client, attendance_date: str) -> DateAttendanceData:
+        url = (
+            f"{config.BMU_PORTAL_URL}//AdminPanel/TimeTable/TTM_Attendance/"
+            f"TTM_AttendanceViewStudentAttendanceDetailByDate.aspx?AttendanceDate={attendance_date}"
+        )
+        resp = await client.get(url)
+        
+        if resp.status_code != 200:
+            raise ExternalServiceError(f"Failed to fetch attendance by date. Status: {resp.status_code}")
+
+        if is_login_page(resp.text):
+             raise SessionExpiredError("Invalid session or expired cookies.")
+
+        data = await ParseExecutor.run(self._parse_attendance_by_date, resp.text, attendance_date)
+        return DateAttendanceData(**data)
+
+    @coalesce
     async def fetch_attendance_by_date(self, session_cookies: dict, attendance_date: str) -> DateAttendanceData:
         try:
             if not attendance_date:
                 raise AttendanceError("Missing 'attendance_date' parameter.")
 
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
-            async with httpx.AsyncClient(
-                cookies=cookies_jar,
-                follow_redirects=True,
-                timeout=config.REQUEST_TIMEOUT
-            ) as client:
-                url = (
-                    "https://bmu.gnums.co.in//AdminPanel/TimeTable/TTM_Attendance/"
-                    f"TTM_AttendanceViewStudentAttendanceDetailByDate.aspx?AttendanceDate={attendance_date}"
-                )
-                resp = await client.get(url)
-                
-                if resp.status_code != 200:
-                    raise ExternalServiceError(f"Failed to fetch attendance by date. Status: {resp.status_code}")
+            async with BMUClient.session(session_cookies) as client:
+                return await self._fetch_attendance_by_date(client, attendance_date)
 
-                soup = BeautifulSoup(resp.text, "html.parser")
-                
-                if soup.find("input", {"id": "txtUsername"}):
-                     raise AttendanceError("Invalid session or expired cookies.")
+        except AttendanceError:
+            raise
+        except Exception as e:
+            logger.error(f"Error fetching attendance by date: {e}", exc_info=True)
+            raise ExternalServiceError(f"Unexpected error: {e}")
 
-                data = self._parse_attendance_by_date(soup, attendance_date)
-                return DateAttendanceData(**data)
+    @coalesce
+    async def fetch_attendance_by_dates(self, session_cookies: dict, attendance_dates: Tuple[str, ...]) -> BulkDateAttendanceData:
+        """
+        Attendance details for many dates in one go, a few at a time over one client scope.
+        Dates that fail are reported in `errors`; an expired session fails the whole call.
+        """
+        try:
+            dates = list(dict.fromkeys(d for d in attendance_dates if d))
+            if not dates:
+                raise AttendanceError("Missing 'attendance_dates' parameter.")
+
+            semaphore = asyncio.Semaphore(config.ATTENDANCE_BULK_CONCURRENCY)
+
+            async with BMUClient.session(session_cookies) as client:
+                async def fetch(attendance_date: str) -> DateAttendanceData:
+                    async with semaphore:
+                        return await self._fetch_attendance_by_date(client, attendance_date)
+
+                results = await asyncio.gather(*(fetch(d) for d in dates), return_exceptions=True)
+
+            days, errors = [], {}
+            for attendance_date, result in zip(dates, results):
+                if isinstance(result, PortalSessionExpiredError):
+                    raise result
+                if isinstance(result, BaseException):
+                    logger.warning(f"Attendance for {attendance_date} failed: {result}")
+                    errors[attendance_date] = str(result)
+                else:
+                    days.append(result)
+
+            if not days:
+                raise ExternalServiceError(f"Failed to fetch attendance for any of {len(dates)} date(s).")
+
+            return BulkDateAttendanceData(
+                dates=days,
+                total=DateAttendanceTotal(
+                    conducted=str(sum(int(d.total.conducted) for d in days)),
+                    present=str(sum(int(d.total.present) for d in days)),
+                    absent=str(sum(int(d.total.absent) for d in days)),
+                ),
+                errors=errors
+            )
 
         except AttendanceError:
             raise
         except Exception as e:
-            logger.error(f"Error fetching attendance by date: {e}", exc_info=True)
+            logger.error(f"Error fetching attendance by dates: {e}", exc_info=True)
+            raise ExternalServiceError(f"Unexpected error: {e}")
+
+    @staticmethod
+    def _absent_date_param(day: AbsentDay) -> Optional[str]:
+        """The date exactly as the portal's own "view" link passes it, falling back to the listed date."""
+        if day.view_link:
+            values = parse_qs(urlparse(day.view_link).query).get("AttendanceDate")
+            if values:
+                return values[0]
+        return day.attendance_date
+
+    @coalesce
+    async def fetch_absent_days_attendance(self, session_cookies: dict, selected_semester: str) -> BulkDateAttendanceData:
+        """Attendance details for every absent date of a semester (the absent-days screen in one call)."""
+        absent = await self.fetch_absent_days(session_cookies, selected_semester)
+        dates = tuple(filter(None, (self._absent_date_param(d) for d in absent.absent_days)))
+        if not dates:
+            return BulkDateAttendanceData(dates=[], total=DateAttendanceTotal(conducted="0", present="0", absent="0"))
+        return await self.fetch_attendance_by_dates(session_cookies, dates)
+
+    async def ensure_indexes(self):
+        try:
+            await attendance_collection.create_index(
+                [("username", 1), ("type", 1), ("semester", 1), ("attendance_date", 1)],
+                unique=True,
+            )
+            await attendance_collection.create_index([("username", 1), ("date", 1)])
+        except Exception as e:
+            logger.warning(f"Could not create attendance indexes: {e}")
+
+    @staticmethod
+    def _iso_date(value: str) -> Optional[str]:
+        """Normalise the portal's date strings so stored days sort and filter chronologically."""
+        for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d-%b-%Y", "%d %b %Y", "%m/%d/%Y"):
+            try:
+                return datetime.strptime(value.strip(), fmt).date().isoformat()
+            except ValueError:
+                continue
+        return None
+
+    @coalesce
+    async def sync_attendance(self, session_cookies: dict, username: str, selected_semester: str) -> AttendanceSyncResult:
+        """
+        Bring the stored per-date attendance of a student's semester up to date.
+        Only absent dates that are new, or whose counts changed in the absent-days summary,
+        are fetched; dates that disappeared from the summary are dropped from the store.
+        """
+        try:
+            absent = await self.fetch_absent_days(session_cookies, selected_semester)
+            listed = {}
+            for day in absent.absent_days:
+                attendance_date = self._absent_date_param(day)
+                if attendance_date:
+                    listed[attendance_date] = {"conducted": day.conducted or "0", "present": day.present or "0", "absent": day.absent or "0"}
+
+            query = {"type": "attendance_date", "username": username, "semester": selected_semester}
+            try:
+                stored = {
+                    doc["attendance_date"]: doc.get("summary")
+                    async for doc in attendance_collection.find(query, {"attendance_date": 1, "summary": 1})
+                }
+            except Exception as e:
+                logger.error(f"Database error reading attendance of {username}: {e}", exc_info=True)
+                raise ExternalServiceError("Attendance store unavailable.")
+
+            changed = [d for d, summary in listed.items() if stored.get(d) != summary]
+            removed = [d for d in stored if d not in listed]
+
+            days, errors = [], {}
+            if changed:
+                fetched = await self.fetch_attendance_by_dates(session_cookies, tuple(changed))
+                days, errors = fetched.dates, fetched.errors
+
+            synced_at = datetime.now(timezone.utc)
+            try:
+                operations = [
+                    UpdateOne(
+                        {**query, "attendance_date": day.date},
+                        {"$set": {
+                            "date": self._iso_date(day.date),
+                            "summary": listed[day.date],
+                            "records": [r.dict() for r in day.records],
+                            "total": day.total.dict(),
+                            "synced_at": synced_at,
+                        }},
+                        upsert=True,
+                    )
+                    for day in days
+                ]
+                operations.append(UpdateOne(
+                    {"type": "attendance_sync", "username": username, "semester": selected_semester, "attendance_date": None},
+                    {"$set": {"synced_at": synced_at}},
+                    upsert=True,
+                ))
+                await attendance_collection.bulk_write(operations, ordered=False)
+                if removed:
+                    await attendance_collection.delete_many({**query, "attendance_date": {"$in": removed}})
+            except Exception as e:
+                logger.error(f"Database error storing attendance of {username}: {e}", exc_info=True)
+                raise ExternalServiceError("Attendance store unavailable.")
+
+            logger.info(f"Attendance sync for {username} (semester {selected_semester}): {len(days)} fetched, {len(listed) - len(changed)} unchanged, {len(removed)} removed.")
+
+            return AttendanceSyncResult(
+                semester=selected_semester,
+                fetched=[day.date for day in days],
+                unchanged=len(listed) - len(changed),
+                removed=removed,
+                errors=errors,
+                synced_at=synced_at.isoformat()
+            )
+
+        except AttendanceError:
+            raise
+        except Exception as e:
+            logger.error(f"Error syncing attendance: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
+    async def fetch_attendance_history(
+        self,
+        username: str,
+        selected_semester: Optional[str] = None,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+    ) -> AttendanceHistoryData:
+        """Stored per-date attendance of a student, oldest first. Never touches the portal."""
+        query = {"type": "attendance_date", "username": username}
+        sync_query = {"type": "attendance_sync", "username": username}
+        if selected_semester:
+            query["semester"] = sync_query["semester"] = selected_semester
+        if from_date or to_date:
+            query["date"] = {}
+            if from_date:
+                query["date"]["$gte"] = from_date
+            if to_date:
+                query["date"]["$lte"] = to_date
+
+        try:
+            docs = await attendance_collection.find(query, {"_id": 0}).sort([("date", 1), ("attendance_date", 1)]).to_list(length=None)
+            last_sync = await attendance_collection.find_one(sync_query, {"synced_at": 1}, sort=[("synced_at", -1)])
+        except Exception as e:
+            logger.error(f"Database error reading attendance history of {username}: {e}", exc_info=True)
+            raise ExternalServiceError("Attendance store unavailable.")
+
+        return AttendanceHistoryData(
+            days=[StoredDateAttendance(**doc) for doc in docs],
+            last_synced_at=last_sync["synced_at"].isoformat() if last_sync else None
+        )
+
+    @extracts(ExtractSpec(ids=("tblAttendance",), id_prefixes=("ctl00_cphPageContent_lbl", "ctl00_cphPageContent_rpSemesterAttendance_")))
     def _parse_attendance(self, soup: BeautifulSoup) -> dict:
         def get_text(_id):
             el = soup.find(id=_id)
@@ -158,6 +347,7 @@ class StudentAttendanceViewModel:
             "subjects": subjects,
         }
 
+    @extracts(ExtractSpec(ids=("tblAttendance",), id_prefixes=("ctl00_cphPageContent_lbl",)))
     def _parse_absent_days(self, soup: BeautifulSoup) -> dict:
         def get_text(_id):
             el = soup.find(id=_id)
@@ -179,7 +369,7 @@ class StudentAttendanceViewModel:
                 view_link = None
                 a_tag = tds[5].find("a", href=True)
                 if a_tag:
-                    view_link = "https://bmu.gnums.co.in" + a_tag["href"].replace("..", "")
+                    view_link = config.BMU_PORTAL_URL + a_tag["href"].replace("..", "")
 
                 absents.append({
                     "sr_no": tds[0].get_text(strip=True),
@@ -202,6 +392,7 @@ class StudentAttendanceViewModel:
             "total": total
         }
 
+    @extracts(ExtractSpec(ids=("tblAttendance",)))
     def _parse_attendance_by_date(self, soup: BeautifulSoup, date: str) -> dict:
         table = soup.find("table", id="tblAttendance")
         records = []
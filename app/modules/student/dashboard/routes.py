@@ -1,5 +1,7 @@
 from quart import Blueprint, request, jsonify
 from app.modules.student.dashboard.viewmodel import student_dashboard_viewmodel, DashboardError, ExternalServiceError
+from app.core.sessions import session_store
+from app.core.response_cache import response_cache, wants_refresh, is_not_modified, not_modified, etag_headers
 import logging
 
 logger = logging.getLogger("bmu.modules.student.dashboard")
@@ -19,21 +21,28 @@ async def get_dashboard():
                 "message": "Request body must be valid JSON."
             }), 400
 
-        if "session_cookies" not in data:
+        if "session_token" not in data and "session_cookies" not in data:
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
-        
-        dashboard_data = await student_dashboard_viewmodel.fetch_student_dashboard(session_cookies)
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
+        dashboard_data, etag = await response_cache.fetch(session, "dashboard", student_dashboard_viewmodel.fetch_student_dashboard, refresh=wants_refresh(data))
+        if is_not_modified(etag):
+            return not_modified(etag)
 
         return jsonify({
             "success": True,
             "message": "Dashboard fetched successfully.",
             "data": dashboard_data.dict()
-        }), 200
+        }), 200, etag_headers(etag)
 
     except DashboardError as e:
         return jsonify({
@@ -1,7 +1,12 @@
 import logging
-import httpx
 from urllib.parse import urljoin
 from bs4 import BeautifulSoup
+from app.core.client import BMUClient
+from app.core.config import config
+from app.core.executor import ParseExecutor
+from app.core.parser import ExtractSpec, extracts, is_login_page
+from app.core.sessions import PortalSessionExpiredError
+from app.core.singleflight import coalesce
 from app.modules.student.dashboard.models import DashboardData
 from typing import Optional
 
@@ -15,27 +20,26 @@ class ExternalServiceError(DashboardError):
     """Raised when external BMU portal fails."""
     pass
 
+class SessionExpiredError(DashboardError, PortalSessionExpiredError):
+    """Raised when the portal bounces the request to its login page."""
+    pass
+
 class StudentDashboardViewModel:
-    DASHBOARD_URL = "https://bmu.gnums.co.in/StudentPanel/StudentDashboard.aspx"
+    DASHBOARD_URL = f"{config.BMU_PORTAL_URL}/StudentPanel/StudentDashboard.aspx"
 
+    @coalesce
     async def fetch_student_dashboard(self, session_cookies: dict) -> DashboardData:
         try:
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
-            async with httpx.AsyncClient(cookies=cookies_jar, follow_redirects=True) as client:
+            async with BMUClient.session(session_cookies) as client:
                 resp = await client.get(self.DASHBOARD_URL)
                 
                 if resp.status_code != 200:
                     raise ExternalServiceError(f"Failed to fetch dashboard. Status: {resp.status_code}")
 
-                soup = BeautifulSoup(resp.text, "html.parser")
-
-                if soup.find("input", {"id": "txtUsername"}):
-                    raise DashboardError("Invalid session or expired cookies.")
+                if is_login_page(resp.text):
+                    raise SessionExpiredError("Invalid session or expired cookies.")
 
-                data = self._parse_dashboard(soup)
+                data = await ParseExecutor.run(self._parse_dashboard, resp.text)
                 return DashboardData(**data)
 
         except DashboardError:
@@ -44,6 +48,7 @@ class StudentDashboardViewModel:
             logger.error(f"Error fetching dashboard: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
+    @extracts(ExtractSpec(ids=("ctl00_lblCurrentUsername", "ctl00_imgCurrentUserPhoto", "ctl00_cphPageContent_divPendingAssigmnets"), id_prefixes=("ctl00_cphPageContent_ucStudentInfoCompact_",)))
     def _parse_dashboard(self, soup: BeautifulSoup) -> dict:
         def get_text(_id):
             el = soup.find(id=_id)
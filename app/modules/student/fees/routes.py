@@ -1,5 +1,9 @@
 from quart import Blueprint, request, jsonify
 from app.modules.student.fees.viewmodel import student_fees_viewmodel, FeesError, ExternalServiceError
+from app.core.sessions import session_store
+from app.core.response_cache import response_cache, wants_refresh, is_not_modified, not_modified, etag_headers
+from app.core.filecache import file_cache
+from app.core.streaming import stream_file_response, cached_file_response
 import logging
 
 logger = logging.getLogger("bmu.modules.student.fees")
@@ -19,21 +23,28 @@ async def get_fee_history():
                 "message": "Request body must be valid JSON."
             }), 400
 
-        if "session_cookies" not in data:
+        if "session_token" not in data and "session_cookies" not in data:
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
-        
-        fee_data = await student_fees_viewmodel.fetch_fee_history(session_cookies)
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
+        fee_data, etag = await response_cache.fetch(session, "fees", student_fees_viewmodel.fetch_fee_history, refresh=wants_refresh(data))
+        if is_not_modified(etag):
+            return not_modified(etag)
 
         return jsonify({
             "success": True,
             "message": "Fee history fetched successfully.",
             "data": fee_data.dict()
-        }), 200
+        }), 200, etag_headers(etag)
 
     except FeesError as e:
         return jsonify({
@@ -70,13 +81,19 @@ async def get_fee_posting_details():
                 "message": "Request body must be valid JSON."
             }), 400
 
-        if "session_cookies" not in data:
+        if "session_token" not in data and "session_cookies" not in data:
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
         fee_posting_id = data.get("fee_posting_id")
 
         if not fee_posting_id:
@@ -85,13 +102,15 @@ async def get_fee_posting_details():
                 "message": "Missing 'fee_posting_id' in request body."
             }), 400
         
-        posting_data = await student_fees_viewmodel.fetch_fee_posting_details(session_cookies, fee_posting_id)
+        posting_data, etag = await response_cache.fetch(session, "fee_posting", student_fees_viewmodel.fetch_fee_posting_details, fee_posting_id, refresh=wants_refresh(data))
+        if is_not_modified(etag):
+            return not_modified(etag)
 
         return jsonify({
             "success": True,
             "message": "Fee posting details fetched successfully.",
             "data": posting_data.dict()
-        }), 200
+        }), 200, etag_headers(etag)
 
     except FeesError as e:
         return jsonify({
@@ -128,21 +147,28 @@ async def get_pending_fees():
                 "message": "Request body must be valid JSON."
             }), 400
 
-        if "session_cookies" not in data:
+        if "session_token" not in data and "session_cookies" not in data:
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
-        
-        pending_data = await student_fees_viewmodel.fetch_pending_fees(session_cookies)
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
+        pending_data, etag = await response_cache.fetch(session, "pending_fees", student_fees_viewmodel.fetch_pending_fees, refresh=wants_refresh(data))
+        if is_not_modified(etag):
+            return not_modified(etag)
 
         return jsonify({
             "success": True,
             "message": "Pending fees fetched successfully.",
             "data": pending_data.dict()
-        }), 200
+        }), 200, etag_headers(etag)
 
     except FeesError as e:
         return jsonify({
@@ -179,19 +205,25 @@ async def initiate_payment():
                 "message": "Request body must be valid JSON."
             }), 400
 
-        if "session_cookies" not in data:
+        if "session_token" not in data and "session_cookies" not in data:
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
-        
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
         # We don't necessarily need the payment_info from the client if we rescrape,
         # but if we wanted to be more specific (e.g. paying specific amount), we'd need it.
         # For now, we assume "Pay Now" pays the default pending amount.
         
-        payment_response = await student_fees_viewmodel.initiate_payment(session_cookies)
+        payment_response = await session_store.call(session, student_fees_viewmodel.initiate_payment)
+        response_cache.invalidate_session(session)
 
         return jsonify({
             "success": True,
@@ -225,6 +257,7 @@ async def initiate_payment():
 async def download_receipt():
     """
     Download a fee receipt.
+    With "stream": true the receipt itself is streamed back (application/pdf) instead of a base64 JSON payload.
     """
     try:
         data = await request.get_json()
@@ -234,11 +267,18 @@ async def download_receipt():
                 "message": "Request body must be valid JSON."
             }), 400
 
-        if "session_cookies" not in data:
+        if "session_token" not in data and "session_cookies" not in data:
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
+
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
         
         receipt_identifier = data.get("receipt_identifier")
         if not receipt_identifier:
@@ -247,9 +287,24 @@ async def download_receipt():
                 "message": "Missing 'receipt_identifier' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
-        
-        file_content, filename = await student_fees_viewmodel.download_receipt(session_cookies, receipt_identifier)
+        owner, receipt_no = session.file_owner, data.get("receipt_no")
+        cache_key = student_fees_viewmodel.receipt_cache_key(owner, receipt_no, receipt_identifier) if owner and receipt_no else None
+
+        if data.get("stream") is True:
+            cached = await file_cache.get(cache_key) if cache_key else None
+            if cached:
+                return await cached_file_response(cached, "application/pdf", cached.filename or "receipt.pdf", disposition="attachment")
+
+            stream = await session_store.call(session, student_fees_viewmodel.open_receipt_stream, receipt_identifier)
+            filename = stream.filename or "receipt.pdf"
+            tee = await file_cache.writer(cache_key, filename, "application/pdf") if cache_key else None
+            return await stream_file_response(stream, "application/pdf", filename, tee=tee, disposition="attachment")
+
+        download = lambda: session_store.call(session, student_fees_viewmodel.download_receipt, receipt_identifier)
+        if cache_key:
+            file_content, filename = await file_cache.fetch(cache_key, download, "application/pdf")
+        else:
+            file_content, filename = await download()
 
         import base64
         base64_content = base64.b64encode(file_content).decode('utf-8')
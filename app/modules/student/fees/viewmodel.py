@@ -1,8 +1,14 @@
 import re
 import logging
-import httpx
 from bs4 import BeautifulSoup
+from app.core.client import BMUClient
 from app.core.config import config
+from app.core.executor import ParseExecutor
+from app.core.formstate import form_state
+from app.core.parser import ExtractSpec, extracts, is_login_page, parse_hidden_fields
+from app.core.sessions import PortalSessionExpiredError
+from app.core.singleflight import coalesce
+from app.core.streaming import UpstreamStream
 from app.modules.student.fees.models import FeeHistoryData, FeePostingData, PendingFeesData, PaymentInitiationResponse
 from typing import Optional
 
@@ -16,32 +22,28 @@ class ExternalServiceError(FeesError):
     """Raised when external BMU portal fails."""
     pass
 
+class SessionExpiredError(FeesError, PortalSessionExpiredError):
+    """Raised when the portal bounces the request to its login page."""
+    pass
+
 class StudentFeesViewModel:
-    FEE_HISTORY_URL = "https://bmu.gnums.co.in/StudentPanel/Fee/StudentFeeHistory.aspx"
-    FEE_DASHBOARD_URL = "https://bmu.gnums.co.in/StudentPanel/Fee/FEE_FeeDashboard.aspx"
+    FEE_HISTORY_URL = f"{config.BMU_PORTAL_URL}/StudentPanel/Fee/StudentFeeHistory.aspx"
+    FEE_DASHBOARD_URL = f"{config.BMU_PORTAL_URL}/StudentPanel/Fee/FEE_FeeDashboard.aspx"
 
+    @coalesce
     async def fetch_fee_history(self, session_cookies: dict) -> FeeHistoryData:
         try:
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
-            async with httpx.AsyncClient(
-                cookies=cookies_jar,
-                follow_redirects=True,
-                timeout=config.REQUEST_TIMEOUT
-            ) as client:
+            async with BMUClient.session(session_cookies) as client:
                 resp = await client.get(self.FEE_HISTORY_URL)
                 
                 if resp.status_code != 200:
                     raise ExternalServiceError(f"Failed to fetch fee history. Status: {resp.status_code}")
 
-                soup = BeautifulSoup(resp.text, "html.parser")
-                
-                if soup.find("input", {"id": "txtUsername"}):
-                     raise FeesError("Invalid session or expired cookies.")
+                if is_login_page(resp.text):
+                     raise SessionExpiredError("Invalid session or expired cookies.")
 
-                data = self._parse_fee_history(soup)
+                data, hidden = await ParseExecutor.run(self._parse_fee_history, resp.text, form_state=True)
+                form_state.remember(session_cookies, self.FEE_HISTORY_URL, hidden)
                 return FeeHistoryData(**data)
 
         except FeesError:
@@ -50,32 +52,23 @@ class StudentFeesViewModel:
             logger.error(f"Error fetching fee history: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
+    @coalesce
     async def fetch_fee_posting_details(self, session_cookies: dict, fee_posting_id: str) -> FeePostingData:
         try:
             if not fee_posting_id:
                 raise FeesError("Missing 'fee_posting_id'.")
 
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
-            async with httpx.AsyncClient(
-                cookies=cookies_jar,
-                follow_redirects=True,
-                timeout=config.REQUEST_TIMEOUT
-            ) as client:
-                url = f"https://bmu.gnums.co.in/StudentPanel/Fee/StudentFeeHistoryView.aspx?FeePostingID={fee_posting_id}"
+            async with BMUClient.session(session_cookies) as client:
+                url = f"{config.BMU_PORTAL_URL}/StudentPanel/Fee/StudentFeeHistoryView.aspx?FeePostingID={fee_posting_id}"
                 resp = await client.get(url)
                 
                 if resp.status_code != 200:
                     raise ExternalServiceError(f"Failed to fetch fee posting details. Status: {resp.status_code}")
 
-                soup = BeautifulSoup(resp.text, "html.parser")
-                
-                if soup.find("input", {"id": "txtUsername"}):
-                     raise FeesError("Invalid session or expired cookies.")
+                if is_login_page(resp.text):
+                     raise SessionExpiredError("Invalid session or expired cookies.")
 
-                data = self._parse_fee_posting(soup)
+                data = await ParseExecutor.run(self._parse_fee_posting, resp.text)
                 return FeePostingData(**data)
 
         except FeesError:
@@ -84,38 +77,54 @@ class StudentFeesViewModel:
             logger.error(f"Error fetching fee posting details: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
+    @staticmethod
+    def receipt_cache_key(owner: str, receipt_no: str, receipt_id: str) -> str:
+        """
+        File-cache key of a fee receipt. Receipt ids are row postbacks that point at another receipt once a
+        new one is issued, so the key carries the receipt number the client picked the row by.
+        """
+        return f"receipt:{owner}|{receipt_no}|{receipt_id}"
+
+    async def _load_receipt_form(self, client) -> dict:
+        resp_get = await client.get(self.FEE_HISTORY_URL)
+        if resp_get.status_code != 200:
+            raise ExternalServiceError(f"Failed to fetch page for receipt. Status: {resp_get.status_code}")
+        
+        if is_login_page(resp_get.text):
+             raise SessionExpiredError("Invalid session or expired cookies.")
+
+        return await ParseExecutor.run(parse_hidden_fields, resp_get.text)
+
+    @staticmethod
+    def _receipt_postback(hidden: dict, receipt_id: str) -> dict:
+        return {
+            "__EVENTTARGET": receipt_id,
+            "__EVENTARGUMENT": "",
+            "__VIEWSTATE": hidden["__VIEWSTATE"],
+            "__VIEWSTATEGENERATOR": hidden["__VIEWSTATEGENERATOR"],
+            "__EVENTVALIDATION": hidden["__EVENTVALIDATION"]
+        }
+
+    @coalesce
     async def download_receipt(self, session_cookies: dict, receipt_id: str) -> tuple[bytes, str]:
         try:
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
-            async with httpx.AsyncClient(
-                cookies=cookies_jar,
-                follow_redirects=True,
-                timeout=config.REQUEST_TIMEOUT
-            ) as client:
-                resp_get = await client.get(self.FEE_HISTORY_URL)
-                if resp_get.status_code != 200:
-                    raise ExternalServiceError(f"Failed to fetch page for receipt. Status: {resp_get.status_code}")
-                
-                soup = BeautifulSoup(resp_get.text, "html.parser")
-                viewstate = soup.find("input", {"id": "__VIEWSTATE"})["value"]
-                viewstategenerator = soup.find("input", {"id": "__VIEWSTATEGENERATOR"})["value"]
-                eventvalidation = soup.find("input", {"id": "__EVENTVALIDATION"})["value"]
-
-                data = {
-                    "__EVENTTARGET": receipt_id,
-                    "__EVENTARGUMENT": "",
-                    "__VIEWSTATE": viewstate,
-                    "__VIEWSTATEGENERATOR": viewstategenerator,
-                    "__EVENTVALIDATION": eventvalidation
-                }
-                
-                resp_post = await client.post(self.FEE_HISTORY_URL, data=data)
+            async with BMUClient.session(session_cookies) as client:
+                resp_post = await form_state.postback(
+                    session_cookies,
+                    self.FEE_HISTORY_URL,
+                    load=lambda: self._load_receipt_form(client),
+                    send=lambda hidden: client.post(self.FEE_HISTORY_URL, data=self._receipt_postback(hidden, receipt_id)),
+                    accept=lambda r: r.status_code == 200 and "text/html" not in r.headers.get("content-type", "").lower(),
+                )
                 
                 if resp_post.status_code != 200:
                     raise ExternalServiceError(f"Failed to download receipt. Status: {resp_post.status_code}")
+
+                # An HTML page here is the portal's error or login page, not a receipt (and must not be cached as one).
+                if "text/html" in resp_post.headers.get("content-type", "").lower():
+                    if is_login_page(resp_post.text):
+                        raise SessionExpiredError("Invalid session or expired cookies.")
+                    raise ExternalServiceError("Receipt not returned by server.")
                 
                 filename = "receipt.pdf"
                 cd = resp_post.headers.get("content-disposition")
@@ -124,10 +133,49 @@ class StudentFeesViewModel:
 
                 return resp_post.content, filename
 
+        except FeesError:
+            raise
         except Exception as e:
             logger.error(f"Error downloading receipt: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
+    async def open_receipt_stream(self, session_cookies: dict, receipt_id: str) -> UpstreamStream:
+        """
+        Run the receipt postback but leave the body unread, so it can be relayed to the client chunk by chunk.
+        The caller owns the returned stream and must aclose() it.
+        """
+        client = BMUClient.session(session_cookies)
+        try:
+            stream = await form_state.postback(
+                session_cookies,
+                self.FEE_HISTORY_URL,
+                load=lambda: self._load_receipt_form(client),
+                send=lambda hidden: UpstreamStream.open(client, "POST", self.FEE_HISTORY_URL, data=self._receipt_postback(hidden, receipt_id)),
+                accept=lambda s: s.status_code == 200 and "text/html" not in s.content_type,
+                discard=lambda s: s.response.aclose(),
+            )
+            if stream.status_code != 200:
+                await stream.aclose()
+                raise ExternalServiceError(f"Failed to download receipt. Status: {stream.status_code}")
+
+            if "text/html" in stream.content_type:
+                page = (await stream.response.aread()).decode(stream.response.encoding or "utf-8", errors="replace")
+                await stream.aclose()
+                if is_login_page(page):
+                    raise SessionExpiredError("Invalid session or expired cookies.")
+                raise ExternalServiceError("Receipt not returned by server.")
+
+            return stream
+
+        except FeesError:
+            await client.aclose()
+            raise
+        except Exception as e:
+            await client.aclose()
+            logger.error(f"Error opening receipt stream: {e}", exc_info=True)
+            raise ExternalServiceError(f"Unexpected error: {e}")
+
+    @extracts(ExtractSpec(ids=("ctl00_cphPageContent_divFeePosting", "ctl00_cphPageContent_divAcademicFeeReceipt", "ctl00_cphPageContent_Div_StudentFeePayment"), id_prefixes=("ctl00_cphPageContent_lbl",)))
     def _parse_fee_history(self, soup: BeautifulSoup) -> dict:
         def get_text(_id):
             el = soup.find(id=_id)
@@ -235,6 +283,7 @@ class StudentFeesViewModel:
             }
         }
 
+    @extracts(ExtractSpec(id_prefixes=("ctl00_cphPageContent_lbl",), classes=("table-advanced",)))
     def _parse_fee_posting(self, soup: BeautifulSoup) -> dict:
         def get_text(_id):
             el = soup.find(id=_id)
@@ -289,28 +338,19 @@ class StudentFeesViewModel:
             "totals": totals
         }
 
+    @coalesce
     async def fetch_pending_fees(self, session_cookies: dict) -> PendingFeesData:
         try:
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
-            async with httpx.AsyncClient(
-                cookies=cookies_jar,
-                follow_redirects=True,
-                timeout=config.REQUEST_TIMEOUT
-            ) as client:
+            async with BMUClient.session(session_cookies) as client:
                 resp = await client.get(self.FEE_DASHBOARD_URL)
                 
                 if resp.status_code != 200:
                     raise ExternalServiceError(f"Failed to fetch fee dashboard. Status: {resp.status_code}")
 
-                soup = BeautifulSoup(resp.text, "html.parser")
-                
-                if soup.find("input", {"id": "txtUsername"}):
-                     raise FeesError("Invalid session or expired cookies.")
+                if is_login_page(resp.text):
+                     raise SessionExpiredError("Invalid session or expired cookies.")
 
-                data = self._parse_pending_fees(soup)
+                data = await ParseExecutor.run(self._parse_pending_fees, resp.text)
                 return PendingFeesData(**data)
 
         except FeesError:
@@ -319,6 +359,7 @@ class StudentFeesViewModel:
             logger.error(f"Error fetching pending fees: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
+    @extracts(ExtractSpec(ids=("ctl00_cphPageContent_Div_CurrentAcademicFeeDetails",), id_prefixes=("ctl00_cphPageContent_rpSemesterWise_",), classes=("note-info",)))
     def _parse_pending_fees(self, soup: BeautifulSoup) -> dict:
         def get_text(_id):
             el = soup.find(id=_id)
@@ -387,25 +428,45 @@ class StudentFeesViewModel:
             **totals
         }
 
+    def _parse_payment_form(self, soup: BeautifulSoup) -> dict:
+        data = {}
+        form = soup.find("form", {"id": "form1"}) or soup.find("form", {"id": "aspnetForm"}) # Try both typical IDs
+        if not form:
+            # Fallback to searching all inputs if form not found or non-standard
+            for inp in soup.find_all("input"):
+                 name = inp.get("name")
+                 if name:
+                     data[name] = inp.get("value", "")
+        else:
+            for inp in form.find_all("input"):
+                name = inp.get("name")
+                if name:
+                    data[name] = inp.get("value", "")
+
+        pay_btn_name = None
+        pay_btn = soup.find("input", {"value": "Pay Now"})
+        if pay_btn:
+            pay_btn_name = pay_btn.get("name")
+        else:
+            pay_btn = soup.find("input", id=lambda x: x and x.endswith("btnAcademicFeeOnline"))
+            if pay_btn:
+                 pay_btn_name = pay_btn.get("name")
+
+        return {
+            "data": data,
+            "pay_btn_name": pay_btn_name
+        }
+
     async def initiate_payment(self, session_cookies: dict) -> PaymentInitiationResponse:
         try:
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
             headers = {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
                 "Referer": self.FEE_DASHBOARD_URL,
-                "Origin": "https://bmu.gnums.co.in"
+                "Origin": config.BMU_PORTAL_URL
             }
 
-            async with httpx.AsyncClient(
-                cookies=cookies_jar,
-                headers=headers,
-                follow_redirects=True, # We want to follow to see where it lands, unless we want to catch the 302 specifically. 
-                # Actually, follow_redirects=True is good. If it goes to Gateway, we get the Gateway page content.
-                timeout=config.REQUEST_TIMEOUT
-            ) as client:
+            # We want to follow redirects to see where it lands; if it goes to the Gateway, we get the Gateway page content.
+            async with BMUClient.session(session_cookies, headers=headers) as client:
                 # 1. Get the dashboard to get fresh ViewStates and form data
                 logger.info("Fetching dashboard for payment initiation...")
                 resp_get = await client.get(self.FEE_DASHBOARD_URL)
@@ -413,35 +474,13 @@ class StudentFeesViewModel:
                 if resp_get.status_code != 200:
                     raise ExternalServiceError(f"Failed to fetch dashboard for payment. Status: {resp_get.status_code}")
 
-                soup = BeautifulSoup(resp_get.text, "html.parser")
-                
-                if soup.find("input", {"id": "txtUsername"}):
-                     raise FeesError("Invalid session or expired cookies.")
-
-                # 2. Extract all form inputs
-                data = {}
-                form = soup.find("form", {"id": "form1"}) or soup.find("form", {"id": "aspnetForm"}) # Try both typical IDs
-                if not form:
-                    # Fallback to searching all inputs if form not found or non-standard
-                    for inp in soup.find_all("input"):
-                         name = inp.get("name")
-                         if name:
-                             data[name] = inp.get("value", "")
-                else:
-                    for inp in form.find_all("input"):
-                        name = inp.get("name")
-                        if name:
-                            data[name] = inp.get("value", "")
-                
-                # 3. Handle the specific button "Pay Now"
-                pay_btn_name = None
-                pay_btn = soup.find("input", {"value": "Pay Now"})
-                if pay_btn:
-                    pay_btn_name = pay_btn.get("name")
-                else:
-                    pay_btn = soup.find("input", id=lambda x: x and x.endswith("btnAcademicFeeOnline"))
-                    if pay_btn:
-                         pay_btn_name = pay_btn.get("name")
+                if is_login_page(resp_get.text):
+                     raise SessionExpiredError("Invalid session or expired cookies.")
+
+                # 2. Extract all form inputs and 3. the specific "Pay Now" button
+                payment_form = await ParseExecutor.run(self._parse_payment_form, resp_get.text)
+                data = payment_form["data"]
+                pay_btn_name = payment_form["pay_btn_name"]
                 
                 if not pay_btn_name:
                     logger.error("Could not find Pay Now button on the page.")
@@ -1,5 +1,11 @@
 from quart import Blueprint, request, jsonify
 from app.modules.student.lms.viewmodel import student_lms_viewmodel, LMSError, ExternalServiceError
+from app.modules.student.lms.models import PDFResponse
+from app.core.sessions import session_store
+from app.core.response_cache import response_cache, wants_refresh, is_not_modified, not_modified, etag_headers
+from app.core.streaming import stream_file_response, cached_file_response
+from app.core.filecache import file_cache
+import base64
 import logging
 
 logger = logging.getLogger("bmu.modules.student.lms")
@@ -19,22 +25,30 @@ async def get_lms_dashboard():
                 "message": "Request body must be valid JSON."
             }), 400
 
-        if "session_cookies" not in data:
+        if "session_token" not in data and "session_cookies" not in data:
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
         semester = data.get("semester")
         
-        dashboard_data = await student_lms_viewmodel.fetch_lms_dashboard(session_cookies, semester)
+        dashboard_data, etag = await response_cache.fetch(session, "lms", student_lms_viewmodel.fetch_lms_dashboard, semester, refresh=wants_refresh(data))
+        if is_not_modified(etag):
+            return not_modified(etag)
 
         return jsonify({
             "success": True,
             "message": "LMS dashboard fetched successfully.",
             "data": dashboard_data.dict()
-        }), 200
+        }), 200, etag_headers(etag)
 
     except ExternalServiceError as e:
         logger.error(f"External service error: {e}")
@@ -71,13 +85,19 @@ async def get_lms_subject_details():
                 "message": "Request body must be valid JSON."
             }), 400
 
-        if "session_cookies" not in data:
+        if "session_token" not in data and "session_cookies" not in data:
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
         path = data.get("path")
 
         if not path:
@@ -86,13 +106,15 @@ async def get_lms_subject_details():
                 "message": "Missing 'path' in request body."
             }), 400
         
-        subject_data = await student_lms_viewmodel.fetch_lms_subject_details(session_cookies, path)
+        subject_data, etag = await response_cache.fetch(session, "lms_subject", student_lms_viewmodel.fetch_lms_subject_details, path, refresh=wants_refresh(data))
+        if is_not_modified(etag):
+            return not_modified(etag)
 
         return jsonify({
             "success": True,
             "message": "Subject details fetched successfully.",
             "data": subject_data.dict()
-        }), 200
+        }), 200, etag_headers(etag)
 
     except LMSError as e:
         return jsonify({
@@ -120,6 +142,8 @@ async def get_lms_subject_details():
 async def get_lms_pdf():
     """
     Fetch PDF via postback.
+    With "stream": true the PDF itself is streamed back (application/pdf, Range supported)
+    instead of a base64 JSON payload.
     """
     try:
         data = await request.get_json()
@@ -129,13 +153,19 @@ async def get_lms_pdf():
                 "message": "Request body must be valid JSON."
             }), 400
 
-        if "session_cookies" not in data:
+        if "session_token" not in data and "session_cookies" not in data:
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
         postback_id = data.get("postback_id")
         form_action = data.get("form_action")
 
@@ -145,12 +175,29 @@ async def get_lms_pdf():
                 "message": "Missing 'postback_id' or 'form_action' in request body."
             }), 400
         
-        pdf_response = await student_lms_viewmodel.fetch_pdf_via_postback(session_cookies, postback_id, form_action)
+        owner = session.file_owner
+        cache_key = student_lms_viewmodel.pdf_cache_key(owner, postback_id, form_action, data.get("file_id")) if owner else None
+
+        if data.get("stream") is True:
+            range_header = request.headers.get("Range")
+            cached = await file_cache.get(cache_key) if cache_key else None
+            if cached:
+                return await cached_file_response(cached, "application/pdf", cached.filename, range_header)
+
+            stream = await session_store.call(session, student_lms_viewmodel.open_pdf_stream, postback_id, form_action, range_header)
+            tee = await file_cache.writer(cache_key, stream.filename, "application/pdf") if cache_key and not range_header else None
+            return await stream_file_response(stream, "application/pdf", stream.filename, range_header, tee=tee)
+
+        download = lambda: session_store.call(session, student_lms_viewmodel.download_pdf, postback_id, form_action)
+        if cache_key:
+            content, _ = await file_cache.fetch(cache_key, download, "application/pdf")
+        else:
+            content, _ = await download()
 
         return jsonify({
             "success": True,
             "message": "PDF fetched successfully.",
-            "data": pdf_response.dict()
+            "data": PDFResponse(pdf_base64=base64.b64encode(content).decode("utf-8")).dict()
         }), 200
 
     except LMSError as e:
@@ -188,13 +235,19 @@ async def submit_lms_rating():
                 "message": "Request body must be valid JSON."
             }), 400
 
-        if "session_cookies" not in data:
+        if "session_token" not in data and "session_cookies" not in data:
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
         path = data.get("path")
         postback_id = data.get("postback_id")
 
@@ -204,7 +257,8 @@ async def submit_lms_rating():
                 "message": "Missing 'path' or 'postback_id' in request body."
             }), 400
         
-        success = await student_lms_viewmodel.submit_rating(session_cookies, path, postback_id)
+        success = await session_store.call(session, student_lms_viewmodel.submit_rating, path, postback_id)
+        response_cache.invalidate_session(session)
 
         if success:
             return jsonify({
@@ -1,10 +1,16 @@
 import logging
-import httpx
 import base64
 import re
 from urllib.parse import urlparse, parse_qs
 from bs4 import BeautifulSoup
+from app.core.client import BMUClient
 from app.core.config import config
+from app.core.executor import ParseExecutor
+from app.core.formstate import form_state, is_row_postback
+from app.core.parser import ExtractSpec, extracts, is_login_page, parse_hidden_fields
+from app.core.sessions import PortalSessionExpiredError
+from app.core.singleflight import coalesce
+from app.core.streaming import UpstreamStream
 from app.modules.student.lms.models import LMSDashboardData, LMSSubjectData, PDFResponse
 from typing import Optional
 
@@ -18,13 +24,17 @@ class ExternalServiceError(LMSError):
     """Raised when external BMU portal fails."""
     pass
 
+class SessionExpiredError(LMSError, PortalSessionExpiredError):
+    """Raised when the portal bounces the request to its login page."""
+    pass
+
 class StudentLMSViewModel:
-    LMS_DASHBOARD_URL = "https://bmu.gnums.co.in/StudentPanel/LMS/LMS_ContentStudentDashboard.aspx"
-    LMS_BASE_URL = "https://bmu.gnums.co.in/StudentPanel/LMS"
+    LMS_DASHBOARD_URL = f"{config.BMU_PORTAL_URL}/StudentPanel/LMS/LMS_ContentStudentDashboard.aspx"
+    LMS_BASE_URL = f"{config.BMU_PORTAL_URL}/StudentPanel/LMS"
     DEFAULT_HEADERS = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36",
-        "Referer": "https://bmu.gnums.co.in/StudentPanel/LMS/LMS_ContentStudentDashboard.aspx",
-        "Origin": "https://bmu.gnums.co.in",
+        "Referer": f"{config.BMU_PORTAL_URL}/StudentPanel/LMS/LMS_ContentStudentDashboard.aspx",
+        "Origin": config.BMU_PORTAL_URL,
         "Sec-Fetch-Dest": "document",
         "Sec-Fetch-Mode": "navigate",
         "Sec-Fetch-Site": "same-origin",
@@ -33,50 +43,34 @@ class StudentLMSViewModel:
         "Cache-Control": "max-age=0"
     }
 
+    @coalesce
     async def fetch_lms_dashboard(self, session_cookies: dict, semester: Optional[str] = None) -> LMSDashboardData:
         try:
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
-            async with httpx.AsyncClient(
-                cookies=cookies_jar,
-                headers=self.DEFAULT_HEADERS,
-                follow_redirects=True,
-                timeout=config.REQUEST_TIMEOUT
-            ) as client:
+            async with BMUClient.session(session_cookies, headers=self.DEFAULT_HEADERS) as client:
                 if semester:
-                    resp_get = await client.get(self.LMS_DASHBOARD_URL)
-                    if resp_get.status_code != 200:
-                        raise ExternalServiceError(f"Failed to fetch LMS dashboard. Status: {resp_get.status_code}")
-                    
-                    soup = BeautifulSoup(resp_get.text, "html.parser")
-                    
-                    data = {
-                        tag.get("name"): tag.get("value", "")
-                        for tag in soup.select("input[type=hidden]")
-                        if tag.get("name")
-                    }
-
-                    data.update({
-                        "__EVENTTARGET": "ctl00$cphPageHeaderRight$ddlSemester",
-                        "__EVENTARGUMENT": "",
-                        "ctl00$cphPageHeaderRight$ddlSemester": semester
-                    })
-                    
-                    resp = await client.post(self.LMS_DASHBOARD_URL, data=data)
+                    resp = await form_state.postback(
+                        session_cookies,
+                        self.LMS_DASHBOARD_URL,
+                        load=lambda: self._load_form(client, self.LMS_DASHBOARD_URL, "Failed to fetch LMS dashboard."),
+                        send=lambda fields: client.post(self.LMS_DASHBOARD_URL, data={
+                            **fields,
+                            "__EVENTTARGET": "ctl00$cphPageHeaderRight$ddlSemester",
+                            "__EVENTARGUMENT": "",
+                            "ctl00$cphPageHeaderRight$ddlSemester": semester
+                        }),
+                        accept=lambda r: r.status_code == 200 and not is_login_page(r.text),
+                    )
                 else:
                     resp = await client.get(self.LMS_DASHBOARD_URL)
                 
                 if resp.status_code != 200:
                     raise ExternalServiceError(f"Failed to fetch LMS dashboard. Status: {resp.status_code}")
 
-                soup = BeautifulSoup(resp.text, "html.parser")
-                
-                if soup.find("input", {"id": "txtUsername"}):
-                     raise LMSError("Invalid session or expired cookies.")
+                if is_login_page(resp.text):
+                     raise SessionExpiredError("Invalid session or expired cookies.")
 
-                data = self._parse_lms_dashboard(soup)
+                data, hidden = await ParseExecutor.run(self._parse_lms_dashboard, resp.text, form_state=True)
+                form_state.remember(session_cookies, self.LMS_DASHBOARD_URL, hidden)
                 return LMSDashboardData(**data)
 
         except LMSError:
@@ -85,34 +79,25 @@ class StudentLMSViewModel:
             logger.error(f"Error fetching LMS dashboard: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
+    @coalesce
     async def fetch_lms_subject_details(self, session_cookies: dict, path: str) -> LMSSubjectData:
         try:
             if not path:
                 raise LMSError("Missing 'path' parameter.")
 
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
             url = f"{self.LMS_BASE_URL}/{path}"
             
-            async with httpx.AsyncClient(
-                cookies=cookies_jar,
-                headers=self.DEFAULT_HEADERS,
-                follow_redirects=True,
-                timeout=config.REQUEST_TIMEOUT
-            ) as client:
+            async with BMUClient.session(session_cookies, headers=self.DEFAULT_HEADERS) as client:
                 resp = await client.get(url)
                 
                 if resp.status_code != 200:
                     raise ExternalServiceError(f"Failed to fetch subject details. Status: {resp.status_code}")
 
-                soup = BeautifulSoup(resp.text, "html.parser")
-                
-                if soup.find("input", {"id": "txtUsername"}):
-                     raise LMSError("Invalid session or expired cookies.")
+                if is_login_page(resp.text):
+                     raise SessionExpiredError("Invalid session or expired cookies.")
 
-                data = self._parse_subject_details(soup, path)
+                data, hidden = await ParseExecutor.run(self._parse_subject_details, resp.text, path, form_state=True)
+                form_state.remember(session_cookies, url, hidden)
                 return LMSSubjectData(**data)
 
         except LMSError:
@@ -121,142 +106,218 @@ class StudentLMSViewModel:
             logger.error(f"Error fetching subject details: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
-    async def fetch_pdf_via_postback(self, session_cookies: dict, postback_id: str, form_action: str) -> PDFResponse:
+    async def _load_form(self, client, url: str, error: str) -> dict:
+        """GET a page only for its hidden fields (used when no form state is remembered for it)."""
+        resp = await client.get(url)
+        if resp.status_code != 200:
+             raise ExternalServiceError(f"{error} Status: {resp.status_code}")
+        
+        if is_login_page(resp.text):
+             raise SessionExpiredError("Invalid session or expired cookies.")
+
+        return await ParseExecutor.run(parse_hidden_fields, resp.text)
+
+    @staticmethod
+    def _pdf_postback(fields: dict, postback_id: str) -> dict:
+        fields["__EVENTTARGET"] = postback_id
+        fields["__EVENTARGUMENT"] = ""
+        return fields
+
+    @staticmethod
+    def _is_pdf(content_type: str) -> bool:
+        return "application/pdf" in content_type or "application/download" in content_type
+
+    @staticmethod
+    def pdf_cache_key(owner: str, postback_id: str, form_action: str, file_id: Optional[str] = None) -> Optional[str]:
+        """
+        File-cache key of an LMS PDF, or None when it cannot be cached. Scoped to the student: a cache hit
+        skips the portal, and with it the portal's check that this student may open the material (blobs are
+        content-addressed, so the same PDF cached for a whole class is still stored once). Row postbacks
+        are positional and need the client's stable `file_id` to tell which document they fetched.
+        """
+        if is_row_postback(postback_id) and not file_id:
+            return None
+        return f"lms_pdf:{owner}|{form_action}|{postback_id}|{file_id or ''}"
+
+    async def download_pdf(self, session_cookies: dict, postback_id: str, form_action: str) -> tuple[bytes, Optional[str]]:
         try:
-            url = f"{self.LMS_BASE_URL}/{form_action}"
-            
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
-            async with httpx.AsyncClient(
-                cookies=cookies_jar,
-                headers=self.DEFAULT_HEADERS,
-                follow_redirects=True,
-                timeout=config.REQUEST_TIMEOUT
-            ) as client:
-                resp = await client.get(url)
-                if resp.status_code != 200:
-                     raise ExternalServiceError(f"Failed to load form for PDF. Status: {resp.status_code}")
-                
-                soup = BeautifulSoup(resp.text, "html.parser")
+            async with BMUClient.session(session_cookies, headers=self.DEFAULT_HEADERS) as client:
+                url = f"{self.LMS_BASE_URL}/{form_action}"
 
-                form_data = {
-                    tag.get("name"): tag.get("value", "")
-                    for tag in soup.select("input[type=hidden]")
-                    if tag.get("name")
-                }
-                form_data["__EVENTTARGET"] = postback_id
-                form_data["__EVENTARGUMENT"] = ""
-
-                post_resp = await client.post(
+                post_resp = await form_state.postback(
+                    session_cookies,
                     url,
-                    data=form_data,
-                    cookies=session_cookies,
-                    headers={"Content-Type": "application/x-www-form-urlencoded"}
+                    load=lambda: self._load_form(client, url, "Failed to load form for PDF."),
+                    send=lambda fields: client.post(
+                        url,
+                        data=self._pdf_postback(fields, postback_id),
+                        headers={"Content-Type": "application/x-www-form-urlencoded"}
+                    ),
+                    accept=lambda r: self._is_pdf(r.headers.get("content-type", "").lower()),
                 )
 
                 content_type = post_resp.headers.get("content-type", "").lower()
                 
-                if "application/pdf" in content_type or "application/download" in content_type:
-                    pdf_base64 = base64.b64encode(post_resp.content).decode("utf-8")
-                    return PDFResponse(pdf_base64=pdf_base64)
+                if self._is_pdf(content_type):
+                    filename = None
+                    cd = post_resp.headers.get("content-disposition")
+                    if cd and "filename=" in cd:
+                        filename = cd.split("filename=")[1].split(";")[0].strip().strip('"')
+                    return post_resp.content, filename
                 else:
                     raise ExternalServiceError("PDF not returned by server.")
 
+        except LMSError:
+            raise
         except Exception as e:
             logger.error(f"Error fetching PDF: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
+    async def fetch_pdf_via_postback(self, session_cookies: dict, postback_id: str, form_action: str) -> PDFResponse:
+        content, _ = await self.download_pdf(session_cookies, postback_id, form_action)
+        return PDFResponse(pdf_base64=base64.b64encode(content).decode("utf-8"))
+
+    async def open_pdf_stream(self, session_cookies: dict, postback_id: str, form_action: str, range_header: Optional[str] = None) -> UpstreamStream:
+        """
+        Run the PDF postback but leave the body unread, so it can be relayed to the client chunk by chunk.
+        The caller owns the returned stream and must aclose() it.
+        """
+        client = BMUClient.session(session_cookies, headers=self.DEFAULT_HEADERS)
+        try:
+            url = f"{self.LMS_BASE_URL}/{form_action}"
+
+            headers = {"Content-Type": "application/x-www-form-urlencoded"}
+            if range_header:
+                headers["Range"] = range_header
+
+            stream = await form_state.postback(
+                session_cookies,
+                url,
+                load=lambda: self._load_form(client, url, "Failed to load form for PDF."),
+                send=lambda fields: UpstreamStream.open(client, "POST", url, data=self._pdf_postback(fields, postback_id), headers=headers),
+                accept=lambda s: s.status_code in (200, 206) and self._is_pdf(s.content_type),
+                discard=lambda s: s.response.aclose(),
+            )
+            if stream.status_code not in (200, 206) or not self._is_pdf(stream.content_type):
+                await stream.aclose()
+                raise ExternalServiceError("PDF not returned by server.")
+            return stream
+
+        except LMSError:
+            await client.aclose()
+            raise
+        except Exception as e:
+            await client.aclose()
+            logger.error(f"Error opening PDF stream: {e}", exc_info=True)
+            raise ExternalServiceError(f"Unexpected error: {e}")
+
     async def submit_rating(self, session_cookies: dict, path: str, postback_id: str) -> bool:
         try:
             url = f"{self.LMS_BASE_URL}/{path}"
             
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
-            async with httpx.AsyncClient(
-                cookies=cookies_jar,
-                headers=self.DEFAULT_HEADERS,
-                follow_redirects=True,
-                timeout=config.REQUEST_TIMEOUT
-            ) as client:
-                resp = await client.get(url)
-                if resp.status_code != 200:
-                     raise ExternalServiceError(f"Failed to load page for rating. Status: {resp.status_code}")
-                
-                soup = BeautifulSoup(resp.text, "html.parser")
+            async with BMUClient.session(session_cookies, headers=self.DEFAULT_HEADERS) as client:
+                # The form normally posts back to the page itself; a fresh load tells us otherwise.
+                target = {"url": url}
+
+                async def load():
+                    resp = await client.get(url)
+                    if resp.status_code != 200:
+                         raise ExternalServiceError(f"Failed to load page for rating. Status: {resp.status_code}")
+                    
+                    if is_login_page(resp.text):
+                         raise SessionExpiredError("Invalid session or expired cookies.")
+
+                    rating_form = await ParseExecutor.run(self._parse_rating_form, resp.text)
+                    if rating_form["action"]:
+                        target["url"] = self._resolve_form_action(rating_form["action"])
+                    return rating_form["form_data"]
+
+                def send(form_data):
+                    post_url = target["url"]
+                    parsed_url = urlparse(post_url)
+                    query_params = parse_qs(parsed_url.query)
+                    for key, values in query_params.items():
+                        if values:
+                            form_data[key] = values[0]
+
+                    form_data["__EVENTTARGET"] = postback_id
+                    form_data["__EVENTARGUMENT"] = ""
+                    
+                    logger.info(f"Submitting rating to {post_url} with keys: {list(form_data.keys())}")
 
-                form_data = {
-                    tag.get("name"): tag.get("value", "")
-                    for tag in soup.select("input[type=hidden]")
-                    if tag.get("name")
-                }
-                
-                if "__VIEWSTATE" not in form_data:
-                    viewstate = soup.find("input", {"id": "__VIEWSTATE"})
-                    if viewstate:
-                        form_data["__VIEWSTATE"] = viewstate.get("value", "")
-                
-                if "__EVENTVALIDATION" not in form_data:
-                    event_validation = soup.find("input", {"id": "__EVENTVALIDATION"})
-                    if event_validation:
-                        form_data["__EVENTVALIDATION"] = event_validation.get("value", "")
-
-                if "__VIEWSTATEGENERATOR" not in form_data:
-                    generator = soup.find("input", {"id": "__VIEWSTATEGENERATOR"})
-                    if generator:
-                        form_data["__VIEWSTATEGENERATOR"] = generator.get("value", "")
-
-                form = soup.find("form", id="aspnetForm")
-                post_url = url
-                if form and form.get("action"):
-                    action = form.get("action")
-                    if action.startswith("./"):
-                        post_url = f"{self.LMS_BASE_URL}/{action[2:]}"
-                    elif action.startswith("/"):
-                        post_url = f"https://bmu.gnums.co.in{action}"
-                    else:
-                        post_url = f"{self.LMS_BASE_URL}/{action}"
-                
-                parsed_url = urlparse(post_url)
-                query_params = parse_qs(parsed_url.query)
-                for key, values in query_params.items():
-                    if values:
-                        form_data[key] = values[0]
-
-                form_data["__EVENTTARGET"] = postback_id
-                form_data["__EVENTARGUMENT"] = ""
-                
-                logger.info(f"Submitting rating to {post_url} with keys: {list(form_data.keys())}")
+                    post_headers = {
+                        "Content-Type": "application/x-www-form-urlencoded",
+                        "Referer": url,
+                        "Origin": config.BMU_PORTAL_URL
+                    }
+                    
+                    return client.post(
+                        post_url,
+                        data=form_data,
+                        headers=post_headers
+                    )
 
-                post_headers = {
-                    "Content-Type": "application/x-www-form-urlencoded",
-                    "Referer": url,
-                    "Origin": "https://bmu.gnums.co.in"
-                }
-                
-                post_resp = await client.post(
-                    post_url,
-                    data=form_data,
-                    headers=post_headers
+                def submitted(post_resp) -> bool:
+                    return post_resp.status_code == 302 or (post_resp.status_code == 200 and any(r.status_code == 302 for r in post_resp.history))
+
+                post_resp = await form_state.postback(
+                    session_cookies,
+                    url,
+                    load=load,
+                    send=send,
+                    accept=lambda r: submitted(r) and "Login.aspx" not in str(r.url),
                 )
 
-                if post_resp.status_code == 302 or (post_resp.status_code == 200 and any(r.status_code == 302 for r in post_resp.history)):
+                if submitted(post_resp):
                     if "Login.aspx" in str(post_resp.url):
                         logger.error("Rating submission redirected to Login.aspx. Session likely expired or invalid.")
-                        raise LMSError("Session expired or invalid. Please login again.")
+                        raise SessionExpiredError("Session expired or invalid. Please login again.")
                     
                     return True
                 else:
                     logger.error(f"Rating submission failed. Status: {post_resp.status_code}, History: {[r.status_code for r in post_resp.history]}")
                     return False
 
+        except LMSError:
+            raise
         except Exception as e:
             logger.error(f"Error submitting rating: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
+    def _resolve_form_action(self, action: str) -> str:
+        if action.startswith("./"):
+            return f"{self.LMS_BASE_URL}/{action[2:]}"
+        elif action.startswith("/"):
+            return f"{config.BMU_PORTAL_URL}{action}"
+        else:
+            return f"{self.LMS_BASE_URL}/{action}"
+
+    def _parse_rating_form(self, soup: BeautifulSoup) -> dict:
+        form_data = parse_hidden_fields(soup)
+
+        if "__VIEWSTATE" not in form_data:
+            viewstate = soup.find("input", {"id": "__VIEWSTATE"})
+            if viewstate:
+                form_data["__VIEWSTATE"] = viewstate.get("value", "")
+
+        if "__EVENTVALIDATION" not in form_data:
+            event_validation = soup.find("input", {"id": "__EVENTVALIDATION"})
+            if event_validation:
+                form_data["__EVENTVALIDATION"] = event_validation.get("value", "")
+
+        if "__VIEWSTATEGENERATOR" not in form_data:
+            generator = soup.find("input", {"id": "__VIEWSTATEGENERATOR"})
+            if generator:
+                form_data["__VIEWSTATEGENERATOR"] = generator.get("value", "")
+
+        form = soup.find("form", id="aspnetForm")
+
+        return {
+            "form_data": form_data,
+            "action": form.get("action") if form else None
+        }
+
+    @extracts(ExtractSpec(ids=("ctl00_cphPageContent_divSubjectWiseContentCount",)))
     def _parse_lms_dashboard(self, soup: BeautifulSoup) -> dict:
         subjects = []
         subject_cards = soup.select("div#ctl00_cphPageContent_divSubjectWiseContentCount div.col-lg-3")
@@ -334,7 +395,7 @@ class StudentLMSViewModel:
                 "name": staff_name_span.get_text(strip=True),
                 "designation": designation_span.get_text(strip=True) if designation_span else None,
                 "email": email_a.get_text(strip=True) if email_a else None,
-                "image_url": img_tag["src"].replace("../../", "https://bmu.gnums.co.in/") if img_tag else None
+                "image_url": img_tag["src"].replace("../../", f"{config.BMU_PORTAL_URL}/") if img_tag else None
             }
 
         units = []
@@ -414,7 +475,7 @@ class StudentLMSViewModel:
                                 "sr_no": tds[0].get_text(strip=True),
                                 "title": title,
                                 "link": link,
-                                "download_link": download_a["href"].replace("../../", "https://bmu.gnums.co.in/") if download_a else None,
+                                "download_link": download_a["href"].replace("../../", f"{config.BMU_PORTAL_URL}/") if download_a else None,
                                 "updated_date": updated_date,
                                 "updated_time": updated_time,
                                 "prepared_by": tds[4].get_text(strip=True),
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import Optional, Dict
+from app.modules.student.dashboard.models import DashboardData
+from app.modules.student.attendance.models import AttendanceSummary
+from app.modules.student.timetable.models import TimetableData
+from app.modules.student.fees.models import PendingFeesData
+from app.modules.student.lms.models import LMSDashboardData
+
+class OverviewData(BaseModel):
+    dashboard: Optional[DashboardData] = None
+    attendance: Optional[AttendanceSummary] = None
+    timetable: Optional[TimetableData] = None
+    pending_fees: Optional[PendingFeesData] = None
+    lms: Optional[LMSDashboardData] = None
+    errors: Dict[str, str] = {}
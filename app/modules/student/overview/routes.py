@@ -0,0 +1,68 @@
+from quart import Blueprint, request, jsonify
+from app.modules.student.overview.viewmodel import student_overview_viewmodel, OverviewError, ExternalServiceError
+from app.core.sessions import session_store
+from app.core.response_cache import response_cache, wants_refresh, is_not_modified, not_modified, etag_headers
+import logging
+
+logger = logging.getLogger("bmu.modules.student.overview")
+
+student_overview_bp = Blueprint("student_overview", __name__, url_prefix="/v2/student")
+
+@student_overview_bp.route("/overview", methods=["POST"])
+async def get_overview():
+    """
+    Fetch dashboard, attendance, timetable, pending fees and LMS in one call.
+    Sections that fail or time out are null and listed in 'errors'.
+    """
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({
+                "success": False,
+                "message": "Request body must be valid JSON."
+            }), 400
+
+        if "session_token" not in data and "session_cookies" not in data:
+            return jsonify({
+                "success": False,
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
+            }), 400
+
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
+        overview_data, etag = await response_cache.fetch(session, "overview", student_overview_viewmodel.fetch_overview, refresh=wants_refresh(data))
+        if is_not_modified(etag):
+            return not_modified(etag)
+
+        return jsonify({
+            "success": True,
+            "message": "Overview fetched with partial results." if overview_data.errors else "Overview fetched successfully.",
+            "data": overview_data.dict()
+        }), 200, etag_headers(etag)
+
+    except ExternalServiceError as e:
+        logger.error(f"External service error: {e}")
+        return jsonify({
+            "success": False,
+            "message": "External service unavailable.",
+            "details": str(e)
+        }), 502
+
+    except OverviewError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        }), 401
+
+    except Exception as e:
+        logger.error(f"Unexpected error in /overview: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "message": "Internal server error.",
+            "details": str(e)
+        }), 500
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from app.core.config import config
+from app.core.sessions import PortalSessionExpiredError
+from app.modules.student.dashboard.viewmodel import student_dashboard_viewmodel
+from app.modules.student.attendance.viewmodel import student_attendance_viewmodel
+from app.modules.student.timetable.viewmodel import student_timetable_viewmodel
+from app.modules.student.fees.viewmodel import student_fees_viewmodel
+from app.modules.student.lms.viewmodel import student_lms_viewmodel
+from app.modules.student.overview.models import OverviewData
+
+logger = logging.getLogger("bmu.modules.student.overview.viewmodel")
+
+class OverviewError(Exception):
+    """Base exception for Overview module."""
+    pass
+
+class ExternalServiceError(OverviewError):
+    """Raised when external BMU portal fails."""
+    pass
+
+class SessionExpiredError(OverviewError, PortalSessionExpiredError):
+    """Raised when the portal bounces any section to its login page."""
+    pass
+
+class StudentOverviewViewModel:
+
+    async def fetch_overview(self, session_cookies) -> OverviewData:
+        """
+        Fetch the app-launch sections concurrently over one cookie jar and pooled transport.
+        Each section has its own timeout; failed sections are reported in `errors`
+        instead of failing the whole overview.
+        """
+        sections = {
+            "dashboard": student_dashboard_viewmodel.fetch_student_dashboard(session_cookies),
+            "attendance": student_attendance_viewmodel.fetch_student_attendance(session_cookies),
+            "timetable": student_timetable_viewmodel.fetch_student_timetable(session_cookies),
+            "pending_fees": student_fees_viewmodel.fetch_pending_fees(session_cookies),
+            "lms": student_lms_viewmodel.fetch_lms_dashboard(session_cookies),
+        }
+
+        results = await asyncio.gather(*(self._run_section(name, coro) for name, coro in sections.items()))
+
+        data, errors = {}, {}
+        for name, (value, error) in zip(sections, results):
+            if isinstance(error, PortalSessionExpiredError):
+                # Let the session store log in again and replay the whole overview.
+                raise SessionExpiredError("Invalid session or expired cookies.")
+            if error is not None:
+                errors[name] = str(error)
+            else:
+                data[name] = value
+
+        if not data:
+            raise ExternalServiceError(f"All overview sections failed: {errors}")
+
+        return OverviewData(**data, errors=errors)
+
+    async def _run_section(self, name: str, coro):
+        # Shielded: a timeout only abandons the overview's wait, the (coalesced) fetch carries on for its other callers.
+        task = asyncio.ensure_future(coro)
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout=config.OVERVIEW_SECTION_TIMEOUT), None
+        except asyncio.TimeoutError:
+            logger.warning(f"Overview section '{name}' timed out.")
+            return None, OverviewError(f"Timed out after {config.OVERVIEW_SECTION_TIMEOUT}s.")
+        except Exception as e:
+            logger.warning(f"Overview section '{name}' failed: {e}")
+            return None, e
+
+student_overview_viewmodel = StudentOverviewViewModel()
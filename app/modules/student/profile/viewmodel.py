@@ -1,7 +1,11 @@
 import logging
-import httpx
 from bs4 import BeautifulSoup
+from app.core.client import BMUClient
 from app.core.config import config
+from app.core.executor import ParseExecutor
+from app.core.parser import ExtractSpec, extracts, is_login_page
+from app.core.sessions import PortalSessionExpiredError
+from app.core.singleflight import coalesce
 from app.core.utils import clean_labelled_text
 from app.modules.student.profile.models import ProfileData
 from typing import Optional
@@ -16,31 +20,26 @@ class ExternalServiceError(ProfileError):
     """Raised when external BMU portal fails."""
     pass
 
+class SessionExpiredError(ProfileError, PortalSessionExpiredError):
+    """Raised when the portal bounces the request to its login page."""
+    pass
+
 class StudentProfileViewModel:
-    PROFILE_URL = "https://bmu.gnums.co.in/StudentPanel/STU_Student/STU_Student_ProfileView.aspx"
+    PROFILE_URL = f"{config.BMU_PORTAL_URL}/StudentPanel/STU_Student/STU_Student_ProfileView.aspx"
 
+    @coalesce
     async def fetch_student_profile(self, session_cookies: dict) -> ProfileData:
         try:
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
-
-            async with httpx.AsyncClient(
-                cookies=cookies_jar,
-                follow_redirects=True,
-                timeout=config.REQUEST_TIMEOUT
-            ) as client:
+            async with BMUClient.session(session_cookies) as client:
                 resp = await client.get(self.PROFILE_URL)
                 
                 if resp.status_code != 200:
                     raise ExternalServiceError(f"Failed to fetch profile. Status: {resp.status_code}")
 
-                soup = BeautifulSoup(resp.text, "html.parser")
-                
-                if soup.find("input", {"id": "txtUsername"}):
-                     raise ProfileError("Invalid session or expired cookies.")
+                if is_login_page(resp.text):
+                     raise SessionExpiredError("Invalid session or expired cookies.")
 
-                data = self._parse_profile(soup)
+                data = await ParseExecutor.run(self._parse_profile, resp.text)
                 return ProfileData(**data)
 
         except ProfileError:
@@ -49,6 +48,7 @@ class StudentProfileViewModel:
             logger.error(f"Error fetching profile: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
+    @extracts(ExtractSpec(id_prefixes=("ctl00_cphPageContent_ucStudentInfoAdmission_",), classes=("static-info",)))
     def _parse_profile(self, soup: BeautifulSoup) -> dict:
         def get_text(_id):
             el = soup.find(id=_id)
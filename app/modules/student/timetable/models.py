@@ -20,3 +20,14 @@ class TimetableData(BaseModel):
     class_info: Optional[str]
     effective_from: Optional[str]
     timetable: List[TimeSlot]
+
+class TimetableWeek(BaseModel):
+    week_start: str
+    effective_from: Optional[str]
+
+class TimetableRangeData(BaseModel):
+    start_date: str
+    end_date: str
+    weeks: List[TimetableWeek]
+    timetables: List[TimetableData]
+    errors: Dict[str, str] = {}
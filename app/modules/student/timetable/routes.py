@@ -1,5 +1,9 @@
 from quart import Blueprint, request, jsonify
 from app.modules.student.timetable.viewmodel import student_timetable_viewmodel, TimetableError, ExternalServiceError
+from app.core.sessions import session_store
+from app.core.response_cache import response_cache, wants_refresh, is_not_modified, not_modified, etag_headers
+from app.core.config import config
+from datetime import date
 import logging
 
 logger = logging.getLogger("bmu.modules.student.timetable")
@@ -19,22 +23,30 @@ async def get_timetable():
                 "message": "Request body must be valid JSON."
             }), 400
 
-        if "session_cookies" not in data:
+        if "session_token" not in data and "session_cookies" not in data:
             return jsonify({
                 "success": False,
-                "message": "Missing 'session_cookies' in request body."
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
             }), 400
 
-        session_cookies = data.get("session_cookies")
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
         timetable_date = data.get("timetable_date")
         
-        timetable_data = await student_timetable_viewmodel.fetch_student_timetable(session_cookies, timetable_date)
+        timetable_data, etag = await response_cache.fetch(session, "timetable", student_timetable_viewmodel.fetch_student_timetable, timetable_date, refresh=wants_refresh(data))
+        if is_not_modified(etag):
+            return not_modified(etag)
 
         return jsonify({
             "success": True,
             "message": "Timetable fetched successfully.",
             "data": timetable_data.dict()
-        }), 200
+        }), 200, etag_headers(etag)
 
     except TimetableError as e:
         return jsonify({
@@ -57,3 +69,82 @@ async def get_timetable():
             "message": "Internal server error.",
             "details": str(e)
         }), 500
+
+@student_timetable_bp.route("/timetable/range", methods=["POST"])
+async def get_timetable_range():
+    """
+    Fetch the timetables in effect between two dates (a week or month view) in one call.
+    """
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({
+                "success": False,
+                "message": "Request body must be valid JSON."
+            }), 400
+
+        if "session_token" not in data and "session_cookies" not in data:
+            return jsonify({
+                "success": False,
+                "message": "Missing 'session_token' or 'session_cookies' in request body."
+            }), 400
+
+        if not data.get("start_date") or not data.get("end_date"):
+            return jsonify({
+                "success": False,
+                "message": "Missing 'start_date' or 'end_date' in request body."
+            }), 400
+
+        try:
+            start_date = date.fromisoformat(data["start_date"])
+            end_date = date.fromisoformat(data["end_date"])
+        except (TypeError, ValueError):
+            return jsonify({
+                "success": False,
+                "message": "'start_date' and 'end_date' must be dates in YYYY-MM-DD format."
+            }), 400
+
+        if end_date < start_date or (end_date - start_date).days >= config.TIMETABLE_RANGE_MAX_DAYS:
+            return jsonify({
+                "success": False,
+                "message": f"'end_date' must be on or after 'start_date' and at most {config.TIMETABLE_RANGE_MAX_DAYS} days later."
+            }), 400
+
+        session = await session_store.resolve(data)
+        if not session:
+            return jsonify({
+                "success": False,
+                "message": "Invalid or expired session token."
+            }), 401
+
+        range_data, etag = await response_cache.fetch(session, "timetable_range", student_timetable_viewmodel.fetch_timetable_range, start_date, end_date, refresh=wants_refresh(data))
+        if is_not_modified(etag):
+            return not_modified(etag)
+
+        return jsonify({
+            "success": True,
+            "message": "Timetable range fetched with partial results." if range_data.errors else "Timetable range fetched successfully.",
+            "data": range_data.dict()
+        }), 200, etag_headers(etag)
+
+    except ExternalServiceError as e:
+        logger.error(f"External service error: {e}")
+        return jsonify({
+            "success": False,
+            "message": "External service unavailable.",
+            "details": str(e)
+        }), 502
+
+    except TimetableError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        }), 401
+
+    except Exception as e:
+        logger.error(f"Unexpected error in /timetable/range: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "message": "Internal server error.",
+            "details": str(e)
+        }), 500
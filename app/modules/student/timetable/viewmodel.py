@@ -1,9 +1,16 @@
+import asyncio
 import logging
-import httpx
+from datetime import date, timedelta
 from urllib.parse import urljoin
 from bs4 import BeautifulSoup
+from app.core.client import BMUClient
 from app.core.config import config
-from app.modules.student.timetable.models import TimetableData
+from app.core.executor import ParseExecutor
+from app.core.formstate import form_state
+from app.core.parser import ExtractSpec, extracts, is_login_page, parse_hidden_fields, parse_html
+from app.core.sessions import PortalSessionExpiredError
+from app.core.singleflight import coalesce
+from app.modules.student.timetable.models import TimetableData, TimetableRangeData, TimetableWeek
 from typing import Optional
 
 logger = logging.getLogger("bmu.modules.student.timetable.viewmodel")
@@ -16,64 +23,92 @@ class ExternalServiceError(TimetableError):
     """Raised when external BMU portal fails."""
     pass
 
+class SessionExpiredError(TimetableError, PortalSessionExpiredError):
+    """Raised when the portal bounces the request to its login page."""
+    pass
+
 class StudentTimetableViewModel:
-    BASE_URL = "https://bmu.gnums.co.in/Login.aspx"
+    BASE_URL = f"{config.BMU_PORTAL_URL}/Login.aspx"
     TIMETABLE_URL = "StudentPanel/TTM_TimeTable/TTM_TimeTable_StudentTimeTable.aspx"
 
-    async def fetch_student_timetable(self, session_cookies: dict, timetable_date: Optional[str] = None) -> TimetableData:
-        try:
-            cookies_jar = httpx.Cookies()
-            for k, v in session_cookies.items():
-                cookies_jar.set(k, v, domain="bmu.gnums.co.in")
+    @property
+    def url(self) -> str:
+        return urljoin(self.BASE_URL, self.TIMETABLE_URL)
+
+    async def _fetch_page(self, client, session_cookies: dict, timetable_date: Optional[str] = None) -> str:
+        """Timetable page as of `timetable_date` (the current one when omitted)."""
+        url = self.url
 
-            url = urljoin(self.BASE_URL, self.TIMETABLE_URL)
+        if not timetable_date:
+            resp = await client.get(url)
             
-            async with httpx.AsyncClient(
-                cookies=cookies_jar,
-                follow_redirects=True,
-                timeout=config.REQUEST_TIMEOUT
-            ) as client:
-                resp = await client.get(url)
-                
-                if resp.status_code != 200:
-                    raise ExternalServiceError(f"Failed to fetch timetable page. Status: {resp.status_code}")
-
-                soup = BeautifulSoup(resp.text, "html.parser")
-                
-                if soup.find("input", {"id": "txtUsername"}):
-                     raise TimetableError("Invalid session or expired cookies.")
-
-                if timetable_date:
-                    form_data = {
-                        tag.get("name"): tag.get("value", "")
-                        for tag in soup.select("input[type=hidden]")
-                        if tag.get("name")
-                    }
-                    
-                    form_data.update({
-                        "__EVENTTARGET": "ctl00$cphPageContent$dtpTimeTableAsOn",
-                        "__EVENTARGUMENT": "",
-                        "ctl00$cphPageContent$dtpTimeTableAsOn": timetable_date
-                    })
+            if resp.status_code != 200:
+                raise ExternalServiceError(f"Failed to fetch timetable page. Status: {resp.status_code}")
 
-                    if "ctl00$cphPageContent$sm" in form_data:
-                        form_data["ctl00$cphPageContent$sm"] = "ctl00$cphPageContent$upTTM_Attendance|ctl00$cphPageContent$dtpTimeTableAsOn"
-
-                    post_resp = await client.post(
-                        url,
-                        data=form_data,
-                        headers={"Content-Type": "application/x-www-form-urlencoded"}
-                    )
-                    
-                    if post_resp.status_code == 500:
-                        logger.warning(f"Server 500 error for date {timetable_date}, using default timetable.")
-                    elif post_resp.status_code == 200:
-                        soup = BeautifulSoup(post_resp.text, "html.parser")
-                    else:
-                        raise ExternalServiceError(f"Failed to fetch timetable for date {timetable_date}. Status: {post_resp.status_code}")
-
-                data = self._parse_timetable(soup)
-                return TimetableData(**data)
+            return resp.text
+
+        current = {}
+
+        async def load():
+            resp = await client.get(url)
+            
+            if resp.status_code != 200:
+                raise ExternalServiceError(f"Failed to fetch timetable page. Status: {resp.status_code}")
+
+            if is_login_page(resp.text):
+                 raise SessionExpiredError("Invalid session or expired cookies.")
+
+            current["page"] = resp.text
+            return await ParseExecutor.run(parse_hidden_fields, resp.text)
+
+        def send(form_data):
+            form_data.update({
+                "__EVENTTARGET": "ctl00$cphPageContent$dtpTimeTableAsOn",
+                "__EVENTARGUMENT": "",
+                "ctl00$cphPageContent$dtpTimeTableAsOn": timetable_date
+            })
+
+            if "ctl00$cphPageContent$sm" in form_data:
+                form_data["ctl00$cphPageContent$sm"] = "ctl00$cphPageContent$upTTM_Attendance|ctl00$cphPageContent$dtpTimeTableAsOn"
+
+            return client.post(
+                url,
+                data=form_data,
+                headers={"Content-Type": "application/x-www-form-urlencoded"}
+            )
+
+        post_resp = await form_state.postback(
+            session_cookies,
+            url,
+            load=load,
+            send=send,
+            accept=lambda r: r.status_code == 200 and not is_login_page(r.text),
+        )
+        
+        if post_resp.status_code == 500:
+            # Only a postback on freshly loaded state gets here, so the current page is known.
+            logger.warning(f"Server 500 error for date {timetable_date}, using default timetable.")
+            return current["page"]
+        elif post_resp.status_code == 200:
+            return post_resp.text
+        else:
+            raise ExternalServiceError(f"Failed to fetch timetable for date {timetable_date}. Status: {post_resp.status_code}")
+
+    async def _fetch_timetable(self, client, session_cookies: dict, timetable_date: Optional[str] = None) -> TimetableData:
+        page = await self._fetch_page(client, session_cookies, timetable_date)
+
+        if is_login_page(page):
+             raise SessionExpiredError("Invalid session or expired cookies.")
+
+        data, hidden = await ParseExecutor.run(self._parse_timetable, page, form_state=True)
+        form_state.remember(session_cookies, self.url, hidden)
+        return TimetableData(**data)
+
+    @coalesce
+    async def fetch_student_timetable(self, session_cookies: dict, timetable_date: Optional[str] = None) -> TimetableData:
+        try:
+            async with BMUClient.session(session_cookies) as client:
+                return await self._fetch_timetable(client, session_cookies, timetable_date)
 
         except TimetableError:
             raise
@@ -81,6 +116,69 @@ class StudentTimetableViewModel:
             logger.error(f"Error fetching timetable: {e}", exc_info=True)
             raise ExternalServiceError(f"Unexpected error: {e}")
 
+    @coalesce
+    async def fetch_timetable_range(self, session_cookies: dict, start_date: date, end_date: date) -> TimetableRangeData:
+        """
+        Timetables for every week between two dates, one postback per week.
+        Weeks resolving to the same timetable (same `effective_from`) share one entry in `timetables`.
+        A week that fails is left out of `weeks` and listed in `errors` by its start date.
+        """
+        try:
+            week_starts = []
+            day = start_date
+            while day <= end_date:
+                week_starts.append(day)
+                day = day + timedelta(days=7 - day.weekday())
+
+            async with BMUClient.session(session_cookies) as client:
+                # The first week goes alone so that it loads (or confirms) the form state the others reuse.
+                try:
+                    first = await self._fetch_timetable(client, session_cookies, week_starts[0].isoformat())
+                except PortalSessionExpiredError:
+                    raise
+                except Exception as e:
+                    first = e
+
+                semaphore = asyncio.Semaphore(config.TIMETABLE_RANGE_CONCURRENCY)
+
+                async def fetch_week(week_start: date) -> TimetableData:
+                    async with semaphore:
+                        return await self._fetch_timetable(client, session_cookies, week_start.isoformat())
+
+                rest = await asyncio.gather(*(fetch_week(d) for d in week_starts[1:]), return_exceptions=True)
+
+            weeks = []
+            timetables = {}
+            errors = {}
+            for week_start, timetable in zip(week_starts, [first, *rest]):
+                if isinstance(timetable, PortalSessionExpiredError):
+                    # Let the session store log in again and replay the whole range.
+                    raise SessionExpiredError("Invalid session or expired cookies.")
+                if isinstance(timetable, BaseException):
+                    logger.warning(f"Timetable week of {week_start} failed: {timetable!r}")
+                    errors[week_start.isoformat()] = str(timetable) or type(timetable).__name__
+                    continue
+                timetables.setdefault(timetable.effective_from, timetable)
+                weeks.append(TimetableWeek(week_start=week_start.isoformat(), effective_from=timetable.effective_from))
+
+            if not weeks:
+                raise ExternalServiceError(f"All timetable weeks failed: {errors}")
+
+            return TimetableRangeData(
+                start_date=start_date.isoformat(),
+                end_date=end_date.isoformat(),
+                weeks=weeks,
+                timetables=list(timetables.values()),
+                errors=errors
+            )
+
+        except TimetableError:
+            raise
+        except Exception as e:
+            logger.error(f"Error fetching timetable range: {e}", exc_info=True)
+            raise ExternalServiceError(f"Unexpected error: {e}")
+
+    @extracts(ExtractSpec(ids=("sample_1", "lblTimeTable", "lblDate")))
     def _parse_timetable(self, soup: BeautifulSoup) -> dict:
         table = soup.find("table", {"id": "sample_1"})
         if not table:
@@ -104,7 +202,7 @@ class StudentTimetableViewModel:
                 blocks = [b for b in col.decode_contents().split("<hr") if b.strip()]
 
                 for block in blocks:
-                    temp = BeautifulSoup(block, "html.parser")
+                    temp = parse_html(block)
                     lines = [t.get_text(strip=True) for t in temp.find_all(text=True) if t.strip()]
                     if not lines: continue
 
@@ -0,0 +1,332 @@
+"""
+End-to-end load generator for the API.
+
+Simulates concurrent students against a running instance: each virtual user logs in, then
+keeps calling /v2 routes picked from a weighted mix with a random think time in between.
+Reports throughput and p50/p95/p99 latency and error rate per route, plus how many upstream
+portal requests each API request cost (read from the stand-in portal's stats).
+
+    python -m benchmarks.portal --port 8081 --latency 80 --jitter 40 --seed 7 &
+    BMU_PORTAL_URL=http://127.0.0.1:8081 BMU_WEBSITE_URL=http://127.0.0.1:8081 hypercorn run:app -b 127.0.0.1:5000 &
+    python -m benchmarks.loadgen --users 50 --duration 60 --mix student --probe
+
+Hypercorn serves the app from daemonic processes, which cannot start the parse process pool, so
+the API parses on a thread pool there; PARSE_WORKERS=0 benchmarks parsing on the event loop instead.
+
+--mix takes a named mix (see MIXES) or explicit weights, e.g. "attendance=5,lms_pdf_stream=1".
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import httpx
+
+SUBJECT_PATH = "LMS_ContentStudentSubjectDetails.aspx?SubjectID=301&Semester=5"
+SYLLABUS_POSTBACK = "ctl00$cphPageContent$lbtnSyllabusPDFPath"
+RECEIPT_POSTBACK = "ctl00$cphPageContent$rpAcademicFeeReceipt$ctl01$lbtnPrint"
+# The row's receipt number, as a client reads it from /fees: without it receipts are never cached.
+RECEIPT_NO = "RCPT/24001"
+
+
+def _random_date(rng: random.Random) -> str:
+    return (date(2024, 7, 15) + timedelta(days=rng.randrange(120))).isoformat()
+
+
+class Route(NamedTuple):
+    method: str
+    path: str
+    # (session_token, rng) -> JSON body; None for GET routes.
+    body: Optional[Callable[[str, random.Random], Dict[str, Any]]] = None
+
+
+def _student(**extra) -> Callable[[str, random.Random], Dict[str, Any]]:
+    def build(token: str, rng: random.Random) -> Dict[str, Any]:
+        return {"session_token": token, **{k: v(rng) if callable(v) else v for k, v in extra.items()}}
+    return build
+
+
+ROUTES: Dict[str, Route] = {
+    "dashboard": Route("POST", "/v2/student/dashboard", _student()),
+    "overview": Route("POST", "/v2/student/overview", _student()),
+    "profile": Route("POST", "/v2/student/profile", _student()),
+    "attendance": Route("POST", "/v2/student/attendance", _student()),
+    "attendance_absent": Route("POST", "/v2/student/attendance/absent", _student(selected_semester="5")),
+    "attendance_date": Route("POST", "/v2/student/attendance/date", _student(attendance_date=_random_date)),
+    "fees": Route("POST", "/v2/student/fees", _student()),
+    "fees_pending": Route("POST", "/v2/student/fees/pending", _student()),
+    "fees_receipt": Route("POST", "/v2/student/fees/receipt", _student(receipt_identifier=RECEIPT_POSTBACK, receipt_no=RECEIPT_NO)),
+    "fees_receipt_stream": Route("POST", "/v2/student/fees/receipt", _student(receipt_identifier=RECEIPT_POSTBACK, receipt_no=RECEIPT_NO, stream=True)),
+    "lms": Route("POST", "/v2/student/lms", _student()),
+    "lms_subject": Route("POST", "/v2/student/lms/subject", _student(path=SUBJECT_PATH)),
+    "lms_pdf": Route("POST", "/v2/student/lms/pdf", _student(postback_id=SYLLABUS_POSTBACK, form_action=SUBJECT_PATH)),
+    "lms_pdf_stream": Route("POST", "/v2/student/lms/pdf", _student(postback_id=SYLLABUS_POSTBACK, form_action=SUBJECT_PATH, stream=True)),
+    "timetable": Route("POST", "/v2/student/timetable", _student()),
+    "timetable_date": Route("POST", "/v2/student/timetable", _student(timetable_date=_random_date)),
+    "public_info": Route("GET", "/v2/public/info"),
+    "departments": Route("GET", "/v2/departments"),
+}
+
+MIXES: Dict[str, Dict[str, int]] = {
+    # A student opening the app and browsing around.
+    "student": {
+        "overview": 4, "dashboard": 6, "profile": 3, "attendance": 12, "attendance_absent": 4,
+        "attendance_date": 6, "fees": 3, "fees_pending": 3, "fees_receipt_stream": 1, "lms": 6,
+        "lms_subject": 6, "lms_pdf_stream": 3, "timetable": 10, "timetable_date": 6,
+        "public_info": 2, "departments": 1,
+    },
+    # Morning rush: everyone opens the app and checks today's timetable and attendance.
+    "app_launch": {"overview": 10, "timetable": 6, "attendance": 4, "public_info": 1},
+    # Exam week: notes and receipts being downloaded.
+    "downloads": {"lms_subject": 3, "lms_pdf": 2, "lms_pdf_stream": 4, "fees_receipt": 1, "fees_receipt_stream": 2},
+}
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    if spec in MIXES:
+        return MIXES[spec]
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise SystemExit(f"Unknown route '{name}'. Routes: {', '.join(ROUTES)}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.bytes: Dict[str, int] = defaultdict(int)
+
+    def record(self, route: str, seconds: float, status: str, size: int = 0):
+        self.latencies[route].append(seconds)
+        self.statuses[route][status] += 1
+        self.bytes[route] += size
+
+    def errors(self, route: str) -> int:
+        return sum(n for status, n in self.statuses[route].items() if not status.startswith("2"))
+
+    @property
+    def total(self) -> int:
+        return sum(len(v) for v in self.latencies.values())
+
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, Any]]:
+        rows = {}
+        for route in sorted(self.latencies):
+            values = sorted(self.latencies[route])
+            rows[route] = {
+                "count": len(values),
+                "rps": len(values) / elapsed,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "max_ms": values[-1] * 1000,
+                "error_rate": self.errors(route) / len(values),
+                "statuses": dict(self.statuses[route]),
+                "bytes": self.bytes[route],
+            }
+        return rows
+
+
+async def call(client: httpx.AsyncClient, route: Route, token: Optional[str], rng: random.Random) -> httpx.Response:
+    body = route.body(token, rng) if route.body else None
+    async with client.stream(route.method, route.path, json=body) as response:
+        # Latency is time to the last byte, so streamed downloads count in full.
+        async for _ in response.aiter_raw():
+            pass
+    return response
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str, stats: Optional[Stats]) -> Optional[str]:
+    start = time.perf_counter()
+    try:
+        response = await client.post("/v2/auth/login", json={"username": username, "password": password})
+        status = str(response.status_code)
+        token = response.json().get("data", {}).get("session_token") if response.status_code == 200 else None
+    except httpx.HTTPError as e:
+        status, token = type(e).__name__, None
+    if stats is not None:
+        stats.record("login", time.perf_counter() - start, status)
+    return token
+
+
+async def virtual_user(
+    user_id: int,
+    client: httpx.AsyncClient,
+    mix: Dict[str, int],
+    args: argparse.Namespace,
+    stats: Stats,
+    deadline: float,
+    budget: List[int],
+):
+    rng = random.Random(f"{args.seed}:{user_id}")
+    await asyncio.sleep(args.ramp_up * user_id / max(args.users, 1))
+
+    username = f"{args.user_prefix}{user_id:04d}"
+    token = None
+    names, weights = list(mix), list(mix.values())
+
+    while time.monotonic() < deadline and budget[0] != 0:
+        if token is None:
+            token = await login(client, username, args.password, stats)
+            if token is None:
+                await asyncio.sleep(1)
+                continue
+
+        name = rng.choices(names, weights)[0]
+        if budget[0] > 0:
+            budget[0] -= 1
+
+        start = time.perf_counter()
+        try:
+            response = await call(client, ROUTES[name], token, rng)
+            status, size = str(response.status_code), int(response.num_bytes_downloaded)
+        except httpx.HTTPError as e:
+            status, size = type(e).__name__, 0
+        stats.record(name, time.perf_counter() - start, status, size)
+
+        if status == "401":
+            # The API could not revive the portal session; log in again like the app would.
+            token = None
+
+        if args.think_ms:
+            await asyncio.sleep(rng.expovariate(1000 / args.think_ms))
+
+
+async def upstream_counts(client: httpx.AsyncClient, url: Optional[str]) -> Optional[int]:
+    if not url:
+        return None
+    try:
+        response = await client.get(f"{url}/__standin/stats")
+        return sum(response.json()["requests"].values())
+    except (httpx.HTTPError, ValueError, KeyError):
+        return None
+
+
+async def probe(client: httpx.AsyncClient, portal: httpx.AsyncClient, mix: Dict[str, int], args: argparse.Namespace) -> Dict[str, List[Optional[int]]]:
+    """Upstream requests each route costs on a fresh session (cold) and right after (warm), one call at a time."""
+    rng = random.Random(args.seed)
+    result = {}
+    for name in mix:
+        token = await login(client, f"{args.user_prefix}probe", args.password, None)
+        costs = []
+        for _ in range(2):
+            before = await upstream_counts(portal, args.standin)
+            await call(client, ROUTES[name], token, rng)
+            after = await upstream_counts(portal, args.standin)
+            costs.append(after - before if before is not None and after is not None else None)
+        result[name] = costs
+    return result
+
+
+def format_report(rows: Dict[str, Dict[str, Any]], elapsed: float, total: int, upstream: Optional[int], probes: Dict[str, List[Optional[int]]]) -> str:
+    header = f"{'route':<20} {'count':>7} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7}"
+    if probes:
+        header += f" {'upstream cold/warm':>19}"
+    lines = [header, "-" * len(header)]
+    for route, r in rows.items():
+        line = (
+            f"{route:<20} {r['count']:>7} {r['rps']:>7.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+            f"{r['p99_ms']:>8.1f} {r['max_ms']:>8.1f} {r['error_rate']:>7.1%}"
+        )
+        if probes:
+            cold, warm = probes.get(route, (None, None))
+            line += f" {'-' if cold is None else cold:>9}/{'-' if warm is None else warm:<9}"
+        lines.append(line)
+
+    lines.append("")
+    lines.append(f"{total} requests in {elapsed:.1f}s: {total / elapsed:.1f} req/s")
+    if upstream is not None and total:
+        lines.append(f"{upstream} upstream portal requests: {upstream / total:.2f} per API request")
+    failing = {route: r["statuses"] for route, r in rows.items() if r["error_rate"]}
+    if failing:
+        lines.append("Non-2xx responses: " + "; ".join(
+            f"{route} " + ", ".join(f"{s}x{n}" for s, n in statuses.items() if not s.startswith("2"))
+            for route, statuses in failing.items()
+        ))
+    return "\n".join(lines)
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    timeout = httpx.Timeout(args.timeout)
+
+    async with httpx.AsyncClient(base_url=args.target, limits=limits, timeout=timeout) as client, \
+            httpx.AsyncClient(timeout=5) as portal:
+        probes = await probe(client, portal, mix, args) if args.probe else {}
+
+        stats = Stats()
+        budget = [args.requests or -1]
+        upstream_before = await upstream_counts(portal, args.standin)
+        started = time.monotonic()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            virtual_user(i, client, mix, args, stats, deadline, budget)
+            for i in range(args.users)
+        ))
+        elapsed = time.monotonic() - started
+        upstream_after = await upstream_counts(portal, args.standin)
+
+    upstream = upstream_after - upstream_before if upstream_before is not None and upstream_after is not None else None
+    rows = stats.summary(elapsed)
+    print(format_report(rows, elapsed, stats.total, upstream, probes))
+    return {
+        "target": args.target,
+        "users": args.users,
+        "mix": mix,
+        "elapsed": elapsed,
+        "requests": stats.total,
+        "rps": stats.total / elapsed,
+        "upstream_requests": upstream,
+        "routes": rows,
+        "probes": probes,
+    }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.loadgen", description="Load-test a running BMU API instance.")
+    ap.add_argument("--target", default="http://127.0.0.1:5000", help="base URL of the API")
+    ap.add_argument("--standin", default="http://127.0.0.1:8081", help="stand-in portal URL for upstream counts ('' to skip)")
+    ap.add_argument("--users", type=int, default=20, help="concurrent virtual students")
+    ap.add_argument("--duration", type=float, default=30, help="seconds to run")
+    ap.add_argument("--requests", type=int, default=0, help="stop after this many requests (besides logins)")
+    ap.add_argument("--ramp-up", type=float, default=5, help="seconds over which users start")
+    ap.add_argument("--think-ms", type=float, default=500, help="mean pause between a user's requests")
+    ap.add_argument("--mix", default="student", help=f"named mix ({', '.join(MIXES)}) or route=weight,...")
+    ap.add_argument("--user-prefix", default="loadtest", help="usernames are <prefix>0000, <prefix>0001, ...")
+    ap.add_argument("--password", default="loadtest")
+    ap.add_argument("--timeout", type=float, default=60, help="per-request timeout, seconds")
+    ap.add_argument("--probe", action="store_true", help="first measure upstream requests per route, one call at a time")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    return ap.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+Parser micro-benchmarks.
+
+Runs every viewmodel `_parse_*` method over a saved portal page and reports time per parse,
+memory blocks allocated and peak memory. Parsing goes through the same path as production
+(ParseExecutor's worker function, so ExtractSpec-limited tree building is included); with --pool
+every parse is sent through ParseExecutor.run to a started worker pool, so pickling the parser,
+the markup and the result is timed as well (memory is then only the parent's side).
+
+Before timing, every case checks that its ExtractSpec-limited parse returns exactly what a parse of
+the full tree does; a mismatch is reported and makes the exit status 1.
+
+    python -m benchmarks.parsers                          # run everything
+    python -m benchmarks.parsers -k fees                  # only cases matching "fees"
+    python -m benchmarks.parsers --pool                   # through the parse pool
+    python -m benchmarks.parsers --save-baseline benchmarks/baseline.json
+    python -m benchmarks.parsers --compare benchmarks/baseline.json --threshold 0.15
+
+With --compare the exit status is 1 when any parser got slower (median time) or hungrier
+(peak memory) than the baseline by more than the threshold.
+"""
+import os
+import sys
+import gc
+import json
+import asyncio
+import time
+import argparse
+import platform
+import statistics
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class Case(NamedTuple):
+    name: str
+    viewmodel: str
+    method: str
+    fixture: str
+    args: Tuple[Any, ...] = ()
+
+
+# One case per `_parse_*` method; fixture paths are relative to the fixtures directory.
+CASES: List[Case] = [
+    Case("attendance", "student_attendance_viewmodel", "_parse_attendance", "student/attendance.html"),
+    Case("attendance_absent_days", "student_attendance_viewmodel", "_parse_absent_days", "student/absent_days.html"),
+    Case("attendance_by_date", "student_attendance_viewmodel", "_parse_attendance_by_date", "student/attendance_by_date.html", ("2024-08-12",)),
+    Case("dashboard", "student_dashboard_viewmodel", "_parse_dashboard", "student/dashboard.html"),
+    Case("profile", "student_profile_viewmodel", "_parse_profile", "student/profile.html"),
+    Case("fee_history", "student_fees_viewmodel", "_parse_fee_history", "student/fee_history.html"),
+    Case("fee_posting", "student_fees_viewmodel", "_parse_fee_posting", "student/fee_posting.html"),
+    Case("pending_fees", "student_fees_viewmodel", "_parse_pending_fees", "student/fee_dashboard.html"),
+    Case("payment_form", "student_fees_viewmodel", "_parse_payment_form", "student/fee_dashboard.html"),
+    Case("lms_dashboard", "student_lms_viewmodel", "_parse_lms_dashboard", "student/lms_dashboard.html"),
+    Case("lms_subject_details", "student_lms_viewmodel", "_parse_subject_details", "student/lms_subject_details.html", ("LMS_ContentStudentSubjectDetails.aspx",)),
+    Case("lms_rating_form", "student_lms_viewmodel", "_parse_rating_form", "student/lms_subject_details.html"),
+    Case("timetable", "student_timetable_viewmodel", "_parse_timetable", "student/timetable.html"),
+    Case("public_info", "public_viewmodel", "_parse_public_info", "public/welcome.html"),
+    Case("institute_details", "departments_viewmodel", "_parse_institute_details", "departments/institute_details.html"),
+]
+
+
+def load_viewmodels() -> Dict[str, Any]:
+    from app.modules.departments.viewmodel import departments_viewmodel
+    from app.modules.public.viewmodel import public_viewmodel
+    from app.modules.student.attendance.viewmodel import student_attendance_viewmodel
+    from app.modules.student.dashboard.viewmodel import student_dashboard_viewmodel
+    from app.modules.student.fees.viewmodel import student_fees_viewmodel
+    from app.modules.student.lms.viewmodel import student_lms_viewmodel
+    from app.modules.student.profile.viewmodel import student_profile_viewmodel
+    from app.modules.student.timetable.viewmodel import student_timetable_viewmodel
+
+    return {
+        "departments_viewmodel": departments_viewmodel,
+        "public_viewmodel": public_viewmodel,
+        "student_attendance_viewmodel": student_attendance_viewmodel,
+        "student_dashboard_viewmodel": student_dashboard_viewmodel,
+        "student_fees_viewmodel": student_fees_viewmodel,
+        "student_lms_viewmodel": student_lms_viewmodel,
+        "student_profile_viewmodel": student_profile_viewmodel,
+        "student_timetable_viewmodel": student_timetable_viewmodel,
+    }
+
+
+def uncovered(viewmodels: Dict[str, Any]) -> List[str]:
+    """`_parse_*` methods no case exercises, so a new parser cannot silently go unbenchmarked."""
+    covered = {(c.viewmodel, c.method) for c in CASES}
+    return sorted(
+        f"{name}.{attr}"
+        for name, vm in viewmodels.items()
+        for attr in dir(type(vm))
+        if attr.startswith("_parse_") and (name, attr) not in covered
+    )
+
+
+def measure_time(run: Callable[[], Any], repeat: int, min_time: float) -> List[float]:
+    """Per-parse timings: `repeat` rounds, each averaging as many parses as fit in `min_time` seconds."""
+    start = time.perf_counter()
+    run()
+    number = max(1, int(min_time / max(time.perf_counter() - start, 1e-6)))
+
+    timings = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            timings.append((time.perf_counter() - start) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return timings
+
+
+def measure_memory(run: Callable[[], Any]) -> Tuple[int, int]:
+    """(peak bytes above the starting point, memory blocks allocated and still live when the parse returns)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before_blocks = len(tracemalloc.take_snapshot().traces)
+        before_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = run()
+        _, peak = tracemalloc.get_traced_memory()
+        blocks = len(tracemalloc.take_snapshot().traces) - before_blocks
+        del result
+    finally:
+        tracemalloc.stop()
+    return peak - before_bytes, blocks
+
+
+def load_case(case: Case, viewmodels: Dict[str, Any], fixtures_dir: str) -> Tuple[Callable[..., Any], str]:
+    """The bound parser of a case and the markup of its fixture."""
+    with open(os.path.join(fixtures_dir, case.fixture), "r", encoding="utf-8") as f:
+        return getattr(viewmodels[case.viewmodel], case.method), f.read()
+
+
+def check_equivalence(case: Case, parse_fn: Callable[..., Any], markup: str, run: Callable[[], Any]) -> Optional[str]:
+    """None when `run()` (the limited parse being measured) returns what the parser gives for the full tree."""
+    from app.core.parser import parse_html
+
+    expected = parse_fn(parse_html(markup), *case.args)
+    actual = run()
+    if actual != expected:
+        return f"{case.name}: ExtractSpec-limited parse differs from a full parse of {case.fixture}"
+    return None
+
+
+def pool_runner(loop: asyncio.AbstractEventLoop, parse_fn: Callable[..., Any], markup: str, args: Tuple[Any, ...]) -> Callable[[], Any]:
+    """A parse through ParseExecutor.run, as a request would make it (the pool must be started)."""
+    from app.core.executor import ParseExecutor
+
+    return lambda: loop.run_until_complete(ParseExecutor.run(parse_fn, markup, *args))
+
+
+def run_case(case: Case, markup: str, run: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, Any]:
+    timings = measure_time(run, repeat, min_time)
+    peak, blocks = measure_memory(run)
+
+    return {
+        "fixture": case.fixture,
+        "bytes": len(markup.encode("utf-8")),
+        "min_ms": min(timings) * 1000,
+        "median_ms": statistics.median(timings) * 1000,
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "stdev_ms": (statistics.stdev(timings) if len(timings) > 1 else 0.0) * 1000,
+        "peak_kib": peak / 1024,
+        "blocks": blocks,
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in ("median_ms", "peak_kib"):
+            if base.get(metric) and result[metric] > base[metric] * (1 + threshold):
+                change = (result[metric] / base[metric] - 1) * 100
+                regressions.append(f"{name}: {metric} {base[metric]:.2f} -> {result[metric]:.2f} (+{change:.0f}%)")
+    return regressions
+
+
+def format_table(results: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    header = f"{'parser':<24} {'page KiB':>9} {'median ms':>10} {'min ms':>8} {'stdev':>7} {'peak KiB':>9} {'blocks':>8}"
+    if baseline:
+        header += f" {'vs base':>8}"
+    lines = [header, "-" * len(header)]
+    for name, r in results.items():
+        line = (
+            f"{name:<24} {r['bytes'] / 1024:>9.1f} {r['median_ms']:>10.3f} {r['min_ms']:>8.3f} "
+            f"{r['stdev_ms']:>7.3f} {r['peak_kib']:>9.1f} {r['blocks']:>8}"
+        )
+        if baseline:
+            base = baseline.get(name, {}).get("median_ms")
+            line += f" {(r['median_ms'] / base - 1) * 100:>+7.1f}%" if base else f" {'new':>8}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.parsers", description="Benchmark the portal page parsers.")
+    ap.add_argument("-k", dest="pattern", help="only run cases whose name contains this")
+    ap.add_argument("--fixtures", default=FIXTURES_DIR, help="directory of saved pages (same layout as benchmarks/fixtures)")
+    ap.add_argument("--backend", choices=("auto", "lxml", "html.parser"), help="PARSER_BACKEND to benchmark")
+    ap.add_argument("--pool", action="store_true", help="parse through ParseExecutor.run on a started worker pool")
+    ap.add_argument("--workers", type=int, default=1, help="pool size with --pool")
+    ap.add_argument("--repeat", type=int, default=7, help="timing rounds per parser")
+    ap.add_argument("--min-time", type=float, default=0.2, help="seconds each timing round runs for")
+    ap.add_argument("--save-baseline", metavar="PATH", help="write the results as a baseline")
+    ap.add_argument("--compare", metavar="PATH", help="compare against a saved baseline")
+    ap.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before a regression is flagged")
+    ap.add_argument("--output", metavar="PATH", help="also write the report to this file")
+    args = ap.parse_args(argv)
+
+    if args.backend:
+        os.environ["PARSER_BACKEND"] = args.backend
+
+    from app.core.config import config
+    from app.core.executor import ParseExecutor, _parse_in_worker
+    from app.core.parser import get_backend
+
+    viewmodels = load_viewmodels()
+    missing = uncovered(viewmodels)
+    if missing:
+        print(f"No benchmark case for: {', '.join(missing)}", file=sys.stderr)
+
+    loop = None
+    if args.pool:
+        # Every page goes to the pool, however small.
+        config.PARSE_WORKERS, config.PARSE_INLINE_MAX_BYTES = max(1, args.workers), 0
+        ParseExecutor.start()
+        loop = asyncio.new_event_loop()
+
+    cases = [c for c in CASES if not args.pattern or args.pattern in c.name]
+    results, mismatches = {}, []
+    try:
+        for case in cases:
+            parse_fn, markup = load_case(case, viewmodels, args.fixtures)
+            if loop is not None:
+                run = pool_runner(loop, parse_fn, markup, case.args)
+            else:
+                run = lambda: _parse_in_worker(parse_fn, markup, case.args)
+            mismatch = check_equivalence(case, parse_fn, markup, run)
+            if mismatch:
+                mismatches.append(mismatch)
+                continue
+            results[case.name] = run_case(case, markup, run, args.repeat, args.min_time)
+    finally:
+        if loop is not None:
+            ParseExecutor.shutdown()
+            loop.close()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        baseline = saved["results"]
+        if saved.get("backend") != get_backend():
+            print(f"Baseline was recorded with the {saved.get('backend')} backend, not {get_backend()}.", file=sys.stderr)
+        if bool(saved.get("parse_pool")) != args.pool:
+            print("Baseline was recorded " + ("without" if args.pool else "with") + " --pool.", file=sys.stderr)
+
+    report = [
+        f"Python {platform.python_version()} on {platform.machine()}, parser backend: {get_backend()}"
+        + (f", parse pool: {config.PARSE_WORKERS} worker(s)" if args.pool else ""),
+        "",
+        format_table(results, baseline),
+    ]
+
+    status = 0
+    if mismatches:
+        report.append("")
+        report.append("Limited parses that differ from a full parse (not timed):")
+        report.extend(f"  {m}" for m in mismatches)
+        status = 1
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        report.append("")
+        if regressions:
+            report.append(f"Regressions (> {args.threshold:.0%}):")
+            report.extend(f"  {r}" for r in regressions)
+            status = 1
+        else:
+            report.append(f"No regressions beyond {args.threshold:.0%}.")
+
+    text = "\n".join(report)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "backend": get_backend(),
+                "parse_pool": config.PARSE_WORKERS if args.pool else 0,
+                "results": results,
+            }, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""
+Local stand-in for the BMU portal (bmu.gnums.co.in) and website (bmusurat.ac.in).
+
+Serves the pages in benchmarks/fixtures with the ASP.NET behaviour the API depends on:
+Login.aspx postback answered with a 302, per-session ViewState that postbacks must send back,
+session cookies that expire, receipt/syllabus PDF downloads, and a redirect to Login.aspx for
+requests without a live session. Latency, slow outliers and errors can be injected from a
+seeded random source, so a run can be replayed.
+
+    python -m benchmarks.portal --port 8081 --latency 80 --jitter 40 --slow-rate 0.02 --slow-ms 1500 --seed 1
+    BMU_PORTAL_URL=http://127.0.0.1:8081 BMU_WEBSITE_URL=http://127.0.0.1:8081 python run.py
+
+Any non-empty username logs in (with any password unless --password is given).
+GET /__standin/stats shows request counts, POST /__standin/expire drops every session.
+"""
+import os
+import re
+import hmac
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import secrets
+from collections import Counter
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+from quart import Quart, Response, request
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+SESSION_COOKIE = "ASP.NET_SessionId"
+
+# Lower-cased path (no leading slash) -> fixture page.
+PAGES: Dict[str, str] = {
+    "login.aspx": "auth/login.html",
+    "studentpanel/studentdashboard.aspx": "student/dashboard.html",
+    "studentpanel/stu_student/stu_student_profileview.aspx": "student/profile.html",
+    "studentpanel/ttm_attendance/ttm_attendance_studentattendance.aspx": "student/attendance.html",
+    "studentpanel/ttm_attendance/ttm_attendance_studentabsentdays.aspx": "student/absent_days.html",
+    "adminpanel/timetable/ttm_attendance/ttm_attendanceviewstudentattendancedetailbydate.aspx": "student/attendance_by_date.html",
+    "studentpanel/ttm_timetable/ttm_timetable_studenttimetable.aspx": "student/timetable.html",
+    "studentpanel/fee/studentfeehistory.aspx": "student/fee_history.html",
+    "studentpanel/fee/studentfeehistoryview.aspx": "student/fee_posting.html",
+    "studentpanel/fee/fee_feedashboard.aspx": "student/fee_dashboard.html",
+    "studentpanel/lms/lms_contentstudentdashboard.aspx": "student/lms_dashboard.html",
+    "studentpanel/lms/lms_contentstudentsubjectdetails.aspx": "student/lms_subject_details.html",
+    "bmu_website/home/welcome": "public/welcome.html",
+    "bmu_website/institute/get_detail": "departments/institute_details.html",
+}
+
+_VIEWSTATE_RE = re.compile(r'(id="__VIEWSTATE" value=")([^"]*)(")')
+
+VIEWSTATE_ERROR_PAGE = (
+    "<html><head><title>Validation of viewstate MAC failed.</title></head>"
+    "<body><h1>Server Error in '/' Application.</h1><h2><i>Validation of viewstate MAC failed.</i></h2></body></html>"
+)
+UNAVAILABLE_PAGE = "<html><head><title>Service Unavailable</title></head><body><h1>Service Unavailable</h1></body></html>"
+
+
+class Page:
+    """A fixture split around its __VIEWSTATE value so a session-bound token can be spliced in."""
+
+    def __init__(self, markup: str):
+        match = _VIEWSTATE_RE.search(markup)
+        if match:
+            self.head = markup[:match.end(1)]
+            self.viewstate = match.group(2)
+            self.tail = markup[match.start(3):]
+        else:
+            self.head, self.viewstate, self.tail = markup, None, ""
+
+    def render(self, token: Optional[str]) -> str:
+        if self.viewstate is None:
+            return self.head
+        return f"{self.head}{token}/{self.viewstate}{self.tail}"
+
+
+def build_pdf(size: int, title: str, seed: int) -> bytes:
+    """A well-formed single-page PDF padded to roughly `size` bytes with incompressible content."""
+    rng = random.Random(seed)
+    padding = rng.randbytes(max(size - 400, 0))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R >>",
+        b"<< /Length %d >>\nstream\n" % len(padding) + padding + b"\nendstream",
+    ]
+    out = bytearray(b"%PDF-1.4\n% " + title.encode("ascii", "replace") + b"\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+class StandInPortal:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.secret = secrets.token_bytes(16)
+        self.pages = {path: self._load(fixture) for path, fixture in PAGES.items()}
+        self.receipt_pdf = build_pdf(args.pdf_kib * 1024 // 4, "Fee Receipt", args.seed)
+        self.syllabus_pdf = build_pdf(args.pdf_kib * 1024, "Syllabus", args.seed + 1)
+        # sid -> (username or None, expires_at)
+        self.sessions: Dict[str, Tuple[Optional[str], float]] = {}
+        self.stats: Counter = Counter()
+        self._sequence = 0
+
+    @staticmethod
+    def _load(fixture: str) -> Page:
+        with open(os.path.join(FIXTURES_DIR, fixture), "r", encoding="utf-8") as f:
+            return Page(f.read())
+
+    def _rng(self) -> random.Random:
+        # One generator per request, seeded by arrival order, so a replayed request sequence
+        # sees the same delays and failures regardless of timing.
+        self._sequence += 1
+        return random.Random(f"{self.args.seed}:{self._sequence}")
+
+    def _token(self, sid: Optional[str], path: str) -> str:
+        # Login.aspx state is page-global on the real portal; everything else is bound to the session.
+        scope = path if path == "login.aspx" else f"{sid}|{path}"
+        return hmac.new(self.secret, scope.encode("utf-8"), hashlib.sha256).hexdigest()[:24]
+
+    def _session(self, sid: Optional[str]) -> Optional[str]:
+        """The user logged in on `sid`, refreshing its sliding expiry; None when there is none."""
+        entry = self.sessions.get(sid) if sid else None
+        if entry is None:
+            return None
+        username, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self.sessions[sid]
+            return None
+        self.sessions[sid] = (username, time.monotonic() + self.args.session_ttl)
+        return username
+
+    async def handle(self, path: str) -> Response:
+        path = re.sub(r"/+", "/", path).strip("/").lower()
+        rng = self._rng()
+
+        delay = self.args.latency + rng.uniform(0, self.args.jitter)
+        if rng.random() < self.args.slow_rate:
+            delay += self.args.slow_ms
+        if delay:
+            await asyncio.sleep(delay / 1000)
+
+        if rng.random() < self.args.error_rate:
+            return self._count(path, Response(UNAVAILABLE_PAGE, status=503, mimetype="text/html"))
+
+        page = self.pages.get(path)
+        if page is None:
+            return self._count(path, Response("Not Found", status=404, mimetype="text/html"))
+
+        if path.startswith("bmu_website/"):
+            return self._count(path, Response(page.render(None), mimetype="text/html"))
+
+        sid = request.cookies.get(SESSION_COOKIE)
+        new_sid = None
+        if not sid or sid not in self.sessions:
+            new_sid = sid = secrets.token_hex(12)
+            self.sessions[sid] = (None, time.monotonic() + self.args.session_ttl)
+
+        if self.args.expire_rate and rng.random() < self.args.expire_rate:
+            self.sessions.pop(sid, None)
+
+        if path == "login.aspx":
+            response = await self._login(sid, page)
+        elif not self._session(sid):
+            target = quote("/" + path)
+            response = Response("", status=302, headers={"Location": f"/Login.aspx?ReturnUrl={target}"})
+        else:
+            response = await self._portal_page(sid, path, page)
+
+        if new_sid:
+            response.set_cookie(SESSION_COOKIE, new_sid, path="/", httponly=True)
+        return self._count(path, response)
+
+    def _count(self, path: str, response: Response) -> Response:
+        self.stats[f"{response.status_code} {path or '/'}"] += 1
+        return response
+
+    def _valid_postback(self, form, sid: str, path: str) -> bool:
+        return form.get("__VIEWSTATE", "").split("/", 1)[0] == self._token(sid, path)
+
+    async def _login(self, sid: str, page: Page) -> Response:
+        if request.method == "GET":
+            return Response(page.render(self._token(sid, "login.aspx")), mimetype="text/html")
+
+        form = await request.form
+        if not self._valid_postback(form, sid, "login.aspx"):
+            return Response(VIEWSTATE_ERROR_PAGE, status=500, mimetype="text/html")
+
+        username, password = form.get("txtUsername", ""), form.get("txtPassword", "")
+        if not username or not password or (self.args.password and password != self.args.password):
+            return Response(page.render(self._token(sid, "login.aspx")), mimetype="text/html")
+
+        self.sessions[sid] = (username, time.monotonic() + self.args.session_ttl)
+        return Response("", status=302, headers={"Location": "/StudentPanel/StudentDashboard.aspx"})
+
+    async def _portal_page(self, sid: str, path: str, page: Page) -> Response:
+        if request.method == "POST":
+            form = await request.form
+            if not self._valid_postback(form, sid, path):
+                return Response(VIEWSTATE_ERROR_PAGE, status=500, mimetype="text/html")
+
+            target = form.get("__EVENTTARGET", "")
+            if target == "ctl00$lbtnLogout":
+                self.sessions.pop(sid, None)
+                return Response("", status=302, headers={"Location": "/Login.aspx"})
+            if target.endswith("lbtnPrint"):
+                return self._pdf(self.receipt_pdf, "FeeReceipt.pdf", "attachment")
+            if target.endswith("lbtnSyllabusPDFPath"):
+                return self._pdf(self.syllabus_pdf, "Syllabus.pdf", "inline")
+
+        return Response(page.render(self._token(sid, path)), mimetype="text/html")
+
+    def _pdf(self, content: bytes, filename: str, disposition: str) -> Response:
+        headers = {"Content-Disposition": f"{disposition}; filename={filename}"}
+        if not self.args.bandwidth_kib:
+            return Response(content, mimetype="application/pdf", headers=headers)
+
+        chunk_size = 16 * 1024
+        pause = chunk_size / (self.args.bandwidth_kib * 1024)
+
+        async def body():
+            for offset in range(0, len(content), chunk_size):
+                yield content[offset:offset + chunk_size]
+                await asyncio.sleep(pause)
+
+        headers["Content-Length"] = str(len(content))
+        response = Response(body(), mimetype="application/pdf", headers=headers)
+        response.timeout = None
+        return response
+
+
+def create_app(args: argparse.Namespace) -> Quart:
+    portal = StandInPortal(args)
+    app = Quart(__name__)
+
+    @app.get("/__standin/stats")
+    async def stats():
+        return {"sessions": len(portal.sessions), "requests": dict(portal.stats)}
+
+    @app.post("/__standin/expire")
+    async def expire():
+        dropped = len(portal.sessions)
+        portal.sessions.clear()
+        return {"expired": dropped}
+
+    @app.route("/<path:path>", methods=["GET", "POST"])
+    async def page(path):
+        return await portal.handle(path)
+
+    return app
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.portal", description="Serve a stand-in BMU portal.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--latency", type=float, default=0, help="base delay per request, ms")
+    ap.add_argument("--jitter", type=float, default=0, help="extra uniform random delay, ms")
+    ap.add_argument("--slow-rate", type=float, default=0, help="fraction of requests that get --slow-ms more delay")
+    ap.add_argument("--slow-ms", type=float, default=1000, help="delay added to slow requests, ms")
+    ap.add_argument("--error-rate", type=float, default=0, help="fraction of requests answered with 503")
+    ap.add_argument("--expire-rate", type=float, default=0, help="fraction of requests whose session is dropped first")
+    ap.add_argument("--session-ttl", type=float, default=1200, help="idle seconds before a portal session expires")
+    ap.add_argument("--password", help="only accept this password")
+    ap.add_argument("--pdf-kib", type=int, default=512, help="size of the syllabus PDF (receipts are a quarter of it)")
+    ap.add_argument("--bandwidth-kib", type=float, default=0, help="throttle PDF bodies to this many KiB/s")
+    ap.add_argument("--seed", type=int, default=0, help="seed for injected latency and failures")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    args = parse_args(argv)
+    config = Config()
+    config.bind = [f"{args.host}:{args.port}"]
+    config.keep_alive_timeout = 75
+    print(f"Stand-in portal on http://{args.host}:{args.port} (fixtures: {FIXTURES_DIR})")
+    asyncio.run(serve(create_app(args), config))
+
+
+if __name__ == "__main__":
+    main()
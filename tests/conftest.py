@@ -0,0 +1,31 @@
+import os
+import logging
+
+import pytest
+
+# app.core.config reads these at import time; the tests never reach MongoDB.
+os.environ.setdefault("DB_USER", "test")
+os.environ.setdefault("DB_PASSWORD", "test")
+os.environ.setdefault("DB_CLUSTER", "test")
+
+logging.getLogger("bmu").setLevel(logging.WARNING)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+
+
+def read_fixture(path: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, path), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture
+def parse_pool(monkeypatch):
+    """Send every parse to a one-worker pool, whatever its size."""
+    from app.core.config import config
+    from app.core.executor import ParseExecutor
+
+    monkeypatch.setattr(config, "PARSE_WORKERS", 1)
+    monkeypatch.setattr(config, "PARSE_INLINE_MAX_BYTES", 0)
+    ParseExecutor.shutdown()
+    yield ParseExecutor
+    ParseExecutor.shutdown()
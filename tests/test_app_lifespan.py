@@ -0,0 +1,68 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from app.core.config import config
+from app.core.executor import ParseExecutor
+
+PAGE = '<html><body><div id="content">' + "x" * 40000 + "</div></body></html>"
+
+
+def _title(soup):
+    return len(soup.find(id="content").get_text())
+
+
+async def _nothing():
+    pass
+
+
+def _create_app():
+    """The real app, minus its database indexes and the scheduled website scrapes."""
+    from app import create_app
+    from app.core.sessions import session_store
+    from app.modules.departments.viewmodel import departments_viewmodel
+    from app.modules.public.viewmodel import public_viewmodel
+    from app.modules.student.attendance.viewmodel import student_attendance_viewmodel
+
+    for viewmodel in (session_store, departments_viewmodel, student_attendance_viewmodel):
+        viewmodel.ensure_indexes = _nothing
+    public_viewmodel.refresh_public_info = _nothing
+    departments_viewmodel.refresh_institute_details = _nothing
+    return create_app()
+
+
+async def _serve_one_parse():
+    """Start the app as a server would, parse a page over the inline threshold, stop it."""
+    app = _create_app()
+    async with app.test_app():
+        pool = type(ParseExecutor._pool).__name__
+        parsed = await ParseExecutor.run(_title, PAGE)
+        health = (await app.test_client().get("/health")).status_code
+    return pool, parsed, health, ParseExecutor._pool
+
+
+def _boot_in_daemon(results):
+    config.PARSE_WORKERS = 2
+    pool, parsed, health, after = asyncio.run(_serve_one_parse())
+    results.put((pool, parsed, health, after))
+
+
+def test_lifespan_starts_a_process_pool(monkeypatch):
+    monkeypatch.setattr(config, "PARSE_WORKERS", 1)
+    ParseExecutor.shutdown()
+
+    pool, parsed, health, after = asyncio.run(_serve_one_parse())
+    assert (pool, parsed, health, after) == (ProcessPoolExecutor.__name__, 40000, 200, None)
+
+
+def test_lifespan_in_a_daemonic_worker_falls_back_to_threads():
+    # Hypercorn serves the app from daemonic processes, which may not start a process pool.
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    worker = context.Process(target=_boot_in_daemon, args=(results,), daemon=True)
+    worker.start()
+    worker.join(timeout=120)
+    assert worker.exitcode == 0
+    assert results.get(timeout=5) == (ThreadPoolExecutor.__name__, 40000, 200, None)
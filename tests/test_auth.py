@@ -0,0 +1,62 @@
+import asyncio
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+
+from app.core.client import BMUClient
+from app.modules.auth.viewmodel import AuthViewModel
+
+
+class Portal:
+    """Login.aspx whose ViewState changes whenever the app pool recycles."""
+
+    def __init__(self):
+        self.generation = 1
+        self.page_loads = 0
+
+    def page(self) -> str:
+        fields = {"__VIEWSTATE": f"vs{self.generation}", "__EVENTVALIDATION": "ev", "__VIEWSTATEGENERATOR": "gen"}
+        inputs = "".join(f'<input type="hidden" id="{k}" name="{k}" value="{v}" />' for k, v in fields.items())
+        return f"<html><body><form>{inputs}</form></body></html>"
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            self.page_loads += 1
+            await asyncio.sleep(0.02)
+            return httpx.Response(200, text=self.page())
+
+        form = parse_qs((await request.aread()).decode())
+        if form["__VIEWSTATE"] != [f"vs{self.generation}"]:
+            return httpx.Response(500, text="Validation of viewstate MAC failed.")
+        return httpx.Response(302, headers={"Location": "/StudentPanel/StudentDashboard.aspx"})
+
+
+@pytest.fixture
+def portal(monkeypatch):
+    portal = Portal()
+    monkeypatch.setattr(BMUClient, "_transport", httpx.MockTransport(portal.handle))
+    return portal
+
+
+def test_logins_reuse_the_cached_login_state(portal):
+    async def run():
+        vm = AuthViewModel()
+        for user in ("a", "b", "c"):
+            await vm.login_with_credentials(user, "pw", retries=1)
+
+    asyncio.run(run())
+    assert portal.page_loads == 1
+
+
+def test_rejected_login_state_is_refreshed_once_for_concurrent_logins(portal):
+    async def run():
+        vm = AuthViewModel()
+        await vm.login_with_credentials("warmup", "pw", retries=1)
+        portal.generation += 1
+        results = await asyncio.gather(*(vm.login_with_credentials(f"user{i}", "pw", retries=1) for i in range(10)))
+        return results
+
+    results = asyncio.run(run())
+    assert all("session_cookies" in r for r in results)
+    assert portal.page_loads == 2
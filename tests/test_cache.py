@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from app.core.cache import TTLCache
+
+
+class Loader:
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        value = self.values.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+def test_fresh_entries_are_served_without_loading():
+    async def run():
+        cache = TTLCache(ttl=60)
+        load = Loader("a")
+        assert await cache.get_or_load("k", load) == "a"
+        assert await cache.get_or_load("k", load) == "a"
+        assert cache.get("k") == "a"
+        return load.calls
+
+    assert asyncio.run(run()) == 1
+
+
+def test_concurrent_misses_share_one_load():
+    async def run():
+        cache = TTLCache(ttl=60)
+        load = Loader("a")
+        results = await asyncio.gather(*(cache.get_or_load("k", load) for _ in range(5)))
+        return results, load.calls
+
+    assert asyncio.run(run()) == (["a"] * 5, 1)
+
+
+def test_expired_entry_without_stale_window_is_reloaded():
+    async def run():
+        cache = TTLCache(ttl=0.05)
+        load = Loader("a", "b")
+        await cache.get_or_load("k", load)
+        await asyncio.sleep(0.06)
+        assert cache.get("k") is None
+        return await cache.get_or_load("k", load)
+
+    assert asyncio.run(run()) == "b"
+
+
+def test_stale_entry_is_served_while_it_revalidates():
+    async def run():
+        cache = TTLCache(ttl=0.05, stale_ttl=10)
+        load = Loader("a", "b")
+        await cache.get_or_load("k", load)
+        await asyncio.sleep(0.06)
+
+        # Stale: answered at once with the old value; get() does not serve stale values.
+        assert cache.get("k") is None
+        assert await cache.get_or_load("k", load) == "a"
+        assert await cache.get_or_load("k", load) == "a"
+
+        await asyncio.sleep(0.05)
+        assert load.calls == 2
+        return await cache.get_or_load("k", load)
+
+    assert asyncio.run(run()) == "b"
+
+
+def test_failed_revalidation_keeps_serving_stale():
+    async def run():
+        cache = TTLCache(ttl=0.05, stale_ttl=10)
+        load = Loader("a", RuntimeError("portal down"), "c")
+        await cache.get_or_load("k", load)
+        await asyncio.sleep(0.06)
+        assert await cache.get_or_load("k", load) == "a"
+        await asyncio.sleep(0.05)
+        # Still stale after the failed refresh, so the next call revalidates again.
+        assert await cache.get_or_load("k", load) == "a"
+        await asyncio.sleep(0.05)
+        return await cache.get_or_load("k", load)
+
+    assert asyncio.run(run()) == "c"
+
+
+def test_entry_past_the_stale_window_is_loaded_inline():
+    async def run():
+        cache = TTLCache(ttl=0.02, stale_ttl=0.02)
+        load = Loader("a", "b")
+        await cache.get_or_load("k", load)
+        await asyncio.sleep(0.05)
+        return await cache.get_or_load("k", load)
+
+    assert asyncio.run(run()) == "b"
+
+
+def test_lru_eviction():
+    cache = TTLCache(ttl=60, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.keys() == ["a", "c"]
+
+
+def test_failed_load_is_not_cached():
+    async def run():
+        cache = TTLCache(ttl=60)
+        load = Loader(RuntimeError("boom"), "b")
+        with pytest.raises(RuntimeError):
+            await cache.get_or_load("k", load)
+        return await cache.get_or_load("k", load)
+
+    assert asyncio.run(run()) == "b"
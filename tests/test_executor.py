@@ -0,0 +1,44 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.executor import ParseExecutor
+
+PAGE = (
+    '<html><body><form><input type="hidden" name="__VIEWSTATE" value="abc" /></form>'
+    "<h1>Attendance</h1></body></html>"
+)
+
+
+class StatefulViewModel:
+    PREFIX = "page: "
+
+    def __init__(self):
+        # Neither can be pickled: the instance must never reach a worker.
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _parse_title(self, soup, suffix=""):
+        return self.PREFIX + soup.find("h1").get_text() + suffix
+
+
+def test_bound_method_of_stateful_viewmodel_parses_in_pool(parse_pool):
+    vm = StatefulViewModel()
+
+    async def run():
+        vm._inflight["key"] = asyncio.get_running_loop().create_future()
+        return await ParseExecutor.run(vm._parse_title, PAGE, "!")
+
+    assert asyncio.run(run()) == "page: Attendance!"
+
+
+def test_pool_collects_form_state(parse_pool):
+    result, hidden = asyncio.run(ParseExecutor.run(StatefulViewModel()._parse_title, PAGE, form_state=True))
+    assert result == "page: Attendance"
+    assert hidden["__VIEWSTATE"] == "abc"
+
+
+def test_closures_are_rejected_even_inline():
+    with pytest.raises(TypeError):
+        asyncio.run(ParseExecutor.run(lambda soup: soup.title, PAGE))
@@ -0,0 +1,185 @@
+import asyncio
+import os
+
+from app.core.filecache import FileCache
+
+
+def make_cache(directory, max_bytes=1024, ttl=60):
+    return FileCache(directory=str(directory), max_bytes=max_bytes, ttl=ttl, name="test_files")
+
+
+def test_put_then_get(tmp_path):
+    async def run():
+        cache = make_cache(tmp_path)
+        await cache.put("a", b"%PDF-1", "a.pdf", "application/pdf")
+        cached = await cache.get("a")
+        return cached, await asyncio.to_thread(cached.read), [chunk async for chunk in cached.iter_chunks(1, 3)]
+
+    cached, content, chunks = asyncio.run(run())
+    assert content == b"%PDF-1"
+    assert (cached.filename, cached.content_type, cached.size) == ("a.pdf", "application/pdf", 6)
+    assert chunks == [b"PDF"]
+
+
+def test_hit_stays_readable_after_eviction(tmp_path):
+    async def run():
+        cache = make_cache(tmp_path, max_bytes=150)
+        await cache.put("a", b"a" * 100)
+        cached = await cache.get("a")
+        await cache.put("b", b"b" * 100)
+        evicted = await cache.get("a") is None
+        return evicted, b"".join([chunk async for chunk in cached.iter_chunks()])
+
+    evicted, content = asyncio.run(run())
+    assert (evicted, content) == (True, b"a" * 100)
+
+
+def test_identical_files_are_stored_once(tmp_path):
+    async def run():
+        cache = make_cache(tmp_path)
+        first = await cache.put("student-1", b"x" * 100)
+        second = await cache.put("student-2", b"x" * 100)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.path == second.path
+    assert sum(len(files) for _, _, files in os.walk(tmp_path / "blobs")) == 1
+
+
+def test_least_recently_used_keys_are_evicted(tmp_path):
+    async def run():
+        cache = make_cache(tmp_path, max_bytes=250)
+        await cache.put("a", b"a" * 100)
+        await cache.put("b", b"b" * 100)
+        await cache.get("a")
+        await cache.put("c", b"c" * 100)
+        return [await cache.get(key) is not None for key in "abc"]
+
+    assert asyncio.run(run()) == [True, False, True]
+    assert sum(len(files) for _, _, files in os.walk(tmp_path / "blobs")) == 2
+
+
+def test_files_larger_than_the_cache_are_not_kept(tmp_path):
+    async def run():
+        cache = make_cache(tmp_path, max_bytes=10)
+        stored = await cache.put("big", b"x" * 11)
+        return stored, await cache.get("big")
+
+    assert asyncio.run(run()) == (None, None)
+    assert os.listdir(tmp_path / "tmp") == []
+
+
+def test_expired_keys_miss(tmp_path):
+    async def run():
+        cache = make_cache(tmp_path)
+        await cache.put("a", b"content", ttl=-1)
+        return await cache.get("a")
+
+    assert asyncio.run(run()) is None
+
+
+def test_index_survives_a_restart(tmp_path):
+    async def fill():
+        cache = make_cache(tmp_path)
+        await cache.put("kept", b"kept", "kept.pdf")
+        await cache.put("expired", b"expired", ttl=-1)
+
+    async def reopen():
+        cache = make_cache(tmp_path)
+        kept = await cache.get("kept")
+        return kept, await asyncio.to_thread(kept.read), await cache.get("expired")
+
+    asyncio.run(fill())
+    # A crash mid-write leaves a temp file and a blob no index entry points at.
+    (tmp_path / "tmp" / "partial").write_bytes(b"half")
+    (tmp_path / "blobs" / "00").mkdir(exist_ok=True)
+    (tmp_path / "blobs" / "00" / "00orphan").write_bytes(b"orphan")
+
+    kept, content, expired = asyncio.run(reopen())
+    assert (content, kept.filename, expired) == (b"kept", "kept.pdf", None)
+    assert os.listdir(tmp_path / "tmp") == []
+    assert sum(len(files) for _, _, files in os.walk(tmp_path / "blobs")) == 1
+
+
+def test_aborted_writer_leaves_nothing(tmp_path):
+    async def run():
+        cache = make_cache(tmp_path)
+        writer = await cache.writer("a", "a.pdf")
+        await writer.write(b"partial body")
+        writer.abort()
+        return await cache.get("a")
+
+    assert asyncio.run(run()) is None
+    assert os.listdir(tmp_path / "tmp") == []
+
+
+def test_writer_commits_a_streamed_body(tmp_path):
+    async def run():
+        cache = make_cache(tmp_path)
+        writer = await cache.writer("a", "a.pdf", "application/pdf")
+        for chunk in (b"%PDF", b"-1.7", b" body"):
+            await writer.write(chunk)
+        await writer.commit()
+        cached = await cache.get("a")
+        return await asyncio.to_thread(cached.read)
+
+    assert asyncio.run(run()) == b"%PDF-1.7 body"
+
+
+def test_concurrent_fetches_share_one_download(tmp_path):
+    calls = 0
+
+    async def download():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return b"%PDF", "notes.pdf"
+
+    async def run():
+        cache = make_cache(tmp_path)
+        results = await asyncio.gather(*(cache.fetch("notes", download) for _ in range(5)))
+        results.append(await cache.fetch("notes", download))
+        return results
+
+    results = asyncio.run(run())
+    assert results == [(b"%PDF", "notes.pdf")] * 6
+    assert calls == 1
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    async def run():
+        cache = make_cache(tmp_path, max_bytes=0)
+        await cache.put("a", b"content")
+        return await cache.get("a")
+
+    assert asyncio.run(run()) is None
+    assert not (tmp_path / "blobs").exists()
+
+
+def test_storing_a_key_again_keeps_its_blob(tmp_path):
+    async def run():
+        cache = make_cache(tmp_path)
+        await cache.put("a", b"same")
+        await cache.put("a", b"same")
+        await cache.put("b", b"same")
+        await cache.put("b", b"different")
+        return [await asyncio.to_thread((await cache.get(key)).read) for key in "ab"], cache._bytes
+
+    contents, size = asyncio.run(run())
+    assert contents == [b"same", b"different"]
+    assert size == len(b"same") + len(b"different")
+
+
+
+def test_byte_count_follows_puts_and_evictions(tmp_path):
+    async def run():
+        cache = make_cache(tmp_path, max_bytes=500)
+        for i in range(60):
+            # Keys come in threes sharing one 30-byte file, which is stored (and counted) once.
+            await cache.put(f"k{i}", f"{i - i % 3:03d}".encode() * 10)
+        blobs = {e["sha256"]: e["size"] for e in cache._index.values()}
+        return cache._bytes, sum(blobs.values()), len(cache._index)
+
+    counted, actual, keys = asyncio.run(run())
+    assert counted == actual <= 500
+    assert keys > 500 // 30
@@ -0,0 +1,33 @@
+import pytest
+
+from app.core.formstate import is_row_postback
+from app.modules.student.fees.viewmodel import StudentFeesViewModel
+from app.modules.student.lms.viewmodel import StudentLMSViewModel
+
+SYLLABUS = "ctl00$cphPageContent$lbtnSyllabusPDFPath"
+ROW = "ctl00$cphPageContent$gvContent$ctl03$lnkDownload"
+PAGE = "LMS_StudentSubjectContentDetails.aspx?Subj=123"
+
+
+@pytest.mark.parametrize("target, expected", [
+    (SYLLABUS, False),
+    ("ctl00$cphPageHeaderRight$ddlSemester", False),
+    (ROW, True),
+    ("ctl00$cphPageContent$rptReceipts$ctl12$lnkReceipt", True),
+])
+def test_row_postbacks_are_detected(target, expected):
+    assert is_row_postback(target) is expected
+
+
+def test_pdf_keys_are_per_student():
+    assert StudentLMSViewModel.pdf_cache_key("21BCS001", SYLLABUS, PAGE) != StudentLMSViewModel.pdf_cache_key("21BCS002", SYLLABUS, PAGE)
+
+
+def test_row_pdf_needs_a_stable_id():
+    assert StudentLMSViewModel.pdf_cache_key("21BCS001", ROW, PAGE) is None
+    assert StudentLMSViewModel.pdf_cache_key("21BCS001", ROW, PAGE, "unit1.pdf") != StudentLMSViewModel.pdf_cache_key("21BCS001", ROW, PAGE, "unit2.pdf")
+
+
+def test_receipt_key_follows_the_receipt_number():
+    key = StudentFeesViewModel.receipt_cache_key
+    assert key("21BCS001", "R-1", ROW) != key("21BCS001", "R-2", ROW)
@@ -0,0 +1,24 @@
+import pytest
+
+from app.core import metrics
+
+
+@pytest.mark.parametrize("url, label", [
+    ("https://bmu.gnums.co.in/StudentPanel/StudentDashboard.aspx", "/StudentPanel/StudentDashboard.aspx"),
+    ("https://bmu.gnums.co.in//AdminPanel/TimeTable/TTM_Attendance/TTM_AttendanceViewStudentAttendanceDetailByDate.aspx?AttendanceDate=2024-08-12",
+     "/AdminPanel/TimeTable/TTM_Attendance/TTM_AttendanceViewStudentAttendanceDetailByDate.aspx"),
+    ("https://bmu.gnums.co.in/studentpanel/lms/LMS_CONTENTSTUDENTSUBJECTDETAILS.aspx?SubjectID=301", "/StudentPanel/LMS/LMS_ContentStudentSubjectDetails.aspx"),
+    ("https://bmusurat.ac.in/bmu_website/institute/get_detail?institute_id=7", "/bmu_website/institute/get_detail"),
+    ("https://bmusurat.ac.in/", "/"),
+    ("https://bmu.gnums.co.in/StudentPanel/LMS/anything-a-client-sent-1234.aspx", "other"),
+    ("https://bmu.gnums.co.in/StudentPanel/LMS/../../Secret.aspx", "other"),
+])
+def test_page_label(url, label):
+    assert metrics.page_label(url) == label
+
+
+def test_client_paths_share_one_series():
+    histogram = metrics.Histogram("test_upstream_seconds", "test", ("page",))
+    for i in range(100):
+        histogram.observe(0.1, page=metrics.page_label(f"https://bmu.gnums.co.in/StudentPanel/LMS/page{i}.aspx"))
+    assert list(histogram._series) == [("other",)]
@@ -0,0 +1,33 @@
+import asyncio
+
+from app.core.config import config
+from app.core.singleflight import coalesce
+from app.modules.student.overview.viewmodel import OverviewError, StudentOverviewViewModel
+
+
+class SlowViewModel:
+    def __init__(self):
+        self.calls = 0
+
+    @coalesce
+    async def fetch_attendance(self, session_cookies):
+        self.calls += 1
+        await asyncio.sleep(0.1)
+        return "attendance"
+
+
+def test_section_timeout_does_not_fail_concurrent_callers(monkeypatch):
+    monkeypatch.setattr(config, "OVERVIEW_SECTION_TIMEOUT", 0.01)
+    cookies = {"ASP.NET_SessionId": "s"}
+
+    async def run():
+        vm = SlowViewModel()
+        section = StudentOverviewViewModel()._run_section("attendance", vm.fetch_attendance(cookies))
+        direct = vm.fetch_attendance(cookies)
+        (value, error), result = await asyncio.gather(section, direct)
+        return value, error, result, vm.calls
+
+    value, error, result, calls = asyncio.run(run())
+    assert value is None and isinstance(error, OverviewError)
+    assert result == "attendance"
+    assert calls == 1
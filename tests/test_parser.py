@@ -0,0 +1,60 @@
+import pytest
+
+from app.core.executor import _parse_in_worker
+from app.core.parser import ExtractSpec, parse_hidden_fields, parse_html
+from benchmarks.parsers import CASES, load_viewmodels, uncovered
+from conftest import read_fixture
+
+VIEWMODELS = load_viewmodels()
+
+
+def test_every_parser_has_a_fixture():
+    assert uncovered(VIEWMODELS) == []
+
+
+@pytest.mark.parametrize("case", CASES, ids=[c.name for c in CASES])
+def test_limited_parse_matches_full_parse(case):
+    parse_fn = getattr(VIEWMODELS[case.viewmodel], case.method)
+    markup = read_fixture(case.fixture)
+    full = parse_html(markup)
+
+    assert _parse_in_worker(parse_fn, markup, case.args) == parse_fn(full, *case.args)
+
+
+@pytest.mark.parametrize("case", CASES, ids=[c.name for c in CASES])
+def test_limited_parse_keeps_the_form_state(case):
+    parse_fn = getattr(VIEWMODELS[case.viewmodel], case.method)
+    markup = read_fixture(case.fixture)
+    full = parse_html(markup)
+
+    result, hidden = _parse_in_worker(parse_fn, markup, case.args, form_state=True)
+    assert hidden == parse_hidden_fields(full)
+    assert result == parse_fn(full, *case.args)
+
+
+@pytest.mark.parametrize("name, attrs, expected", [
+    ("div", {"id": "ctl00_cphPageContent_divFeePosting"}, True),
+    ("span", {"id": "ctl00_cphPageContent_lblTotalPaidAmount"}, True),
+    ("table", {"class": ["table-advanced", "striped"]}, True),
+    ("table", {"class": "striped table-advanced"}, True),
+    ("div", {"id": "ctl00_divMenu", "class": ["nav"]}, False),
+    ("input", {"type": "hidden", "name": "__VIEWSTATE"}, False),
+])
+def test_spec_matches_declared_regions(name, attrs, expected):
+    spec = ExtractSpec(ids=("ctl00_cphPageContent_divFeePosting",), id_prefixes=("ctl00_cphPageContent_lbl",), classes=("table-advanced",))
+    assert spec.matches(name, attrs) is expected
+
+
+def test_hidden_inputs_are_opt_in():
+    spec = ExtractSpec(ids=("content",)).with_hidden_inputs()
+    assert spec.matches("input", {"type": "HIDDEN", "name": "__VIEWSTATE"})
+    assert not spec.matches("input", {"type": "text", "name": "txtSearch"})
+    assert spec.ids == {"content"}
+
+
+def test_strainer_drops_everything_outside_the_spec():
+    markup = '<html><body><div id="menu"><a>Home</a></div><div id="content"><p>Kept <b>text</b></p></div><p>Footer</p></body></html>'
+    soup = parse_html(markup, parse_only=ExtractSpec(ids=("content",)).strainer())
+    assert soup.find(id="menu") is None
+    assert soup.find(id="content").get_text() == "Kept text"
+    assert "Footer" not in soup.get_text()
@@ -0,0 +1,57 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.client import BMUClient
+from app.core.config import config
+from app.core.executor import ParseExecutor
+from app.modules.departments.viewmodel import DepartmentsViewModel
+from app.modules.public.viewmodel import PublicViewModel
+
+from conftest import read_fixture
+
+
+@pytest.fixture
+def pooled_parses(monkeypatch):
+    """A real parse pool with the production inline threshold: pages of PARSE_INLINE_MAX_BYTES or more go to it."""
+    monkeypatch.setattr(config, "PARSE_WORKERS", 1)
+    ParseExecutor.shutdown()
+    yield
+    ParseExecutor.shutdown()
+
+
+@pytest.fixture
+def website(monkeypatch):
+    pages = {}
+    monkeypatch.setattr(BMUClient, "_transport", httpx.MockTransport(
+        lambda request: httpx.Response(200, text=pages[request.url.path], headers={"content-type": "text/html"})
+    ))
+    return pages
+
+
+def test_institute_details_cold_load_parses_in_pool(pooled_parses, website):
+    markup = read_fixture("departments/institute_details.html")
+    assert len(markup) >= config.PARSE_INLINE_MAX_BYTES
+    website["/bmu_website/institute/get_detail"] = markup
+
+    vm = DepartmentsViewModel()
+    details = asyncio.run(vm._cache.get_or_load(7, lambda: vm._scrape_institute_details(7)))
+    assert details.director is not None
+
+
+def test_public_info_cold_load_and_refresh_parse_in_pool(pooled_parses, website):
+    markup = read_fixture("public/welcome.html")
+    # Pad the page past the inline threshold so it really goes to the pool.
+    markup += "<!--" + "x" * config.PARSE_INLINE_MAX_BYTES + "-->"
+    website["/bmu_website/home/welcome"] = markup
+
+    async def run():
+        vm = PublicViewModel()
+        info = await vm.fetch_public_info()
+        await vm.refresh_public_info()
+        return info, vm._cache.get(vm.CACHE_KEY)
+
+    info, refreshed = asyncio.run(run())
+    assert info.latest_news
+    assert refreshed == info
@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+from quart import Quart
+
+from app.core.response_cache import compute_etag, is_not_modified
+
+ETAG = compute_etag({"attendance": 92})
+
+
+@pytest.mark.parametrize("header, expected", [
+    (f'"{ETAG}"', True),
+    (f'W/"{ETAG}"', True),
+    (f'"other", W/"{ETAG}"', True),
+    ("*", True),
+    ('"other"', False),
+    (None, False),
+])
+def test_if_none_match_uses_weak_comparison(header, expected):
+    app = Quart(__name__)
+
+    async def run():
+        headers = {"If-None-Match": header} if header else {}
+        async with app.test_request_context("/v2/student/attendance", method="POST", headers=headers):
+            return is_not_modified(ETAG)
+
+    assert asyncio.run(run()) is expected
+
+
+def test_etag_is_stable_across_key_order():
+    assert compute_etag({"a": 1, "b": 2}) == compute_etag({"b": 2, "a": 1})
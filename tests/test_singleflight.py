@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight, coalesce
+
+
+class Call:
+    def __init__(self, result="value", delay=0.05, error=None):
+        self.result, self.delay, self.error = result, delay, error
+        self.calls = 0
+        self.completed = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        self.completed += 1
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_calls_share_one_execution():
+    async def run():
+        flight, call = SingleFlight(), Call()
+        results = await asyncio.gather(*(flight.do("k", call) for _ in range(5)))
+        return results, call.calls, "k" in flight
+
+    assert asyncio.run(run()) == (["value"] * 5, 1, False)
+
+
+def test_finished_calls_are_not_reused():
+    async def run():
+        flight, call = SingleFlight(), Call()
+        await flight.do("k", call)
+        await flight.do("k", call)
+        return call.calls
+
+    assert asyncio.run(run()) == 2
+
+
+def test_cancelled_leader_does_not_cancel_joiners():
+    async def run():
+        flight, call = SingleFlight(), Call()
+        leader = asyncio.create_task(flight.do("k", call))
+        await asyncio.sleep(0)
+        joiner = asyncio.create_task(flight.do("k", call))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await joiner, call.calls
+
+    assert asyncio.run(run()) == ("value", 1)
+
+
+def test_timed_out_caller_does_not_fail_the_others():
+    async def run():
+        flight, call = SingleFlight(), Call(delay=0.1)
+        impatient = asyncio.wait_for(flight.do("k", call), timeout=0.01)
+        patient = flight.do("k", call)
+        return await asyncio.gather(impatient, patient, return_exceptions=True)
+
+    timed_out, result = asyncio.run(run())
+    assert isinstance(timed_out, asyncio.TimeoutError)
+    assert result == "value"
+
+
+def test_call_completes_when_every_caller_gave_up():
+    async def run():
+        flight, call = SingleFlight(), Call()
+        caller = asyncio.create_task(flight.do("k", call))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.sleep(0.1)
+        return call.completed, "k" in flight
+
+    assert asyncio.run(run()) == (1, False)
+
+
+def test_errors_reach_every_caller():
+    async def run():
+        flight, call = SingleFlight(), Call(error=ValueError("portal down"))
+        results = await asyncio.gather(*(flight.do("k", call) for _ in range(3)), return_exceptions=True)
+        return results, call.calls, "k" in flight
+
+    results, calls, inflight = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert (calls, inflight) == (1, False)
+
+
+def test_coalesce_keys_on_session_and_arguments():
+    class ViewModel:
+        def __init__(self):
+            self.calls = []
+
+        @coalesce
+        async def fetch(self, session_cookies, page):
+            self.calls.append((session_cookies["ASP.NET_SessionId"], page))
+            await asyncio.sleep(0.01)
+            return page
+
+    async def run():
+        vm = ViewModel()
+        a, b = {"ASP.NET_SessionId": "a"}, {"ASP.NET_SessionId": "b"}
+        await asyncio.gather(vm.fetch(a, 1), vm.fetch(dict(a), 1), vm.fetch(a, 2), vm.fetch(b, 1))
+        return sorted(vm.calls)
+
+    assert asyncio.run(run()) == [("a", 1), ("a", 2), ("b", 1)]
@@ -0,0 +1,156 @@
+import asyncio
+
+import httpx
+import pytest
+from quart import Quart
+
+from app.core.filecache import FileCache
+from app.core.streaming import UpstreamStream, cached_file_response, parse_range, resolve_range, stream_file_response
+
+BODY = bytes(range(256)) * 4
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=500-", (500, None)),
+    ("bytes=-500", (None, 500)),
+    ("BYTES = 10 - 20", (10, 20)),
+    ("bytes=20-10", None),
+    ("bytes=0-1,5-9", None),
+    ("bytes=-", None),
+    ("items=0-9", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header) == expected
+
+
+@pytest.mark.parametrize("requested, total, expected", [
+    ((0, 99), 1000, (0, 99)),
+    ((990, 2000), 1000, (990, 999)),
+    ((500, None), 1000, (500, 999)),
+    ((None, 100), 1000, (900, 999)),
+    ((None, 5000), 1000, (0, 999)),
+    ((0, 99), None, (0, 99)),
+    ((500, None), None, None),
+    ((None, 100), None, None),
+])
+def test_resolve_range(requested, total, expected):
+    assert resolve_range(requested, total) == expected
+
+
+@pytest.mark.parametrize("requested, total", [
+    ((1000, None), 1000),
+    ((2000, 3000), 1000),
+    ((None, 0), 1000),
+    ((0, 10), 0),
+])
+def test_unsatisfiable_ranges(requested, total):
+    with pytest.raises(ValueError):
+        resolve_range(requested, total)
+
+
+def serve(make_response):
+    """Status, headers and body of the response `make_response()` builds inside a request."""
+    app = Quart(__name__)
+
+    async def run():
+        async with app.test_request_context("/v2/student/lms/pdf", method="POST"):
+            response = await make_response()
+            return response.status_code, response.headers, await response.get_data()
+
+    return asyncio.run(run())
+
+
+def upstream(status=200, headers=None):
+    def handler(request):
+        return httpx.Response(status, headers=headers or {"Content-Length": str(len(BODY))}, content=BODY)
+
+    async def open_stream():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return await UpstreamStream.open(client, "POST", "https://portal.test/LMS.aspx")
+
+    return open_stream
+
+
+def test_upstream_range_is_trimmed_from_the_full_body():
+    async def respond():
+        return await stream_file_response(await upstream()(), "application/pdf", "notes.pdf", "bytes=100-299")
+
+    status, headers, body = serve(respond)
+    assert status == 206
+    assert headers["Content-Range"] == f"bytes 100-299/{len(BODY)}"
+    assert headers["Content-Length"] == "200"
+    assert body == BODY[100:300]
+
+
+def test_unsatisfiable_upstream_range():
+    async def respond():
+        return await stream_file_response(await upstream()(), "application/pdf", range_header=f"bytes={len(BODY)}-")
+
+    status, headers, body = serve(respond)
+    assert (status, headers["Content-Range"], body) == (416, f"bytes */{len(BODY)}", b"")
+
+
+def test_full_relay_is_teed_into_the_cache(tmp_path):
+    cache = FileCache(directory=str(tmp_path), max_bytes=1 << 20, ttl=60, name="test_files")
+
+    async def respond():
+        tee = await cache.writer("notes", "notes.pdf", "application/pdf")
+        return await stream_file_response(await upstream()(), "application/pdf", "notes.pdf", tee=tee)
+
+    async def cached():
+        entry = await cache.get("notes")
+        try:
+            return await asyncio.to_thread(entry.read)
+        finally:
+            entry.close()
+
+    status, _, body = serve(respond)
+    assert (status, body) == (200, BODY)
+    assert asyncio.run(cached()) == BODY
+
+
+def test_partial_relay_is_not_cached(tmp_path):
+    cache = FileCache(directory=str(tmp_path), max_bytes=1 << 20, ttl=60, name="test_files")
+
+    async def respond():
+        tee = await cache.writer("notes", "notes.pdf", "application/pdf")
+        return await stream_file_response(await upstream()(), "application/pdf", "notes.pdf", "bytes=0-9", tee=tee)
+
+    status, _, body = serve(respond)
+    assert (status, body) == (206, BODY[:10])
+    assert asyncio.run(cache.get("notes")) is None
+
+
+@pytest.mark.parametrize("range_header, status, content_range, expected", [
+    (None, 200, None, BODY),
+    ("bytes=1000-", 206, f"bytes 1000-1023/{len(BODY)}", BODY[1000:]),
+    ("bytes=-24", 206, f"bytes 1000-1023/{len(BODY)}", BODY[-24:]),
+    ("bytes=5000-", 416, f"bytes */{len(BODY)}", b""),
+])
+def test_cached_file_ranges(tmp_path, range_header, status, content_range, expected):
+    cache = FileCache(directory=str(tmp_path), max_bytes=1 << 20, ttl=60, name="test_files")
+
+    async def respond():
+        cached = await cache.put("notes", BODY, "notes.pdf", "application/pdf")
+        return await cached_file_response(cached, "application/pdf", cached.filename, range_header)
+
+    got_status, headers, body = serve(respond)
+    assert (got_status, headers.get("Content-Range"), body) == (status, content_range, expected)
+
+
+def test_cached_file_survives_eviction_after_lookup(tmp_path):
+    cache = FileCache(directory=str(tmp_path), max_bytes=len(BODY) + 100, ttl=60, name="test_files")
+
+    async def respond():
+        await cache.put("notes", BODY, "notes.pdf", "application/pdf")
+        cached = await cache.get("notes")
+        # Another download pushes the blob out before the body is sent.
+        await cache.put("other", b"x" * 200)
+        return await cached_file_response(cached, "application/pdf", cached.filename, "bytes=0-99")
+
+    status, _, body = serve(respond)
+    assert (status, body) == (206, BODY[:100])
+    assert asyncio.run(cache.get("notes")) is None
@@ -0,0 +1,75 @@
+import asyncio
+from datetime import date
+
+import httpx
+import pytest
+
+from app.modules.student.timetable.models import TimetableData
+from app.modules.student.timetable.viewmodel import ExternalServiceError, SessionExpiredError, StudentTimetableViewModel
+
+COOKIES = {"ASP.NET_SessionId": "s"}
+
+
+def viewmodel(failures):
+    """A timetable viewmodel whose weeks fail as given in `failures` (week start -> exception)."""
+    vm = StudentTimetableViewModel()
+    fetched = []
+
+    async def fetch(client, session_cookies, timetable_date=None):
+        fetched.append(timetable_date)
+        await asyncio.sleep(0)
+        if timetable_date in failures:
+            raise failures[timetable_date]
+        effective_from = "2024-01-01" if timetable_date < "2024-01-15" else "2024-01-15"
+        return TimetableData(institute="BMU", class_info="CSE 5A", effective_from=effective_from, timetable=[])
+
+    vm._fetch_timetable = fetch
+    return vm, fetched
+
+
+def fetch_january(vm):
+    return asyncio.run(vm.fetch_timetable_range(COOKIES, date(2024, 1, 1), date(2024, 1, 28)))
+
+
+def test_range_groups_weeks_by_timetable():
+    vm, fetched = viewmodel({})
+    data = fetch_january(vm)
+    assert fetched == ["2024-01-01", "2024-01-08", "2024-01-15", "2024-01-22"]
+    assert [w.effective_from for w in data.weeks] == ["2024-01-01", "2024-01-01", "2024-01-15", "2024-01-15"]
+    assert len(data.timetables) == 2
+    assert data.errors == {}
+
+
+def test_failed_weeks_are_reported_individually():
+    vm, fetched = viewmodel({
+        "2024-01-08": httpx.ReadTimeout(""),
+        "2024-01-22": ExternalServiceError("Failed to fetch timetable for date 2024-01-22. Status: 500"),
+    })
+    data = fetch_january(vm)
+    assert len(fetched) == 4
+    assert [w.week_start for w in data.weeks] == ["2024-01-01", "2024-01-15"]
+    assert data.errors == {
+        "2024-01-08": "ReadTimeout",
+        "2024-01-22": "Failed to fetch timetable for date 2024-01-22. Status: 500",
+    }
+
+
+def test_failed_first_week_does_not_stop_the_others():
+    vm, _ = viewmodel({"2024-01-01": ExternalServiceError("Status: 503")})
+    data = fetch_january(vm)
+    assert [w.week_start for w in data.weeks] == ["2024-01-08", "2024-01-15", "2024-01-22"]
+    assert list(data.errors) == ["2024-01-01"]
+
+
+def test_range_fails_when_every_week_fails():
+    weeks = ["2024-01-01", "2024-01-08", "2024-01-15", "2024-01-22"]
+    vm, _ = viewmodel({week: ExternalServiceError("Status: 503") for week in weeks})
+    with pytest.raises(ExternalServiceError):
+        fetch_january(vm)
+
+
+def test_expired_session_fails_the_whole_range():
+    # The session store then logs in again and replays the range.
+    vm, _ = viewmodel({"2024-01-15": SessionExpiredError("Invalid session or expired cookies.")})
+    with pytest.raises(SessionExpiredError):
+        fetch_january(vm)
@@ -0,0 +1,73 @@
+import gzip
+import zlib
+
+import pytest
+
+from app.core.timing import ViewStateMeter
+
+VIEWSTATE = "/wEPDwUKMTY2" + "A" * 5000 + "ZGQ="
+PAGE = (
+    '<html><body><form method="post" action="./StudentDashboard.aspx">'
+    '<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="' + VIEWSTATE + '" />'
+    '<div id="content">' + "x" * 3000 + "</div></form></body></html>"
+).encode("utf-8")
+# An UpdatePanel delta: length|type|id|content| records.
+DELTA = f"1|#||4|120|updatePanel|ctl00_upMain|<table></table>|{len(VIEWSTATE)}|hiddenField|__VIEWSTATE|{VIEWSTATE}|8|hiddenField|__EVENTVALIDATION|/wEdAAI=|".encode("utf-8")
+
+
+def measure(body: bytes, encoding: str = "", chunk_size: int = 1024) -> ViewStateMeter:
+    meter = ViewStateMeter(encoding)
+    for offset in range(0, len(body), chunk_size):
+        meter.feed(body[offset:offset + chunk_size])
+    return meter
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 24, 100, 4096, len(PAGE)])
+def test_full_page_in_any_chunking(chunk_size):
+    meter = measure(PAGE, chunk_size=chunk_size)
+    assert (meter.done, meter.size) == (True, len(VIEWSTATE))
+
+
+def test_marker_split_at_every_offset():
+    start = PAGE.index(b'id="__VIEWSTATE"')
+    for split in range(start - 2, start + 30):
+        meter = ViewStateMeter("identity")
+        meter.feed(PAGE[:split])
+        meter.feed(PAGE[split:])
+        assert meter.size == len(VIEWSTATE), split
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 24, 1000])
+def test_update_panel_delta(chunk_size):
+    assert measure(DELTA, chunk_size=chunk_size).size == len(VIEWSTATE)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 13, 512, 1 << 16])
+def test_gzip_body(chunk_size):
+    assert measure(gzip.compress(PAGE), "gzip", chunk_size).size == len(VIEWSTATE)
+
+
+def test_deflate_body():
+    assert measure(zlib.compress(PAGE), " Deflate ", 100).size == len(VIEWSTATE)
+
+
+def test_page_without_viewstate():
+    meter = measure(b"<html><body>Login.aspx</body></html>")
+    assert (meter.done, meter.size) == (False, None)
+
+
+def test_unsupported_encoding_is_not_measured():
+    meter = measure(PAGE, "br")
+    assert (meter.done, meter.size) == (True, None)
+
+
+def test_corrupt_gzip_is_not_measured():
+    meter = measure(b"not gzip at all" + PAGE, "gzip")
+    assert (meter.done, meter.size) == (True, None)
+
+
+def test_nothing_is_read_after_the_value():
+    meter = ViewStateMeter("")
+    meter.feed(PAGE)
+    meter.feed(b'<input id="__VIEWSTATE" value="second" />')
+    assert meter.size == len(VIEWSTATE)